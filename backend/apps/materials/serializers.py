@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from .models import Material, CartItem
+from apps.models import scheduler
+from apps.models.slicing import unit_price_for_material
 
 
 class MaterialSerializer(serializers.ModelSerializer):
@@ -37,10 +39,9 @@ class CartItemSerializer(serializers.ModelSerializer):
     
     def get_estimated_price(self, obj):
         """Calculate estimated price based on current material price and slicing info."""
-        if obj.model.slicing_info and 'weight_g' in obj.model.slicing_info:
-            weight = obj.model.slicing_info['weight_g']
-            price_per_gram = float(obj.material.price_twd_g)
-            return round(weight * price_per_gram * obj.quantity, 2)
+        unit_price = unit_price_for_material(obj.model.slicing_info, obj.material)
+        if unit_price is not None:
+            return round(float(unit_price) * obj.quantity, 2)
         return None
 
 
@@ -75,4 +76,10 @@ class CartItemCreateSerializer(serializers.ModelSerializer):
             existing.save()
             return existing
         
-        return super().create(validated_data)
+        instance = super().create(validated_data)
+        
+        # Someone wants to buy this model, so slice it ahead of bulk uploads
+        if not instance.model.gcode_file_path:
+            scheduler.promote(instance.model)
+        
+        return instance
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Model, ModelImage, ModelReviewLog
+from .models import Model, ModelArchive, ModelImage, ModelReviewLog, ShapeSignature, SlicingCacheEntry, UploadSession
 
 
 class ModelImageInline(admin.TabularInline):
@@ -37,3 +37,34 @@ class ModelReviewLogAdmin(admin.ModelAdmin):
     list_filter = ('new_status', 'timestamp')
     search_fields = ('model__model_name', 'reviewer__employee_name')
     readonly_fields = ('id', 'model', 'reviewer', 'previous_status', 'new_status', 'reason', 'timestamp')
+
+
+@admin.register(SlicingCacheEntry)
+class SlicingCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('stl_hash', 'profile', 'slicer_version', 'gcode_size', 'hit_count', 'last_used_at')
+    list_filter = ('profile', 'slicer_version')
+    search_fields = ('stl_hash',)
+    readonly_fields = ('id', 'created_at', 'last_used_at', 'hit_count')
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'owner', 'total_size', 'status', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('filename', 'owner__email')
+    readonly_fields = ('id', 'created_at', 'updated_at')
+
+
+@admin.register(ShapeSignature)
+class ShapeSignatureAdmin(admin.ModelAdmin):
+    list_display = ('model', 'duplicate_of', 'duplicate_match', 'duplicate_distance', 'created_at')
+    list_filter = ('duplicate_match',)
+    search_fields = ('model__model_name', 'duplicate_of__model_name')
+    readonly_fields = ('model', 'vector', 'duplicate_of', 'duplicate_match', 'duplicate_distance', 'created_at')
+
+
+@admin.register(ModelArchive)
+class ModelArchiveAdmin(admin.ModelAdmin):
+    list_display = ('name', 'owner', 'filename', 'part_count', 'created_at')
+    search_fields = ('name', 'filename', 'owner__email')
+    readonly_fields = ('id', 'created_at')
@@ -0,0 +1,245 @@
+"""
+Multi-part uploads from 3MF projects and ZIP archives.
+
+Archives are read through `zipfile` one member at a time. STL members are
+streamed from the decompressor straight into storage. 3MF model XML is read
+with `iterparse`, and each <object> mesh is converted to a binary STL as soon
+as its element closes. Memory therefore holds at most one part, never the
+whole archive.
+
+Every part becomes its own Model that goes through the normal upload
+pipeline, so parts are sliced as independent jobs across the worker pool.
+`combined_quote` adds their results up.
+"""
+import io
+import posixpath
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+import zipfile
+
+import numpy as np
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils.text import get_valid_filename
+
+from apps.materials.models import Material
+from .blobs import blob_storage
+from .models import Model, ModelArchive, VisibilityStatus
+from .slicing import SlicingSource, prepare_uploaded_model, weight_for_material
+from .stl import BINARY_HEADER_SIZE, BINARY_TRIANGLE_DTYPE
+
+ARCHIVE_EXTENSIONS = ('.zip', '.3mf')
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+# 3MF length units in millimetres
+_3MF_UNITS = {
+    'micron': 0.001, 'millimeter': 1.0, 'centimeter': 10.0,
+    'inch': 25.4, 'foot': 304.8, 'meter': 1000.0,
+}
+
+
+class ArchiveError(ValueError):
+    """Raised when an archive cannot be read or breaks the limits."""
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _binary_stl(triangles):
+    records = np.zeros(len(triangles), dtype=BINARY_TRIANGLE_DTYPE)
+    records['vertices'] = triangles
+    header = b'3DPMP 3MF part'.ljust(BINARY_HEADER_SIZE - 4, b' ')
+    return header + np.uint32(len(triangles)).tobytes() + records.tobytes()
+
+
+def iter_3mf_meshes(stream):
+    """
+    Yield (name, binary STL bytes) for every mesh object in a 3MF model part.
+
+    Build-item transforms are not applied; each part keeps its own
+    coordinates, which is what slicing it on its own needs.
+    """
+    scale = 1.0
+    vertices, triangles = [], []
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        tag = _local(elem.tag)
+        if event == 'start':
+            if tag == 'model':
+                scale = _3MF_UNITS.get(elem.get('unit', 'millimeter'), 1.0)
+            elif tag == 'object':
+                vertices, triangles = [], []
+            continue
+
+        if tag == 'vertex':
+            vertices.append((float(elem.get('x')), float(elem.get('y')), float(elem.get('z'))))
+        elif tag == 'triangle':
+            triangles.append((int(elem.get('v1')), int(elem.get('v2')), int(elem.get('v3'))))
+        elif tag == 'object':
+            if triangles:
+                v = np.array(vertices, dtype=np.float64) * scale
+                try:
+                    mesh = v[np.array(triangles, dtype=np.int64)]
+                except IndexError:
+                    raise ArchiveError(f"3MF object {elem.get('id')} references a missing vertex")
+                yield elem.get('name') or f"object-{elem.get('id')}", _binary_stl(mesh)
+            vertices, triangles = [], []
+            elem.clear()
+        elif tag in ('vertices', 'triangles', 'mesh'):
+            # Children already copied out; free them as we go
+            elem.clear()
+
+
+def _check_limits(members):
+    if not members:
+        raise ArchiveError('Archive contains no STL or 3MF meshes')
+    total = sum(info.file_size for info in members)
+    if total > settings.ARCHIVE_MAX_UNCOMPRESSED_BYTES:
+        raise ArchiveError(
+            f'Archive expands to more than {settings.ARCHIVE_MAX_UNCOMPRESSED_BYTES} bytes'
+        )
+
+
+def _iter_archive(fileobj):
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise ArchiveError('File is not a valid ZIP or 3MF archive')
+
+    with archive:
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir()
+            and not posixpath.basename(info.filename).startswith('.')
+            and not info.filename.startswith('__MACOSX/')
+            and info.filename.lower().endswith(('.stl', '.model', '.3mf'))
+        ]
+        _check_limits(members)
+
+        for info in members:
+            lower = info.filename.lower()
+            try:
+                with archive.open(info) as member:
+                    if lower.endswith('.stl'):
+                        yield posixpath.splitext(posixpath.basename(info.filename))[0], member
+                    elif lower.endswith('.model'):
+                        for name, data in iter_3mf_meshes(member):
+                            yield name, io.BytesIO(data)
+                    else:
+                        # A 3MF inside a ZIP needs random access to its own
+                        # central directory, so spool it first
+                        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as spool:
+                            shutil.copyfileobj(member, spool, 1024 * 1024)
+                            spool.seek(0)
+                            yield from _iter_archive(spool)
+            except (zipfile.BadZipFile, ET.ParseError, TypeError, ValueError) as e:
+                if isinstance(e, ArchiveError):
+                    raise
+                raise ArchiveError(f'Cannot read {info.filename}: {e}')
+
+
+def iter_parts(fileobj):
+    """
+    Yield (part name, file-like) for every mesh in a ZIP or 3MF archive.
+
+    Each file-like is only valid until the next part is requested. Raises
+    ArchiveError for unreadable archives or ones over the limits.
+    """
+    for count, part in enumerate(_iter_archive(fileobj), start=1):
+        if count > settings.ARCHIVE_MAX_PARTS:
+            raise ArchiveError(f'Archive has more than {settings.ARCHIVE_MAX_PARTS} parts')
+        yield part
+
+
+def create_archive(owner, fileobj, filename, fields):
+    """
+    Create a ModelArchive and one Model per mesh part.
+
+    `fields` are the shared model fields (model_name, description, category,
+    tags). Part models are named "<model_name> - <part name>". Everything
+    is rolled back if any part fails.
+    """
+    base_name = fields.get('model_name') or posixpath.splitext(filename)[0]
+    category = fields.get('category') or Model._meta.get_field('category').default
+    saved = []
+    try:
+        with transaction.atomic():
+            archive = ModelArchive.objects.create(owner=owner, name=base_name, filename=filename)
+            models = []
+            for part_name, stream in iter_parts(fileobj):
+                model = Model(
+                    owner=owner,
+                    model_name=f'{base_name} - {part_name}'[:255],
+                    description=fields.get('description'),
+                    category=category,
+                    tags=fields.get('tags'),
+                    visibility_status=VisibilityStatus.PRIVATE,
+                    stl_file_path=part_name,
+                    archive=archive,
+                )
+                content = ContentFile(stream.getvalue()) if isinstance(stream, io.BytesIO) else File(stream)
+                model.stl_file.save(get_valid_filename(f'{part_name}.stl') or 'part.stl', content, save=False)
+                saved.append(model.stl_file.name)
+                model.save()
+                models.append(model)
+
+            archive.part_count = len(models)
+            archive.save(update_fields=['part_count'])
+            for model in models:
+                prepare_uploaded_model(model)
+    except Exception:
+        # The rows are rolled back; remove the blobs already written
+        for name in saved:
+            blob_storage.delete(name)
+        raise
+    return archive
+
+
+def combined_quote(archive):
+    """
+    Total weight, price and print time of all parts, per active material.
+
+    Parts without a usable slicing_info are counted in `parts_pending` and
+    left out of the totals.
+    """
+    parts = list(archive.parts.only('id', 'slicing_info'))
+    materials = list(Material.objects.filter(is_active=True))
+    totals = {str(m.id): {'name': m.name, 'weight_g': 0.0, 'price_twd': 0.0} for m in materials}
+
+    sliced = estimated = pending = 0
+    print_time_s = 0
+    for part in parts:
+        info = part.slicing_info
+        if not info or info.get('filament_volume_cm3') is None and info.get('weight_g') is None:
+            pending += 1
+            continue
+        if info.get('source') == SlicingSource.SLICER:
+            sliced += 1
+        else:
+            estimated += 1
+        print_time_s += info.get('print_time_s') or 0
+        for material in materials:
+            weight = weight_for_material(info, material)
+            if weight is None:
+                continue
+            entry = totals[str(material.id)]
+            entry['weight_g'] += float(weight)
+            entry['price_twd'] += float(weight * material.price_twd_g)
+
+    for entry in totals.values():
+        entry['weight_g'] = round(entry['weight_g'], 2)
+        entry['price_twd'] = round(entry['price_twd'], 2)
+
+    return {
+        'archive_id': str(archive.id),
+        'part_count': len(parts),
+        'parts_sliced': sliced,
+        'parts_estimated': estimated,
+        'parts_pending': pending,
+        'is_estimate': sliced < len(parts),
+        'print_time_s': print_time_s,
+        'materials': totals,
+    }
@@ -0,0 +1,357 @@
+"""
+Compressed storage for STL and G-code blobs.
+
+Blobs are written as a series of independent gzip members ("frames") of
+BLOB_FRAME_SIZE uncompressed bytes each. The file ends with one more,
+empty gzip member whose header extra field holds the frame index: the
+compressed and uncompressed size of every frame. The result is still an
+ordinary gzip file. `gzip -d` and HTTP clients that honour
+`Content-Encoding: gzip` decompress it as usual, while readers here can
+seek by decompressing only the frame that holds the target offset.
+
+Reading is transparent. `open()` returns a seekable file of the original
+bytes and `size()` reports the original size. Blobs written before
+compression was enabled, or uploaded straight to the bucket, are detected
+by their missing index and read as they are.
+
+Index member layout (little-endian):
+
+    1f 8b 08 04 00000000 00 ff      gzip header with FEXTRA
+    XLEN u16                        length of the extra field
+    'Z' 'X' LEN u16                 subfield holding the index
+    (csize u32, usize u32) * n      one entry per frame
+    b'GZIX' n u32                   trailer magic and frame count
+    03 00 00000000 00000000         empty deflate block, CRC32, ISIZE
+"""
+import gzip
+import io
+import math
+import struct
+import tempfile
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+from django.utils.functional import LazyObject
+from storages.backends.s3 import S3Storage
+from storages.utils import clean_name
+
+GZIP_MAGIC = b'\x1f\x8b'
+INDEX_MAGIC = b'GZIX'
+INDEX_SUBFIELD = b'ZX'
+_EMPTY_MEMBER_TAIL = b'\x03\x00' + bytes(8)
+_TRAILER = struct.Struct('<4sI')
+_TAIL_SIZE = _TRAILER.size + len(_EMPTY_MEMBER_TAIL)
+
+# Frame entries must fit in the 64KB gzip extra field
+MAX_FRAMES = (0xFFFF - 4 - _TRAILER.size) // 8
+# Index member of the largest possible index, read in one go from the end
+TAIL_READ_BYTES = 12 + 0xFFFF + len(_EMPTY_MEMBER_TAIL)
+SPOOL_MAX_MEMORY = 16 * 1024 * 1024
+
+
+def _index_member(frames):
+    entries = np.asarray(frames, dtype='<u4').tobytes()
+    payload = entries + _TRAILER.pack(INDEX_MAGIC, len(frames))
+    extra = INDEX_SUBFIELD + struct.pack('<H', len(payload)) + payload
+    header = GZIP_MAGIC + b'\x08\x04' + bytes(5) + b'\xff' + struct.pack('<H', len(extra))
+    return header + extra + _EMPTY_MEMBER_TAIL
+
+
+def compress(src, dst, frame_size=None, level=None):
+    """
+    Write `src` to `dst` as framed gzip with a trailing frame index.
+
+    The frame size grows beyond BLOB_FRAME_SIZE for files too large to index
+    with MAX_FRAMES frames. Returns the number of frames written.
+    """
+    frame_size = frame_size or settings.BLOB_FRAME_SIZE
+    level = settings.BLOB_COMPRESSION_LEVEL if level is None else level
+    total = getattr(src, 'size', None)
+    if total:
+        frame_size = max(frame_size, math.ceil(total / MAX_FRAMES))
+
+    frames = []
+    while block := src.read(frame_size):
+        # mtime=0 keeps the output identical for identical content
+        member = gzip.compress(block, compresslevel=level, mtime=0)
+        dst.write(member)
+        frames.append((len(member), len(block)))
+    if not frames:
+        member = gzip.compress(b'', compresslevel=level, mtime=0)
+        dst.write(member)
+        frames.append((len(member), 0))
+    if len(frames) <= MAX_FRAMES:
+        dst.write(_index_member(frames))
+    return len(frames)
+
+
+def parse_index(tail):
+    """
+    Return the (N, 2) array of frame (csize, usize) from the end of a blob,
+    or None if `tail` does not end with a frame index.
+    """
+    if len(tail) < _TAIL_SIZE or not tail.endswith(_EMPTY_MEMBER_TAIL):
+        return None
+    magic, count = _TRAILER.unpack_from(tail, len(tail) - _TAIL_SIZE)
+    if magic != INDEX_MAGIC or count > MAX_FRAMES:
+        return None
+    start = len(tail) - _TAIL_SIZE - 8 * count
+    if start < 0:
+        return None
+    return np.frombuffer(tail, dtype='<u4', count=2 * count, offset=start).reshape(count, 2)
+
+
+class FramedReader(io.RawIOBase):
+    """
+    Seekable reader over a framed gzip blob.
+
+    `source` provides `open_at(offset)` returning a stream of the stored
+    bytes from `offset`. Sequential reads reuse that stream; a seek into
+    another frame reopens it at the frame's offset, which with a ranged
+    source (S3) fetches only that frame.
+    """
+
+    def __init__(self, source, index):
+        self.source = source
+        self.compressed_offsets = np.concatenate([[0], np.cumsum(index[:, 0], dtype=np.int64)])
+        self.offsets = np.concatenate([[0], np.cumsum(index[:, 1], dtype=np.int64)])
+        self.csizes = index[:, 0]
+        self.size = int(self.offsets[-1])
+        self.position = 0
+        self.stream = None
+        self.stream_offset = None
+        self.frame = None
+        self.data = b''
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError('negative seek position')
+        self.position = offset
+        return offset
+
+    def _load(self, frame):
+        start = int(self.compressed_offsets[frame])
+        if self.stream is None or self.stream_offset != start:
+            if self.stream is not None:
+                self.stream.close()
+            self.stream = self.source.open_at(start)
+        compressed = self.stream.read(int(self.csizes[frame]))
+        self.stream_offset = start + len(compressed)
+        self.data = zlib.decompress(compressed, wbits=31)
+        self.frame = frame
+
+    def readinto(self, buffer):
+        # Fill the whole buffer, unlike a plain raw stream, so read(n)
+        # returns n bytes until the end of the blob
+        view = memoryview(buffer).cast('B')
+        filled = 0
+        while filled < len(view) and self.position < self.size:
+            frame = int(np.searchsorted(self.offsets, self.position, side='right')) - 1
+            if frame != self.frame:
+                self._load(frame)
+            start = self.position - int(self.offsets[frame])
+            chunk = self.data[start:start + len(view) - filled]
+            view[filled:filled + len(chunk)] = chunk
+            filled += len(chunk)
+            self.position += len(chunk)
+        return filled
+
+    def readall(self):
+        return self.read(max(self.size - self.position, 0))
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        self.source.close()
+        super().close()
+
+
+class _FileSource:
+    """Stored bytes from a seekable local file."""
+
+    def __init__(self, fileobj):
+        self.file = fileobj
+
+    def head(self, count):
+        self.file.seek(0)
+        return self.file.read(count)
+
+    def tail(self, count):
+        size = self.file.seek(0, io.SEEK_END)
+        self.file.seek(max(size - count, 0))
+        return self.file.read()
+
+    def open_at(self, offset):
+        self.file.seek(offset)
+        # The reader closes streams it replaces; the file itself stays open
+        return _Unclosable(self.file)
+
+    def close(self):
+        self.file.close()
+
+
+class _Unclosable:
+    def __init__(self, fileobj):
+        self.file = fileobj
+
+    def read(self, size=-1):
+        return self.file.read(size)
+
+    def close(self):
+        pass
+
+
+class _S3Source:
+    """Stored bytes of an S3 object, fetched with Range requests."""
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def head(self, count):
+        return self.obj.get(Range=f'bytes=0-{count - 1}')['Body'].read()
+
+    def tail(self, count):
+        return self.obj.get(Range=f'bytes=-{count}')['Body'].read()
+
+    def open_at(self, offset):
+        return self.obj.get(Range=f'bytes={offset}-')['Body']
+
+    def close(self):
+        pass
+
+
+class BlobFile(File):
+    """File over a decompressing reader that can be reopened after close."""
+
+    def __init__(self, file, name, storage):
+        super().__init__(file, name)
+        self.storage = storage
+
+    def open(self, mode='rb'):
+        if self.closed:
+            self.file = self.storage.open(self.name, mode).file
+        else:
+            self.seek(0)
+        return self
+
+
+class CompressionMixin:
+    """
+    Compresses blobs on save and decompresses them on open.
+
+    `size()` is the original size; `stored_size()` is the size at rest.
+    """
+
+    def _save(self, name, content):
+        if not settings.BLOB_COMPRESSION:
+            return super()._save(name, content)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as spool:
+            compress(content, spool)
+            spool.seek(0)
+            return super()._save(name, File(spool, name=name))
+
+    def _source(self, name):
+        return _FileSource(super()._open(name, 'rb'))
+
+    def _open(self, name, mode='rb'):
+        if 'w' in mode or 'a' in mode or '+' in mode:
+            raise ValueError('Compressed blobs can only be opened for reading')
+        source = self._source(name)
+        try:
+            index = parse_index(source.tail(TAIL_READ_BYTES))
+            if index is not None:
+                return BlobFile(FramedReader(source, index), name, self)
+            compressed = source.head(2) == GZIP_MAGIC
+        except Exception:
+            source.close()
+            raise
+        source.close()
+
+        # Written before compression was enabled, or compressed elsewhere
+        raw = super()._open(name, 'rb')
+        if compressed:
+            return BlobFile(gzip.GzipFile(fileobj=raw, mode='rb'), name, self)
+        return raw
+
+    def size(self, name):
+        source = self._source(name)
+        try:
+            index = parse_index(source.tail(TAIL_READ_BYTES))
+            if index is not None:
+                return int(index[:, 1].sum())
+            compressed = source.head(2) == GZIP_MAGIC
+        finally:
+            source.close()
+        if not compressed:
+            return super().size(name)
+        with self._open(name) as f:
+            return f.file.seek(0, io.SEEK_END)
+
+    def stored_size(self, name):
+        return super().size(name)
+
+    def open_stored(self, name):
+        """Open the blob as stored, without decompressing it."""
+        return super()._open(name, 'rb')
+
+    def is_compressed(self, name):
+        source = self._source(name)
+        try:
+            return parse_index(source.tail(TAIL_READ_BYTES)) is not None or source.head(2) == GZIP_MAGIC
+        finally:
+            source.close()
+
+
+class CompressedFileSystemStorage(CompressionMixin, FileSystemStorage):
+    pass
+
+
+class CompressedS3Storage(CompressionMixin, S3Storage):
+    """
+    S3 blobs are stored with `Content-Encoding: gzip`, so presigned
+    downloads arrive decompressed, while reads here use ranged GETs.
+    """
+
+    def get_object_parameters(self, name):
+        params = super().get_object_parameters(name)
+        if settings.BLOB_COMPRESSION:
+            params.setdefault('ContentEncoding', 'gzip')
+        return params
+
+    def open_stored(self, name):
+        return self._source(name).open_at(0)
+
+    def _source(self, name):
+        return _S3Source(self.bucket.Object(self._normalize_name(clean_name(name))))
+
+
+class _BlobStorage(LazyObject):
+    def _setup(self):
+        self._wrapped = storages['blobs']
+
+
+blob_storage = _BlobStorage()
+
+
+def get_blob_storage():
+    """Storage of STL and G-code blobs, for FileField(storage=...)."""
+    return blob_storage
@@ -0,0 +1,135 @@
+"""
+Direct-to-storage uploads through presigned S3 URLs.
+
+The client asks for a presigned PUT URL, uploads the file straight to the
+bucket, and then passes the returned signed token when creating the model.
+Django never handles the file bytes; it only checks that the object exists
+and is within the size limit before registering it.
+
+Only available when S3 storage is configured (USE_S3_STORAGE).
+"""
+import os
+import posixpath
+import uuid
+from functools import lru_cache
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.utils.text import get_valid_filename
+
+SIGNING_SALT = 'apps.models.direct_uploads'
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif')
+
+# kind -> (storage prefix, allowed extensions)
+UPLOAD_KINDS = {
+    'stl': ('models/stl/', ('.stl',)),
+    'thumbnail': ('models/thumbnails/', IMAGE_EXTENSIONS),
+    'image': ('models/images/', IMAGE_EXTENSIONS),
+}
+
+
+class DirectUploadError(ValueError):
+    """Raised when a direct upload request or token is invalid."""
+
+
+def is_enabled():
+    return settings.USE_S3_STORAGE
+
+
+def max_size(kind):
+    return settings.DIRECT_UPLOAD_MAX_SIZE['stl' if kind == 'stl' else 'image']
+
+
+@lru_cache(maxsize=1)
+def _presign_client():
+    """
+    boto3 client used only for signing URLs.
+
+    Uses the public endpoint when set, because the internal endpoint Django
+    talks to (e.g. http://minio:9000) is not reachable from browsers.
+    """
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client(
+        's3',
+        endpoint_url=settings.AWS_S3_PUBLIC_ENDPOINT_URL or settings.AWS_S3_ENDPOINT_URL or None,
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_S3_REGION_NAME or None,
+        config=Config(
+            signature_version='s3v4',
+            s3={'addressing_style': settings.AWS_S3_ADDRESSING_STYLE},
+        ),
+    )
+
+
+def create_presigned_upload(user, kind, filename, size, content_type):
+    """
+    Reserve a storage name and return a presigned PUT URL for it.
+
+    The returned token must be sent back to register the uploaded object.
+    """
+    if not is_enabled():
+        raise DirectUploadError('Direct uploads require S3 storage')
+    if kind not in UPLOAD_KINDS:
+        raise DirectUploadError(f'kind must be one of {", ".join(UPLOAD_KINDS)}')
+
+    prefix, extensions = UPLOAD_KINDS[kind]
+    filename = get_valid_filename(os.path.basename(filename or ''))
+    if not filename.lower().endswith(extensions):
+        raise DirectUploadError(f'File type not allowed for {kind}')
+    if not 0 < size <= max_size(kind):
+        raise DirectUploadError(f'File size must be between 1 and {max_size(kind)} bytes')
+
+    name = f'{prefix}{uuid.uuid4().hex}/{filename}'
+    url = _presign_client().generate_presigned_url(
+        'put_object',
+        Params={
+            'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
+            'Key': posixpath.join(settings.AWS_LOCATION, name),
+            'ContentType': content_type,
+        },
+        ExpiresIn=settings.DIRECT_UPLOAD_EXPIRY,
+    )
+    token = signing.dumps(
+        {'name': name, 'kind': kind, 'user': str(user.id)},
+        salt=SIGNING_SALT,
+    )
+    return {
+        'method': 'PUT',
+        'url': url,
+        'headers': {'Content-Type': content_type},
+        'name': name,
+        'token': token,
+        'expires_in': settings.DIRECT_UPLOAD_EXPIRY,
+    }
+
+
+def resolve_upload(user, token, kind):
+    """
+    Verify a direct upload token and the uploaded object.
+
+    Returns the storage name to assign to the file field. Objects over the
+    size limit are deleted.
+    """
+    try:
+        payload = signing.loads(
+            token, salt=SIGNING_SALT,
+            max_age=settings.DIRECT_UPLOAD_EXPIRY + settings.DIRECT_UPLOAD_REGISTER_GRACE,
+        )
+    except signing.BadSignature:
+        raise DirectUploadError('Invalid or expired upload token')
+
+    if payload['user'] != str(user.id) or payload['kind'] != kind:
+        raise DirectUploadError('Upload token does not match this request')
+
+    name = payload['name']
+    if not default_storage.exists(name):
+        raise DirectUploadError('Uploaded file not found in storage')
+    if default_storage.size(name) > max_size(kind):
+        default_storage.delete(name)
+        raise DirectUploadError('Uploaded file is too large')
+    return name
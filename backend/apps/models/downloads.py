@@ -0,0 +1,217 @@
+"""
+Streamed STL and G-code downloads.
+
+Blobs are streamed in DOWNLOAD_CHUNK_SIZE chunks with support for a single
+HTTP Range and If-None-Match. Blob names are never reused for other
+content, so the ETag is derived from the storage name.
+
+How the bytes are sent depends on how the blob is stored:
+
+- uncompressed blobs go to nginx via X-Accel-Redirect when
+  DOWNLOAD_ACCEL_REDIRECT_PREFIX is set (nginx does not forward
+  Content-Encoding on internal redirects, so compressed blobs stay here)
+- compressed blobs are sent as stored, with `Content-Encoding: gzip`, to
+  clients that accept gzip and did not ask for a range
+- everything else is decompressed while streaming; ranges seek through
+  the frame index (see blobs.py)
+
+Download counts are buffered in Redis and added to `Model.download_count`
+in one batch by the `flush_download_counts` task.
+
+Redis keys:
+    downloads:pending       hash of model id -> downloads not yet flushed
+    downloads:scheduled     set while a flush task is already queued
+"""
+import hashlib
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from django.utils.text import get_valid_filename
+
+from .blobs import blob_storage
+from .models import Model
+from .scheduler import get_redis
+
+PENDING_KEY = 'downloads:pending'
+SCHEDULED_KEY = 'downloads:scheduled'
+
+CONTENT_TYPES = {
+    'stl': 'model/stl',
+    'gcode': 'text/x-gcode',
+}
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(ValueError):
+    """Raised for a Range header that selects no bytes of the file."""
+
+
+def parse_range(header, size):
+    """
+    Return the inclusive (start, end) of a single-range header, or None to
+    send the whole file.
+
+    Multiple ranges and malformed headers are ignored, as RFC 9110 allows.
+    Raises RangeNotSatisfiable if the range lies outside the file.
+    """
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if match is None or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    if end < start:
+        return None
+    return start, end
+
+
+def etag_for(name):
+    return '"' + hashlib.sha256(name.encode()).hexdigest()[:32] + '"'
+
+
+def _etag_matches(header, etags):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    # Weak comparison, as If-None-Match requires
+    candidates = {tag.strip().removeprefix('W/') for tag in header.split(',')}
+    return any(etag in candidates for etag in etags)
+
+
+def _accepts_gzip(request):
+    return 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+
+
+def iter_file(fileobj, length, chunk_size=None):
+    """Yield `length` bytes from the current position in chunks, then close."""
+    chunk_size = chunk_size or settings.DOWNLOAD_CHUNK_SIZE
+    try:
+        while length > 0:
+            chunk = fileobj.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def download_filename(model, kind):
+    return get_valid_filename(model.model_name or 'model') + f'.{kind}'
+
+
+def _with_headers(response, etag, filename=None):
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = 'private, no-cache'
+    if filename:
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+
+def serve_blob(request, name, filename, content_type):
+    """
+    Build the response for a GET or HEAD of a stored STL or G-code blob.
+
+    Returns (response, counted). `counted` is True when the response starts
+    a download from the first byte, so resumed ranges and cache
+    revalidations are not counted twice.
+    """
+    etag = etag_for(name)
+    gzip_etag = etag[:-1] + '-gz"'
+    if _etag_matches(request.headers.get('If-None-Match'), (etag, gzip_etag)):
+        return _with_headers(HttpResponse(status=304), etag), False
+
+    head = request.method == 'HEAD'
+    range_header = request.headers.get('Range')
+    # A range only applies if the client's copy is still current
+    if_range = request.headers.get('If-Range')
+    if range_header and if_range and if_range.strip() != etag:
+        range_header = None
+
+    compressed = blob_storage.is_compressed(name)
+    if not compressed and settings.DOWNLOAD_ACCEL_REDIRECT_PREFIX:
+        # nginx serves the file itself, ranges included
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.DOWNLOAD_ACCEL_REDIRECT_PREFIX + name
+        return _with_headers(response, etag, filename), not head and _is_first_byte(range_header)
+
+    if compressed and not range_header and _accepts_gzip(request):
+        size = blob_storage.stored_size(name)
+        body = [] if head else iter_file(blob_storage.open_stored(name), size)
+        response = StreamingHttpResponse(body, content_type=content_type)
+        response['Content-Encoding'] = 'gzip'
+        response['Content-Length'] = size
+        return _with_headers(response, gzip_etag, filename), not head
+
+    fileobj = blob_storage.open(name)
+    size = fileobj.size
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        fileobj.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response, False
+
+    start, end = byte_range or (0, size - 1)
+    length = max(end - start + 1, 0)
+    if head:
+        fileobj.close()
+        body = []
+    else:
+        fileobj.seek(start)
+        body = iter_file(fileobj, length)
+
+    response = StreamingHttpResponse(body, content_type=content_type, status=206 if byte_range else 200)
+    response['Content-Length'] = length
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return _with_headers(response, etag, filename), not head and start == 0
+
+
+def _is_first_byte(range_header):
+    match = _RANGE_RE.match(range_header.strip()) if range_header else None
+    return match is None or match.group(1) == '0'
+
+
+def record_download(model_id):
+    """Buffer one download of a model; counts reach the database in batches."""
+    from .tasks import flush_download_counts
+
+    client = get_redis()
+    client.hincrby(PENDING_KEY, str(model_id), 1)
+    # One flush task at a time; it picks up everything counted meanwhile
+    if client.set(SCHEDULED_KEY, 1, nx=True, ex=settings.DOWNLOAD_COUNT_FLUSH_INTERVAL * 10):
+        flush_download_counts.apply_async(countdown=settings.DOWNLOAD_COUNT_FLUSH_INTERVAL)
+
+
+def flush_counts():
+    """Add the buffered download counts to the models. Returns the downloads flushed."""
+    pipe = get_redis().pipeline(transaction=True)
+    pipe.hgetall(PENDING_KEY)
+    pipe.delete(PENDING_KEY)
+    counts, _ = pipe.execute()
+
+    # One UPDATE per distinct count instead of one per model
+    by_count = defaultdict(list)
+    for model_id, count in counts.items():
+        by_count[int(count)].append(Model._meta.pk.to_python(model_id))
+    for count, model_ids in by_count.items():
+        Model.objects.filter(id__in=model_ids).update(download_count=F('download_count') + count)
+    return sum(count * len(model_ids) for count, model_ids in by_count.items())
@@ -0,0 +1,210 @@
+"""
+Duplicate and near-duplicate upload detection.
+
+Exact duplicates share the STL SHA-256; the new upload is pointed at the
+existing blob and its own copy deleted. Near duplicates are found with a
+shape signature that ignores position, rotation and scale:
+
+- a D2 shape distribution: histogram of distances between random point
+  pairs on the surface, divided by their mean distance
+- PCA spread: eigenvalues of the surface point covariance, normalized
+
+Signatures are indexed with p-stable locality-sensitive hashing. Each of
+SHAPE_LSH_TABLES tables hashes the vector to a bucket key stored in
+ShapeBucket; a lookup only compares against signatures sharing a bucket.
+"""
+import logging
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .blobs import blob_storage
+from .models import DuplicateMatch, Model, ShapeBucket, ShapeSignature
+from .stl import parse_stl, read_stl_bytes
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_POINTS = 4096
+SAMPLE_PAIRS = 32768
+D2_BINS = 32
+D2_RANGE = 3.0  # Distances up to 3x the mean distance
+PCA_WEIGHT = 0.5  # Weight of the PCA spread relative to the histogram
+HASHES_PER_TABLE = 4
+SEED = 3217
+
+
+def shape_signature(triangles):
+    """
+    Return the float32 signature vector of a triangle array, or None if the
+    mesh has no surface area.
+
+    Sampling uses a fixed seed, so the same mesh always gives the same vector.
+    """
+    rng = np.random.default_rng(SEED)
+    v0, v1, v2 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    areas = np.linalg.norm(np.cross(v1 - v0, v2 - v0), axis=1)
+    total = areas.sum()
+    if not total > 0:
+        return None
+
+    # Uniform points on the surface: pick triangles by area, then a uniform
+    # point inside each
+    chosen = rng.choice(len(triangles), SAMPLE_POINTS, p=areas / total)
+    r1 = np.sqrt(rng.random(SAMPLE_POINTS))[:, None]
+    r2 = rng.random(SAMPLE_POINTS)[:, None]
+    points = (1 - r1) * v0[chosen] + r1 * (1 - r2) * v1[chosen] + r1 * r2 * v2[chosen]
+
+    a, b = rng.integers(0, SAMPLE_POINTS, (2, SAMPLE_PAIRS))
+    distances = np.linalg.norm(points[a] - points[b], axis=1)
+    mean = distances.mean()
+    if not mean > 0:
+        return None
+    histogram, _ = np.histogram(distances / mean, bins=D2_BINS, range=(0, D2_RANGE))
+    histogram = histogram / SAMPLE_PAIRS
+
+    eigenvalues = np.sort(np.linalg.eigvalsh(np.cov(points, rowvar=False)))[::-1]
+    spread = np.sqrt(np.clip(eigenvalues, 0, None) / eigenvalues.sum())
+
+    return np.concatenate([histogram, PCA_WEIGHT * spread]).astype(np.float32)
+
+
+def signature_distance(a, b):
+    return float(np.linalg.norm(a - b))
+
+
+@lru_cache(maxsize=1)
+def _projections():
+    """Random Gaussian projections and offsets shared by every process."""
+    rng = np.random.default_rng(SEED)
+    dimensions = D2_BINS + 3
+    shape = (settings.SHAPE_LSH_TABLES, HASHES_PER_TABLE)
+    return rng.normal(size=shape + (dimensions,)), rng.uniform(0, settings.SHAPE_LSH_BUCKET_WIDTH, shape)
+
+
+def bucket_keys(vector):
+    """LSH bucket key of the vector in every table."""
+    directions, offsets = _projections()
+    cells = np.floor((directions @ vector + offsets) / settings.SHAPE_LSH_BUCKET_WIDTH).astype(np.int64)
+    return [f'{table}:' + ','.join(map(str, row)) for table, row in enumerate(cells)]
+
+
+def _vector(signature):
+    return np.frombuffer(bytes(signature.vector), dtype=np.float32)
+
+
+def find_near_duplicate(model, vector):
+    """
+    Return (model, distance) of the closest earlier signature within
+    SHAPE_DUPLICATE_MAX_DISTANCE, or None.
+    """
+    candidates = (
+        ShapeSignature.objects
+        .filter(buckets__key__in=bucket_keys(vector), model__created_at__lte=model.created_at)
+        .exclude(model=model)
+        .select_related('model')
+        .distinct()
+    )
+    best = None
+    for candidate in candidates:
+        distance = signature_distance(vector, _vector(candidate))
+        if distance <= settings.SHAPE_DUPLICATE_MAX_DISTANCE and (best is None or distance < best[1]):
+            best = (candidate.model, distance)
+    return best
+
+
+def find_exact_duplicate(model):
+    """
+    Return the earliest model created before this one with the same STL
+    content, or None.
+
+    Only earlier rows (by created_at, then id) count, so two uploads of the
+    same file never pick each other.
+    """
+    if not model.stl_hash:
+        return None
+    return (
+        Model.objects.filter(stl_hash=model.stl_hash)
+        .filter(Q(created_at__lt=model.created_at) | Q(created_at=model.created_at, id__lt=model.id))
+        .exclude(stl_file='').exclude(stl_file__isnull=True)
+        .order_by('created_at', 'id')
+        .first()
+    )
+
+
+def dedupe_blob(model):
+    """
+    Point the model at an existing identical STL blob and delete its own copy.
+
+    Returns True if the blob was replaced. STL blobs are never deleted with
+    their model, so sharing them is safe.
+    """
+    candidate = find_exact_duplicate(model)
+    if candidate is None:
+        return False
+
+    with transaction.atomic():
+        # The lock waits for a dedupe of the original itself to commit, so
+        # its current blob name is read, not one about to be deleted
+        original = Model.objects.select_for_update().filter(pk=candidate.pk).first()
+        if original is None or not original.stl_file or original.stl_file.name == model.stl_file.name:
+            return False
+        if not blob_storage.exists(original.stl_file.name):
+            return False
+
+        duplicate_name = model.stl_file.name
+        model.stl_file.name = original.stl_file.name
+        model.save(update_fields=['stl_file'])
+        transaction.on_commit(lambda: blob_storage.delete(duplicate_name))
+    return True
+
+
+def index_model(model):
+    """
+    Compute and index the model's shape signature and record the best match.
+
+    Returns the ShapeSignature, or None if the mesh has no surface.
+    """
+    exact = find_exact_duplicate(model)
+    if exact is not None:
+        # Identical content has an identical signature; reuse it
+        source = ShapeSignature.objects.filter(model=exact).first()
+        vector = _vector(source) if source else None
+    else:
+        vector = None
+    if vector is None:
+        model.stl_file.open('rb')
+        try:
+            vector = shape_signature(parse_stl(read_stl_bytes(model.stl_file)))
+        finally:
+            model.stl_file.close()
+    if vector is None:
+        return None
+
+    match, distance, kind = None, None, ''
+    if exact is not None:
+        match, distance, kind = exact, 0.0, DuplicateMatch.EXACT
+    else:
+        near = find_near_duplicate(model, vector)
+        if near is not None:
+            (match, distance), kind = near, DuplicateMatch.NEAR
+
+    with transaction.atomic():
+        signature, _ = ShapeSignature.objects.update_or_create(
+            model=model,
+            defaults={
+                'vector': vector.tobytes(),
+                'duplicate_of': match,
+                'duplicate_match': kind,
+                'duplicate_distance': distance,
+            },
+        )
+        signature.buckets.all().delete()
+        ShapeBucket.objects.bulk_create(
+            ShapeBucket(signature=signature, key=key) for key in bucket_keys(vector)
+        )
+    if match is not None:
+        logger.info('Model %s matches %s (%s, %.4f)', model.id, match.id, kind, distance)
+    return signature
@@ -0,0 +1,125 @@
+"""
+Facet counts for the marketplace sidebar.
+
+`model_facets` counts the models of a filtered queryset per category, tag,
+price bucket and `is_featured` in a single aggregate query:
+
+    WITH filtered AS (<the listing query>)
+    SELECT ... FROM filtered
+    CROSS JOIN LATERAL (SELECT NULL UNION ALL SELECT DISTINCT <each tag>) AS t(tag)
+    GROUP BY GROUPING SETS ((category), (tag), (price_bucket), (is_featured), ())
+
+Each model contributes one row with a NULL tag, counted by the other
+facets, plus one row per distinct tag, counted by the tag facet; so no
+count(DISTINCT) has to sort the unnested rows. Only the FACETS_TAG_LIMIT
+most common tags are returned.
+
+The sidebar asks for the same counts on every page view, so
+`cached_model_facets` keeps them for FACETS_CACHE_TTL seconds per
+combination of filters.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+CACHE_PREFIX = 'model-facets:'
+# Query params that change the counts; pagination and ordering do not
+FILTER_PARAMS = ('search', 'category', 'tag', 'is_featured')
+
+FACETS_SQL = """
+WITH filtered AS ({filtered})
+SELECT facet, value, count FROM (
+    SELECT
+        CASE
+            WHEN GROUPING(f.category) = 0 THEN 'category'
+            WHEN GROUPING(t.tag) = 0 THEN 'tag'
+            WHEN GROUPING(b.price_bucket) = 0 THEN 'price'
+            WHEN GROUPING(f.is_featured) = 0 THEN 'is_featured'
+            ELSE 'total'
+        END AS facet,
+        COALESCE(f.category, t.tag, b.price_bucket::text, f.is_featured::text) AS value,
+        CASE WHEN GROUPING(t.tag) = 0 THEN count(t.tag) ELSE count(*) FILTER (WHERE t.tag IS NULL) END AS count,
+        row_number() OVER (
+            PARTITION BY GROUPING(f.category, t.tag, b.price_bucket, f.is_featured)
+            ORDER BY count(t.tag) DESC, t.tag ASC
+        ) AS position
+    FROM filtered f
+    CROSS JOIN LATERAL (
+        SELECT NULL::text
+        UNION ALL
+        SELECT DISTINCT jsonb_array_elements_text(
+            CASE WHEN jsonb_typeof(f.tags) = 'array' THEN f.tags ELSE '[]'::jsonb END
+        )
+    ) AS t(tag)
+    CROSS JOIN LATERAL (
+        SELECT CASE WHEN COALESCE(f.price, 0) <= 0 THEN 0
+                    ELSE 1 + width_bucket(f.price, %s::numeric[]) END
+    ) AS b(price_bucket)
+    GROUP BY GROUPING SETS ((f.category), (t.tag), (b.price_bucket), (f.is_featured), ())
+) AS facets
+WHERE (facet <> 'tag' OR position <= %s) AND NOT (facet = 'tag' AND value IS NULL)
+"""
+
+
+def _price_range(bucket, edges):
+    """(min, max) in TWD of a price bucket; bucket 0 is free, max None is open-ended."""
+    if bucket == 0:
+        return 0, 0
+    low = edges[bucket - 2] if bucket >= 2 else 0
+    high = edges[bucket - 1] if bucket - 1 < len(edges) else None
+    return low, high
+
+
+def model_facets(queryset):
+    """Counts per category, tag, price bucket and is_featured for a Model queryset."""
+    edges = list(settings.FACETS_PRICE_BUCKETS)
+    filtered = queryset.order_by().values('id', 'category', 'tags', 'price', 'is_featured')
+    filtered_sql, filtered_params = filtered.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            FACETS_SQL.format(filtered=filtered_sql),
+            (*filtered_params, edges, settings.FACETS_TAG_LIMIT),
+        )
+        rows = cursor.fetchall()
+
+    facets = {'total': 0, 'category': [], 'tags': [], 'price': [], 'is_featured': []}
+    for facet, value, count in rows:
+        if facet == 'total':
+            facets['total'] = count
+        elif facet == 'tag':
+            facets['tags'].append({'value': value, 'count': count})
+        elif facet == 'price':
+            low, high = _price_range(int(value), edges)
+            facets['price'].append({'min': low, 'max': high, 'count': count})
+        elif facet == 'is_featured':
+            facets['is_featured'].append({'value': value == 'true', 'count': count})
+        else:
+            facets[facet].append({'value': value, 'count': count})
+    facets['category'].sort(key=lambda item: (-item['count'], item['value'] or ''))
+    facets['tags'].sort(key=lambda item: (-item['count'], item['value']))
+    facets['price'].sort(key=lambda item: item['min'] if item['max'] != 0 else -1)
+    facets['is_featured'].sort(key=lambda item: not item['value'])
+    return facets
+
+
+def cache_key(query_params):
+    """Cache key for the filters among `query_params`, independent of their order."""
+    filters = {
+        name: sorted(query_params.getlist(name))
+        for name in FILTER_PARAMS if query_params.getlist(name)
+    }
+    digest = hashlib.sha256(json.dumps(filters, sort_keys=True).encode()).hexdigest()
+    return CACHE_PREFIX + digest
+
+
+def cached_model_facets(queryset, query_params):
+    """model_facets(queryset), cached for FACETS_CACHE_TTL under the filters in query_params."""
+    key = cache_key(query_params)
+    facets = cache.get(key)
+    if facets is None:
+        facets = model_facets(queryset)
+        cache.set(key, facets, settings.FACETS_CACHE_TTL)
+    return facets
@@ -0,0 +1,396 @@
+"""
+G-code metadata parsing.
+
+PrusaSlicer appends a comment block of `; key = value` lines to the end of
+every G-code file with filament usage and time estimates. That footer is
+read through a memory map, touching only the last pages of the file. Values
+the footer does not carry (layer count and max Z on most PrusaSlicer
+versions) come from a single forward scan over a fixed-size buffer, so
+memory use stays constant no matter how large the file is.
+
+`iter_moves` reads every motion command for the toolpath preview and the
+print time simulation. It reads the file in line-aligned blocks and
+carries the modal state (position, feed, absolute/relative modes, layer
+count) from one block to the next, so memory stays bounded by the block
+size. Within a block, parsing is vectorized with NumPy: lines, parameters
+and numbers are located and converted as whole arrays, never line by line.
+"""
+import mmap
+import os
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+
+FOOTER_READ_BYTES = 64 * 1024
+SCAN_BLOCK_SIZE = 4 * 1024 * 1024
+
+_COMMENT_RE = re.compile(rb'^;\s*([^=\n]+?)\s*=\s*(.*?)\s*$', re.MULTILINE)
+_DURATION_RE = re.compile(r'(\d+)\s*([dhms])')
+_DURATION_UNITS = {'d': 86400, 'h': 3600, 'm': 60, 's': 1}
+
+# PrusaSlicer marks every layer with ";LAYER_CHANGE" followed by ";Z:<height>"
+_LAYER_MARKER = b';LAYER_CHANGE'
+_LAYER_Z_MARKER = b'\n;Z:'
+
+_LAYER_COUNT_KEYS = ('total layers count', 'total_layer_count')
+_MAX_Z_KEYS = ('max_layer_z',)
+
+
+def parse_duration(value):
+    """Convert a PrusaSlicer duration such as '1d 2h 3m 4s' to seconds."""
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(int(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def format_duration(seconds):
+    """Format seconds the way PrusaSlicer does, e.g. '1h 2m 3s'."""
+    parts = []
+    for unit, size in _DURATION_UNITS.items():
+        amount, seconds = divmod(int(seconds), size)
+        if amount or parts or unit == 's':
+            parts.append(f'{amount}{unit}')
+    return ' '.join(parts)
+
+
+def _to_float(value):
+    try:
+        # Multi-extruder files list one value per extruder
+        return sum(float(v) for v in value.split(','))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _first(comments, keys):
+    for key in keys:
+        if key in comments:
+            return comments[key]
+    return None
+
+
+def parse_footer(tail):
+    """Return the `; key = value` comments in a block of G-code bytes."""
+    return {
+        key.decode('utf-8', 'replace'): value.decode('utf-8', 'replace')
+        for key, value in _COMMENT_RE.findall(tail)
+    }
+
+
+def read_footer(path, size=FOOTER_READ_BYTES):
+    """Return the `; key = value` comments from the last `size` bytes."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return {}
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            tail = mm[max(0, len(mm) - size):]
+    return parse_footer(tail)
+
+
+def scan_layers(path, block_size=SCAN_BLOCK_SIZE):
+    """
+    Count layers and find the max Z in one forward pass.
+
+    Reads into a single reusable buffer and only looks at complete lines;
+    a partial line at the end of a block is carried into the next one,
+    together with the newline before it, so a `\n;Z:` marker split at
+    that newline is still found.
+    """
+    buf = bytearray(block_size)
+    view = memoryview(buf)
+    carry = 0
+    layer_count = 0
+    max_z = None
+
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(view[carry:])
+            end = carry + n
+            if n == 0:
+                cut = end
+            else:
+                # Byte 0 may be the newline carried from the last block
+                cut = buf.rfind(b'\n', 1, end) + 1
+                if cut == 0:
+                    # Line longer than the buffer; process it as is
+                    cut = end
+
+            layer_count += buf.count(_LAYER_MARKER, 0, cut)
+            # bytes.find is much faster than a regex over the whole block,
+            # and there is only one match per layer
+            pos = buf.find(_LAYER_Z_MARKER, 0, cut)
+            while pos != -1:
+                start = pos + len(_LAYER_Z_MARKER)
+                line_end = buf.find(b'\n', start, cut)
+                try:
+                    z = float(buf[start:line_end if line_end != -1 else cut])
+                except ValueError:
+                    z = None
+                if z is not None and (max_z is None or z > max_z):
+                    max_z = z
+                pos = buf.find(_LAYER_Z_MARKER, start, cut)
+
+            if n == 0:
+                break
+            keep = cut - 1 if cut and buf[cut - 1] == 10 else cut
+            carry = end - keep
+            buf[:carry] = buf[keep:end]
+
+    return {'layer_count': layer_count or None, 'max_z_mm': max_z}
+
+
+def summarize(comments):
+    """Pick the values the platform uses out of the raw footer comments."""
+    time_str = comments.get('estimated printing time (normal mode)')
+    layer_count = _first(comments, _LAYER_COUNT_KEYS)
+    return {
+        'filament_used_mm': _to_float(comments.get('filament used [mm]')),
+        'filament_used_cm3': _to_float(comments.get('filament used [cm3]')),
+        'weight_g': _to_float(
+            comments.get('total filament used [g]') or comments.get('filament used [g]')
+        ),
+        'print_time': time_str,
+        'print_time_s': parse_duration(time_str) if time_str else None,
+        'layer_count': int(layer_count) if layer_count and layer_count.isdigit() else None,
+        'max_z_mm': _to_float(_first(comments, _MAX_Z_KEYS)),
+    }
+
+
+def parse_gcode_metadata(path):
+    """
+    Parse filament usage, print time, layer count and max Z from a G-code file.
+
+    Uses only the footer when it has everything, otherwise adds one forward
+    scan for the missing layer data.
+    """
+    metadata = summarize(read_footer(path))
+    metadata['gcode_parse_mode'] = 'footer'
+    if metadata['layer_count'] is None or metadata['max_z_mm'] is None:
+        scanned = scan_layers(path)
+        for key, value in scanned.items():
+            if metadata[key] is None:
+                metadata[key] = value
+        metadata['gcode_parse_mode'] = 'scan'
+    return metadata
+
+
+NUMBER_WIDTH = 16
+AXES = 'XYZEF'
+_DIGITS = np.frombuffer(b'0123456789', dtype=np.uint8)
+_POWERS = 10.0 ** np.arange(NUMBER_WIDTH + 1)
+
+
+@dataclass
+class Moves:
+    """
+    Motion commands of a G-code file, one entry per G0-G3.
+
+    Positions are absolute, in mm, after each move; `start` is the position
+    before the first move. `e` is the filament pushed (negative for
+    retractions) and `f` the modal feed rate in mm/min. `layer` counts
+    ;LAYER_CHANGE markers before the move, -1 before the first one.
+    """
+    start: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    z: np.ndarray
+    e: np.ndarray
+    f: np.ndarray
+    layer: np.ndarray
+
+    def __len__(self):
+        return len(self.x)
+
+
+@dataclass
+class ModalState:
+    """Parser state carried from one block of G-code to the next."""
+    position: np.ndarray = field(default_factory=lambda: np.zeros(4))  # X, Y, Z, E
+    xyz_absolute: bool = True
+    e_absolute: bool = True
+    feed: float = 0.0
+    layers: int = 0  # ;LAYER_CHANGE markers seen so far
+
+
+def _parse_numbers(buf, positions):
+    """
+    Parse the decimal numbers starting at `positions` in a padded buffer.
+
+    Digits are accumulated column by column into an integer mantissa for
+    all numbers at once, stopping once every number has ended.
+    """
+    mantissa = np.zeros(len(positions), dtype=np.int64)
+    decimals = np.zeros(len(positions), dtype=np.int64)
+    first = buf[positions]
+    negative = first == 45
+    active = np.ones(len(positions), dtype=bool)
+    after_dot = np.zeros(len(positions), dtype=bool)
+    offset = positions + ((first == 45) | (first == 43))
+    for column in range(NUMBER_WIDTH):
+        chars = buf[offset + column]
+        digits = chars - np.uint8(48)
+        is_digit = digits < 10
+        is_dot = (chars == 46) & ~after_dot
+        active &= is_digit | is_dot
+        if not active.any():
+            break
+        take = active & is_digit
+        mantissa = np.where(take, mantissa * 10 + digits, mantissa)
+        decimals += take & after_dot
+        after_dot |= active & is_dot
+    # Parameters without a number ("G92 E") come out as zero
+    values = mantissa / _POWERS[decimals]
+    values[negative] *= -1
+    return values
+
+
+def _is_command(buf, starts, text):
+    """Lines that hold exactly the command `text`, e.g. b'G1' but not b'G10'."""
+    match = np.ones(len(starts), dtype=bool)
+    for i, char in enumerate(text):
+        match &= buf[starts + i] == char
+    return match & ~np.isin(buf[starts + len(text)], _DIGITS)
+
+
+def _forward_fill(values, present, initial):
+    """Carry the last present value forward; `initial` before the first one."""
+    index = np.where(present, np.arange(len(values)), -1)
+    np.maximum.accumulate(index, out=index)
+    return np.where(index >= 0, values[np.maximum(index, 0)], initial)
+
+
+def _positions(value, present, absolute, assign, initial):
+    """
+    Track one axis through absolute and relative moves.
+
+    Relative moves add to a running sum, and absolute moves and G92 set an
+    anchor so that position = anchor + running sum. The anchor starts at
+    `initial`, the position before the block.
+    """
+    delta = np.where(present & ~absolute & ~assign, value, 0.0)
+    running = np.cumsum(delta)
+    set_here = present & (absolute | assign)
+    return _forward_fill(value - running, set_here, initial) + running
+
+
+def iter_moves(fileobj, block_size=SCAN_BLOCK_SIZE):
+    """
+    Parse every G0-G3 move of an open G-code file, a block at a time.
+
+    Yields one Moves per block of about `block_size` bytes, cut after the
+    last complete line; `start` of each is the position the block begins
+    at and layers are numbered across the whole file.
+    """
+    state = ModalState()
+    carry = b''
+    while True:
+        block = fileobj.read(block_size)
+        data = carry + block if carry else block
+        if not block:
+            if data:
+                yield _parse_block(data, state)
+            return
+        cut = data.rfind(b'\n') + 1
+        if cut == 0:
+            # No line end yet; keep reading
+            carry = data
+            continue
+        carry = data[cut:]
+        yield _parse_block(data[:cut] if carry else data, state)
+
+
+def parse_moves(data):
+    """
+    Parse every G0-G3 move of G-code held in `data` (bytes).
+
+    Honours G90/G91, M82/M83 and G92. Arcs (G2/G3) are taken as straight
+    lines to their end point. For files, use iter_moves.
+    """
+    return _parse_block(data, ModalState())
+
+
+def _parse_block(data, state):
+    """Parse the moves of complete G-code lines, continuing from `state` and updating it."""
+    buf = np.frombuffer(data, dtype=np.uint8)
+    size = len(buf)
+    buf = np.concatenate([buf, np.zeros(NUMBER_WIDTH + 16, dtype=np.uint8)])
+
+    newlines = np.flatnonzero(buf[:size] == 10)
+    starts = np.concatenate([[0], newlines + 1])
+    starts = starts[starts < size]
+    ends = np.append(starts[1:] - 1, size)
+
+    is_move = np.zeros(len(starts), dtype=bool)
+    for command in (b'G0', b'G1', b'G2', b'G3'):
+        is_move |= _is_command(buf, starts, command)
+    is_g92 = _is_command(buf, starts, b'G92')
+    g90 = _is_command(buf, starts, b'G90')
+    g91 = _is_command(buf, starts, b'G91')
+    m82 = _is_command(buf, starts, b'M82')
+    m83 = _is_command(buf, starts, b'M83')
+    marker = (buf[starts] == 59) & (buf[starts + 1] == ord('L'))
+    marker[marker] = (
+        buf[starts[marker][:, None] + np.arange(len(_LAYER_MARKER))] == np.frombuffer(_LAYER_MARKER, np.uint8)
+    ).all(axis=1)
+
+    rows = np.flatnonzero(is_move | is_g92 | g90 | g91 | m82 | m83)
+    row_starts = starts[rows]
+    # Comments end the parameters of a line
+    semicolons = np.flatnonzero(buf[:size] == 59)
+    following = np.searchsorted(semicolons, row_starts)
+    first_semicolon = np.append(semicolons, size)[following]
+    row_ends = np.minimum(ends[rows], first_semicolon)
+
+    values = {}
+    for axis in AXES:
+        letter = np.flatnonzero(buf[:size] == ord(axis))
+        letter = letter[buf[letter - 1] == 32]
+        row = np.searchsorted(row_starts, letter, side='right') - 1
+        keep = (row >= 0) & (letter < row_ends[np.maximum(row, 0)])
+        letter, row = letter[keep], row[keep]
+        value = np.full(len(rows), np.nan)
+        value[row] = _parse_numbers(buf, letter + 1)
+        values[axis] = value
+
+    row_move = is_move[rows]
+    row_g92 = is_g92[rows]
+    # G90/G91 switch every axis; M82/M83 switch E only
+    xyz_mode = np.where(g90[rows], 1, np.where(g91[rows], 0, -1))
+    xyz_absolute = _forward_fill(xyz_mode, xyz_mode >= 0, int(state.xyz_absolute)).astype(bool)
+    e_mode = np.where(g90[rows] | m82[rows], 1, np.where(g91[rows] | m83[rows], 0, -1))
+    e_absolute = _forward_fill(e_mode, e_mode >= 0, int(state.e_absolute)).astype(bool)
+
+    # A bare G92 zeroes every axis
+    bare_g92 = row_g92 & np.all([np.isnan(values[a]) for a in 'XYZE'], axis=0)
+    position = {}
+    for i, axis in enumerate('XYZE'):
+        value = np.where(bare_g92, 0.0, values[axis])
+        present = (row_move | row_g92) & ~np.isnan(value)
+        absolute = e_absolute if axis == 'E' else xyz_absolute
+        position[axis] = _positions(np.nan_to_num(value), present, absolute, row_g92, state.position[i])
+
+    extruded = np.diff(position['E'], prepend=state.position[3])
+    extruded[row_g92] = 0.0
+    feed = _forward_fill(values['F'], ~np.isnan(values['F']), state.feed)
+
+    move_rows = np.flatnonzero(row_move)
+    first = move_rows[0] - 1 if len(move_rows) else -1
+    start = np.array([position[a][first] for a in 'XYZ']) if first >= 0 else state.position[:3].copy()
+    marker_starts = starts[marker]
+    layer_base = state.layers
+    if len(rows):
+        state.position = np.array([position[a][-1] for a in 'XYZE'])
+        state.xyz_absolute = bool(xyz_absolute[-1])
+        state.e_absolute = bool(e_absolute[-1])
+        state.feed = float(feed[-1])
+    state.layers += len(marker_starts)
+    return Moves(
+        start=start,
+        x=position['X'][move_rows],
+        y=position['Y'][move_rows],
+        z=position['Z'][move_rows],
+        e=extruded[move_rows],
+        f=feed[move_rows],
+        layer=layer_base + np.searchsorted(marker_starts, row_starts[move_rows], side='right') - 1,
+    )
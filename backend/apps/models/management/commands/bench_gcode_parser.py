@@ -0,0 +1,86 @@
+"""
+Management command to benchmark the G-code metadata parser.
+
+Generates a synthetic PrusaSlicer-style G-code file of the requested size
+and reports parse time and peak RSS growth. RSS growth should stay at a few
+MB regardless of file size.
+
+Usage:
+    python manage.py bench_gcode_parser --size-mb 1024
+    python manage.py bench_gcode_parser --size-mb 1024 --footer-only
+"""
+
+import os
+import resource
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.models.gcode import parse_gcode_metadata
+
+FOOTER = (
+    b'; filament used [mm] = 123456.78\n'
+    b'; filament used [cm3] = 296.95\n'
+    b'; filament used [g] = 368.22\n'
+    b'; total filament used [g] = 368.22\n'
+    b'; estimated printing time (normal mode) = 1d 2h 3m 4s\n'
+)
+
+
+def peak_rss_kb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def write_gcode(path, size_bytes, layer_footer):
+    """Write layers of extrusion moves until the file reaches size_bytes."""
+    moves = b''.join(
+        b'G1 X%.3f Y%.3f E%.5f\n' % (i * 0.1, i * 0.2, i * 0.01) for i in range(200)
+    )
+    layer = 0
+    written = 0
+    with open(path, 'wb') as f:
+        while written < size_bytes:
+            layer += 1
+            block = b';LAYER_CHANGE\n;Z:%.2f\n;HEIGHT:0.2\n' % (layer * 0.2) + moves
+            f.write(block)
+            written += len(block)
+        f.write(FOOTER)
+        if layer_footer:
+            f.write(b'; total layers count = %d\n; max_layer_z = %.2f\n' % (layer, layer * 0.2))
+    return layer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark G-code metadata parsing time and memory on a synthetic file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=1024, help='Size of the generated G-code file')
+        parser.add_argument('--footer-only', action='store_true', help='Include layer data in the footer so no scan is needed')
+        parser.add_argument('--dir', type=str, default=None, help='Directory for the temporary file')
+
+    def handle(self, *args, **options):
+        size = options['size_mb'] * 1024 * 1024
+        fd, path = tempfile.mkstemp(suffix='.gcode', dir=options['dir'])
+        os.close(fd)
+        try:
+            self.stdout.write(f'Writing {options["size_mb"]} MB of G-code to {path}...')
+            layers = write_gcode(path, size, options['footer_only'])
+
+            rss_before = peak_rss_kb()
+            start = time.perf_counter()
+            metadata = parse_gcode_metadata(path)
+            elapsed = time.perf_counter() - start
+            rss_growth = peak_rss_kb() - rss_before
+        finally:
+            os.unlink(path)
+
+        self.stdout.write(f'Mode:            {metadata["gcode_parse_mode"]}')
+        self.stdout.write(f'Layers:          {metadata["layer_count"]} (expected {layers})')
+        self.stdout.write(f'Max Z:           {metadata["max_z_mm"]}')
+        self.stdout.write(f'Parse time:      {elapsed:.2f}s ({size / elapsed / 1024 ** 2:.0f} MB/s)')
+        self.stdout.write(f'Peak RSS growth: {rss_growth / 1024:.1f} MB')
+
+        if metadata['layer_count'] != layers:
+            self.stderr.write(self.style.ERROR('Layer count mismatch'))
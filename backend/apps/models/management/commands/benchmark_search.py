@@ -0,0 +1,111 @@
+"""
+Management command to benchmark model search against the old ILIKE filter.
+
+Generates synthetic public models inside a transaction, times the first
+page of each query with the full-text/trigram search and with the ILIKE
+filter it replaced, and rolls everything back. Needs PostgreSQL; run it
+against a development or staging database, as inserting the rows takes a
+while and holds the transaction open.
+
+Usage:
+    python manage.py benchmark_search
+    python manage.py benchmark_search --rows 100000 --repeat 3
+"""
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from apps.models.models import Model, VisibilityStatus
+from apps.models.search import search_models
+
+WORDS = [
+    'dragon', 'gear', 'vase', 'benchy', 'boat', 'calibration', 'cube', 'stand', 'phone', 'holder',
+    'planetary', 'gearbox', 'skull', 'articulated', 'flexi', 'hook', 'clip', 'bracket', 'mount', 'case',
+    'box', 'lid', 'hinge', 'knob', 'spool', 'filament', 'guide', 'fan', 'duct', 'shroud',
+    'cable', 'chain', 'organizer', 'tray', 'cup', 'bowl', 'planter', 'pot', 'lamp', 'shade',
+    'figure', 'miniature', 'terrain', 'castle', 'tower', 'house', 'car', 'rocket', 'robot', 'helmet',
+    'mask', 'sword', 'shield', 'key', 'whistle', 'puzzle', 'toy', 'cookie', 'cutter', 'stamp',
+]
+# Rare words appear in one row in RARE_EVERY, like an uncommon brand name
+RARE_WORD = 'voronoi'
+RARE_EVERY = 10000
+QUERIES = ['dragon', 'voronoi', 'planetary gearbox', 'calibraton', 'vase -spiral', 'articulated dragon']
+PAGE_SIZE = 24
+
+INSERT_SQL = """
+INSERT INTO model (
+    id, owner_id, model_name, description, tags, category, visibility_status,
+    stl_file_path, stl_hash, download_count, view_count, is_featured, created_at, updated_at
+)
+SELECT
+    gen_random_uuid(), %(owner)s,
+    initcap(w[1 + floor(random() * n)::int] || ' ' || w[1 + floor(random() * n)::int]) || ' ' || i,
+    concat_ws(' ', 'A printable', w[1 + floor(random() * n)::int], 'for your',
+              w[1 + floor(random() * n)::int], 'with', w[1 + floor(random() * n)::int],
+              CASE WHEN i %% %(rare_every)s = 0 THEN %(rare)s END),
+    jsonb_build_array(w[1 + floor(random() * n)::int], w[1 + floor(random() * n)::int]),
+    'OTHER', %(visibility)s, '', '', 0, 0, false,
+    now() - i * interval '1 second', now()
+FROM generate_series(1, %(rows)s) AS i,
+     (SELECT %(words)s::text[] AS w, cardinality(%(words)s::text[]) AS n) AS words
+"""
+
+
+def ilike_search(queryset, text):
+    """The query DRF's SearchFilter built: every term in any field, by ILIKE."""
+    for term in text.split():
+        queryset = queryset.filter(
+            Q(model_name__icontains=term) | Q(description__icontains=term)
+            | Q(owner__email__icontains=term) | Q(category__icontains=term)
+        )
+    return queryset.order_by('-created_at', '-id')
+
+
+class Command(BaseCommand):
+    help = 'Benchmark full-text model search on synthetic data (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Synthetic models to generate')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Search benchmarks need PostgreSQL')
+
+        with transaction.atomic():
+            owner = get_user_model().objects.create(email='search-benchmark@example.invalid')
+            self.stdout.write(f"Generating {options['rows']:,} models...")
+            started = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute(INSERT_SQL, {
+                    'owner': owner.pk, 'rows': options['rows'], 'words': WORDS,
+                    'rare': RARE_WORD, 'rare_every': RARE_EVERY, 'visibility': VisibilityStatus.PUBLIC,
+                })
+                cursor.execute('ANALYZE model')
+            self.stdout.write(f'  done in {time.perf_counter() - started:.1f}s (includes the search trigger)')
+
+            public = Model.objects.filter(visibility_status=VisibilityStatus.PUBLIC)
+            self.stdout.write(f"{'query':<22} {'matches':>9} {'search ms':>10} {'ILIKE ms':>10}")
+            for text in QUERIES:
+                search_ms = self._time(
+                    lambda: search_models(public, text).order_by('-search_rank', '-id'), options['repeat']
+                )
+                ilike_ms = self._time(lambda: ilike_search(public, text), options['repeat'])
+                matches = search_models(public, text).count()
+                self.stdout.write(f'{text:<22} {matches:>9,} {search_ms:>10.1f} {ilike_ms:>10.1f}')
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Rolled back the synthetic models'))
+
+    def _time(self, build_queryset, repeat):
+        """Median milliseconds to build the queryset and fetch its first page."""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(build_queryset().values_list('id', flat=True)[:PAGE_SIZE])
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
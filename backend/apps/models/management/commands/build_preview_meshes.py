@@ -0,0 +1,51 @@
+"""
+Management command to build viewer LOD meshes for models that have none.
+
+Usage:
+    python manage.py build_preview_meshes
+    python manage.py build_preview_meshes --limit 100
+    python manage.py build_preview_meshes --queue
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.models import preview_mesh
+from apps.models.models import Model
+from apps.models.stl import STLError
+from apps.models.tasks import build_preview_meshes
+
+
+class Command(BaseCommand):
+    help = 'Build quantized preview meshes (backfill for older uploads)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help='Maximum number of models to process')
+        parser.add_argument('--queue', action='store_true', help='Hand the models to the worker instead of building here')
+
+    def handle(self, *args, **options):
+        models = (
+            Model.objects.filter(preview_meshes__isnull=True)
+            .exclude(stl_file='').exclude(stl_file__isnull=True)
+            .order_by('-created_at')
+        )
+        if options['limit']:
+            models = models[:options['limit']]
+
+        built = 0
+        for model in models:
+            if options['queue']:
+                build_preview_meshes.delay(model.id)
+                built += 1
+                continue
+            try:
+                meshes = preview_mesh.build_preview_meshes(model)
+            except STLError as e:
+                self.stderr.write(f'{model.id}: {e}')
+                continue
+            built += 1
+            self.stdout.write(f'{model.id}: ' + ', '.join(
+                f"lod{m['level']} {m['triangles']} tris {m['size']} B" for m in meshes
+            ))
+
+        verb = 'Queued' if options['queue'] else 'Built preview meshes for'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {built} models'))
@@ -0,0 +1,48 @@
+"""
+Management command to build toolpath previews for cached slicing results
+that have none.
+
+Usage:
+    python manage.py build_toolpaths
+    python manage.py build_toolpaths --limit 100
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.models import toolpath
+from apps.models.blobs import blob_storage
+from apps.models.models import Model, SlicingCacheEntry
+
+
+class Command(BaseCommand):
+    help = 'Build layer toolpath previews from cached G-code (backfill for older slices)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help='Maximum number of G-code files to process')
+
+    def handle(self, *args, **options):
+        entries = SlicingCacheEntry.objects.exclude(slicing_info__has_key='toolpath').order_by('-last_used_at')
+        if options['limit']:
+            entries = entries[:options['limit']]
+
+        built = 0
+        for entry in entries:
+            if not blob_storage.exists(entry.gcode_file_path):
+                continue
+            try:
+                with blob_storage.open(entry.gcode_file_path) as f:
+                    paths = toolpath.collect_paths(f)
+            except (ValueError, IndexError) as e:
+                self.stderr.write(f'{entry.gcode_file_path}: could not be parsed ({e})')
+                continue
+            info = toolpath.store_toolpath(paths, entry.gcode_file_path)
+
+            entry.slicing_info['toolpath'] = info
+            entry.save(update_fields=['slicing_info'])
+            for model in Model.objects.filter(gcode_file_path=entry.gcode_file_path):
+                model.slicing_info = {**(model.slicing_info or {}), 'toolpath': info}
+                model.save(update_fields=['slicing_info'])
+            built += 1
+            self.stdout.write(f"{entry.gcode_file_path}: {info['layer_count']} layers, {info['size']} B")
+
+        self.stdout.write(self.style.SUCCESS(f'Built {built} toolpath previews'))
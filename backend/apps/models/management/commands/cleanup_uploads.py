@@ -0,0 +1,42 @@
+"""
+Management command to remove stale chunked upload sessions.
+
+Usage:
+    python manage.py cleanup_uploads
+    python manage.py cleanup_uploads --hours 6
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.models.models import UploadSession, UploadStatus
+from apps.models.uploads import discard
+
+
+class Command(BaseCommand):
+    help = 'Abort chunked uploads that have not received data recently and delete their chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int, default=settings.CHUNKED_UPLOAD_EXPIRY_HOURS,
+            help='Age in hours after which an inactive session is removed'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        # FINALIZING sessions this old belong to a finalize call that died
+        stale = UploadSession.objects.filter(
+            status__in=[UploadStatus.ACTIVE, UploadStatus.FINALIZING], updated_at__lt=cutoff
+        )
+
+        count = 0
+        for session in stale:
+            discard(session)
+            session.status = UploadStatus.ABORTED
+            session.save(update_fields=['status', 'updated_at'])
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Removed {count} stale upload sessions'))
@@ -0,0 +1,70 @@
+"""
+Management command to compress STL and G-code blobs stored before
+compression was enabled.
+
+Usage:
+    python manage.py compress_blobs
+    python manage.py compress_blobs --limit 100
+    python manage.py compress_blobs --dry-run
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.models.blobs import blob_storage
+from apps.models.models import Model, SlicingCacheEntry
+
+
+class Command(BaseCommand):
+    help = 'Rewrite uncompressed STL and G-code blobs in compressed form'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help='Maximum number of blobs to compress')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the blobs that would be compressed')
+
+    def compress(self, name, dry_run):
+        """Write a compressed copy of `name`; returns (new name, bytes before, bytes after)."""
+        before = blob_storage.stored_size(name)
+        if dry_run:
+            return name, before, before
+        with blob_storage.open(name) as f:
+            new_name = blob_storage.save(name, f)
+        return new_name, before, blob_storage.stored_size(new_name)
+
+    def blobs(self):
+        # Identical uploads share one blob, so each name is handled once
+        stl_names = (
+            Model.objects.exclude(stl_file='').exclude(stl_file__isnull=True)
+            .values_list('stl_file', flat=True).distinct()
+        )
+        for name in stl_names.iterator():
+            yield 'stl', name
+        for name in SlicingCacheEntry.objects.values_list('gcode_file_path', flat=True).iterator():
+            yield 'gcode', name
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        count = saved = 0
+        for kind, name in self.blobs():
+            if options['limit'] and count >= options['limit']:
+                break
+            if not blob_storage.exists(name) or blob_storage.is_compressed(name):
+                continue
+
+            new_name, before, after = self.compress(name, dry_run)
+            if not dry_run:
+                if kind == 'stl':
+                    Model.objects.filter(stl_file=name).update(stl_file=new_name)
+                else:
+                    SlicingCacheEntry.objects.filter(gcode_file_path=name).update(
+                        gcode_file_path=new_name, gcode_size=after
+                    )
+                    Model.objects.filter(gcode_file_path=name).update(gcode_file_path=new_name)
+                blob_storage.delete(name)
+            count += 1
+            saved += before - after
+            self.stdout.write(f'{name}: {before} -> {after} bytes')
+
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f'Would compress {count} blobs'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Compressed {count} blobs, saving {saved} bytes'))
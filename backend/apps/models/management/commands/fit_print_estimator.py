@@ -0,0 +1,36 @@
+"""
+Management command to refit the geometry-based print estimator.
+
+Usage:
+    python manage.py fit_print_estimator
+    python manage.py fit_print_estimator --reset
+"""
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from apps.models import print_estimate
+
+
+class Command(BaseCommand):
+    help = 'Fit the print time and support estimator against completed slicer results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Discard fitted coefficients and use the defaults')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            cache.delete(print_estimate.CACHE_KEY)
+            self.stdout.write(self.style.SUCCESS('Using default coefficients'))
+            return
+
+        coefficients = print_estimate.refit()
+        if coefficients is None:
+            self.stdout.write(self.style.WARNING(
+                f'Fewer than {print_estimate.MIN_SAMPLES} sliced models with print features; keeping current coefficients'
+            ))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Fitted on {coefficients['samples']} models"))
+        for key, value in coefficients.items():
+            self.stdout.write(f'{key}: {value}')
@@ -0,0 +1,53 @@
+"""
+Management command to render preview images for models that have none.
+
+Usage:
+    python manage.py render_previews
+    python manage.py render_previews --limit 100
+    python manage.py render_previews --queue
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from apps.models import slicing_cache, thumbnails
+from apps.models.models import Model
+
+
+class Command(BaseCommand):
+    help = 'Render missing STL preview images (backfill for older uploads)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help='Maximum number of models to process')
+        parser.add_argument('--queue', action='store_true', help='Hand the models to the worker instead of rendering here')
+
+    def handle(self, *args, **options):
+        models = (
+            Model.objects.filter(Q(preview_image='') | Q(preview_image__isnull=True))
+            .exclude(stl_file='').exclude(stl_file__isnull=True)
+            .order_by('-created_at')
+        )
+        if options['limit']:
+            models = models[:options['limit']]
+
+        ids = []
+        for model in models:
+            if not model.stl_hash:
+                model.stl_file.open('rb')
+                try:
+                    model.stl_hash = slicing_cache.hash_file(model.stl_file)
+                finally:
+                    model.stl_file.close()
+                model.save(update_fields=['stl_hash'])
+            ids.append(model.id)
+
+        if options['queue']:
+            for model_id in ids:
+                thumbnails.queue_preview(Model(id=model_id))
+            self.stdout.write(self.style.SUCCESS(f'Queued {len(ids)} models'))
+            return
+
+        rendered = 0
+        for start in range(0, len(ids), 20):
+            rendered += thumbnails.render_batch(ids[start:start + 20])
+        self.stdout.write(self.style.SUCCESS(f'Rendered previews for {rendered} of {len(ids)} models'))
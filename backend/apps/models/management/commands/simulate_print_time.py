@@ -0,0 +1,59 @@
+"""
+Management command to simulate print times for cached slicing results,
+e.g. after adding a printer profile or changing its limits.
+
+Usage:
+    python manage.py simulate_print_time
+    python manage.py simulate_print_time --profile mk4 --all
+    python manage.py simulate_print_time --limit 100
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.models import print_time
+from apps.models.blobs import blob_storage
+from apps.models.models import Model, SlicingCacheEntry
+
+
+class Command(BaseCommand):
+    help = 'Simulate print times from cached G-code with a printer profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', default=None, help='Printer profile (default: PRINTER_PROFILE)')
+        parser.add_argument('--all', action='store_true', help='Also redo results that already have a simulation')
+        parser.add_argument('--limit', type=int, default=None, help='Maximum number of G-code files to process')
+
+    def handle(self, *args, **options):
+        if options['profile'] and options['profile'] not in settings.PRINTER_PROFILES:
+            raise CommandError(f"Unknown printer profile: {options['profile']}")
+        profile = print_time.get_profile(options['profile'])
+
+        entries = SlicingCacheEntry.objects.order_by('-last_used_at')
+        if not options['all']:
+            entries = entries.exclude(slicing_info__has_key='print_time_simulation')
+        if options['limit']:
+            entries = entries[:options['limit']]
+
+        simulated = 0
+        for entry in entries:
+            if not blob_storage.exists(entry.gcode_file_path):
+                continue
+            try:
+                with blob_storage.open(entry.gcode_file_path) as f:
+                    simulation = print_time.simulate_gcode(f, profile)
+            except (ValueError, IndexError) as e:
+                self.stderr.write(f'{entry.gcode_file_path}: could not be parsed ({e})')
+                continue
+
+            print_time.apply_simulation(entry.slicing_info, simulation)
+            entry.save(update_fields=['slicing_info'])
+            for model in Model.objects.filter(gcode_file_path=entry.gcode_file_path):
+                model.slicing_info = model.slicing_info or {}
+                print_time.apply_simulation(model.slicing_info, simulation)
+                model.save(update_fields=['slicing_info'])
+            simulated += 1
+            slicer_s = entry.slicing_info.get('slicer_print_time_s')
+            self.stdout.write(f"{entry.gcode_file_path}: {simulation['print_time_s']}s (slicer: {slicer_s}s)")
+
+        self.stdout.write(self.style.SUCCESS(f'Simulated {simulated} print times with profile {profile[0]}'))
@@ -0,0 +1,28 @@
+"""
+Management command to inspect and trim the slicing result cache.
+
+Usage:
+    python manage.py slicing_cache
+    python manage.py slicing_cache --evict
+    python manage.py slicing_cache --evict --max-bytes 1073741824
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.models import slicing_cache
+
+
+class Command(BaseCommand):
+    help = 'Show slicing cache statistics and optionally evict G-code blobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--evict', action='store_true', help='Evict least-recently-used entries over budget')
+        parser.add_argument('--max-bytes', type=int, default=None, help='Override SLICING_CACHE_MAX_BYTES for this run')
+
+    def handle(self, *args, **options):
+        if options['evict']:
+            evicted = slicing_cache.evict(max_bytes=options['max_bytes'])
+            self.stdout.write(self.style.SUCCESS(f'Evicted {evicted} entries'))
+
+        for key, value in slicing_cache.stats().items():
+            self.stdout.write(f'{key}: {value}')
@@ -0,0 +1,153 @@
+"""
+Mesh validation and cheap repairs before slicing.
+
+Welds the STL triangle soup into an indexed mesh and inspects its edge
+table, all with vectorized NumPy operations:
+
+- degenerate triangles (repeated vertices or zero area)
+- open edges (used by one triangle) and non-manifold edges (more than two)
+- inconsistently oriented neighbours (both triangles traverse an edge the
+  same way, i.e. one of them has a flipped normal)
+- an inside-out mesh (negative signed volume)
+- the number of separate shells
+
+Degenerate triangles and inside-out meshes are fixed automatically; meshes
+with too many open or non-manifold edges are rejected without running the
+slicer.
+"""
+import numpy as np
+from django.conf import settings
+
+
+class MeshStatus:
+    OK = 'ok'
+    REPAIRED = 'repaired'
+    WARNING = 'warning'
+    REJECTED = 'rejected'
+
+
+def weld(triangles, tolerance):
+    """
+    Merge vertices closer than `tolerance` and return (vertices, faces).
+
+    faces is an (N, 3) int array of indexes into vertices.
+    """
+    flat = triangles.reshape(-1, 3)
+    keys = np.round(flat / tolerance).astype(np.int64)
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    return flat[first], inverse.reshape(-1, 3)
+
+
+def count_shells(faces, vertex_count):
+    """
+    Count connected components of the mesh.
+
+    Uses hooking and pointer jumping over the edge list, which converges in
+    a logarithmic number of vectorized passes instead of a Python-level
+    union-find loop.
+    """
+    if len(faces) == 0:
+        return 0
+    u = np.concatenate([faces[:, 0], faces[:, 1]])
+    v = np.concatenate([faces[:, 1], faces[:, 2]])
+    parent = np.arange(vertex_count)
+
+    while True:
+        pu, pv = parent[u], parent[v]
+        if np.array_equal(pu, pv):
+            break
+        np.minimum.at(parent, np.maximum(pu, pv), np.minimum(pu, pv))
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+
+    return int(len(np.unique(parent[faces[:, 0]])))
+
+
+def signed_volume(vertices, faces):
+    v0, v1, v2 = vertices[faces[:, 0]], vertices[faces[:, 1]], vertices[faces[:, 2]]
+    return float(np.einsum('ij,ij->', v0, np.cross(v1, v2)) / 6.0)
+
+
+def check_mesh(triangles):
+    """
+    Inspect and, where cheap, repair a triangle soup.
+
+    Returns (report, repaired_triangles). repaired_triangles is None when no
+    repair was made.
+    """
+    vertices, faces = weld(triangles, settings.MESH_CHECK_WELD_TOLERANCE_MM)
+    total = len(faces)
+
+    # Degenerate: two corners welded together, or zero area
+    cross = np.cross(
+        vertices[faces[:, 1]] - vertices[faces[:, 0]],
+        vertices[faces[:, 2]] - vertices[faces[:, 0]],
+    )
+    repeated = (
+        (faces[:, 0] == faces[:, 1])
+        | (faces[:, 1] == faces[:, 2])
+        | (faces[:, 0] == faces[:, 2])
+    )
+    degenerate = repeated | (np.linalg.norm(cross, axis=1) <= 1e-12)
+    faces = faces[~degenerate]
+
+    # Edge table: each face contributes three directed edges
+    directed = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+    undirected = np.sort(directed, axis=1)
+    _, edge_counts = np.unique(undirected, axis=0, return_counts=True)
+    _, directed_counts = np.unique(directed, axis=0, return_counts=True)
+
+    edge_total = len(edge_counts)
+    open_edges = int((edge_counts == 1).sum())
+    non_manifold = int((edge_counts > 2).sum())
+    inconsistent = int((directed_counts > 1).sum())
+
+    volume = signed_volume(vertices, faces) if len(faces) else 0.0
+    inverted = volume < 0
+
+    report = {
+        'triangle_count': int(total),
+        'vertex_count': int(len(vertices)),
+        'degenerate_triangles': int(degenerate.sum()),
+        'open_edges': open_edges,
+        'non_manifold_edges': non_manifold,
+        'inconsistent_edges': inconsistent,
+        'shells': count_shells(faces, len(vertices)),
+        'inverted': inverted,
+        'issues': [],
+        'repairs': [],
+    }
+
+    bad_ratio = (open_edges + non_manifold) / edge_total if edge_total else 1.0
+    if len(faces) == 0:
+        report['issues'].append('Mesh has no valid triangles')
+    if open_edges:
+        report['issues'].append(f'{open_edges} open edges (holes)')
+    if non_manifold:
+        report['issues'].append(f'{non_manifold} non-manifold edges')
+    if inconsistent:
+        report['issues'].append(f'{inconsistent} edges with flipped neighbouring normals')
+
+    if len(faces) == 0 or bad_ratio > settings.MESH_CHECK_MAX_BAD_EDGE_RATIO:
+        report['status'] = MeshStatus.REJECTED
+        return report, None
+
+    repaired = None
+    if report['degenerate_triangles']:
+        report['repairs'].append(f'Removed {report["degenerate_triangles"]} degenerate triangles')
+    if inverted:
+        faces = faces[:, ::-1]
+        report['repairs'].append('Flipped inside-out mesh')
+    if report['repairs']:
+        repaired = vertices[faces]
+
+    if report['repairs']:
+        report['status'] = MeshStatus.REPAIRED
+    elif report['issues']:
+        report['status'] = MeshStatus.WARNING
+    else:
+        report['status'] = MeshStatus.OK
+    return report, repaired
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:51
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('printing_models', '0002_alter_modelimage_options_model_category_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='model',
+            name='stl_hash',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='SHA-256 of the STL file content', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='SlicingCacheEntry',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('stl_hash', models.CharField(max_length=64)),
+                ('profile', models.CharField(help_text='Slicer profile name and content hash', max_length=100)),
+                ('slicer_version', models.CharField(max_length=50)),
+                ('slicing_info', models.JSONField()),
+                ('gcode_file_path', models.CharField(max_length=500)),
+                ('gcode_size', models.PositiveBigIntegerField(default=0, help_text='G-code blob size in bytes')),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Slicing Cache Entry',
+                'verbose_name_plural': 'Slicing Cache Entries',
+                'db_table': 'slicing_cache_entry',
+                'ordering': ['-last_used_at'],
+                'constraints': [models.UniqueConstraint(fields=('stl_hash', 'profile', 'slicer_version'), name='unique_slicing_cache_key')],
+            },
+        ),
+    ]
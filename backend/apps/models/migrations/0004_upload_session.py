@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:55
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('printing_models', '0003_slicing_cache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('total_size', models.PositiveBigIntegerField(help_text='Total file size in bytes')),
+                ('chunk_size', models.PositiveIntegerField(help_text='Size of every chunk except the last, in bytes')),
+                ('sha256', models.CharField(blank=True, default='', help_text='Optional SHA-256 of the whole file', max_length=64)),
+                ('status', models.CharField(choices=[('ACTIVE', 'Active'), ('COMPLETED', 'Completed'), ('ABORTED', 'Aborted')], default='ACTIVE', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('model', models.ForeignKey(blank=True, help_text='Model created when the upload was finalized', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_sessions', to='printing_models.model')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Upload Session',
+                'verbose_name_plural': 'Upload Sessions',
+                'db_table': 'upload_session',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
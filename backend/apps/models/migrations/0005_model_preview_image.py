@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('printing_models', '0004_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='model',
+            name='preview_image',
+            field=models.ImageField(blank=True, help_text='Rendered from the STL, shared by models with the same stl_hash', null=True, upload_to='models/previews/'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('printing_models', '0005_model_preview_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='model',
+            name='preview_meshes',
+            field=models.JSONField(blank=True, help_text='Quantized .qmesh LOD files next to the STL, smallest first', null=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('printing_models', '0006_model_preview_meshes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShapeSignature',
+            fields=[
+                ('model', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='shape_signature', serialize=False, to='printing_models.model')),
+                ('vector', models.BinaryField(help_text='float32 descriptor: D2 histogram and PCA spread')),
+                ('duplicate_match', models.CharField(blank=True, choices=[('EXACT', 'Identical file'), ('NEAR', 'Similar shape')], default='', max_length=10)),
+                ('duplicate_distance', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('duplicate_of', models.ForeignKey(blank=True, help_text='Earlier model with the same or a very similar shape', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='printing_models.model')),
+            ],
+            options={
+                'verbose_name': 'Shape Signature',
+                'verbose_name_plural': 'Shape Signatures',
+                'db_table': 'shape_signature',
+            },
+        ),
+        migrations.CreateModel(
+            name='ShapeBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(db_index=True, max_length=64)),
+                ('signature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='printing_models.shapesignature')),
+            ],
+            options={
+                'db_table': 'shape_bucket',
+            },
+        ),
+    ]
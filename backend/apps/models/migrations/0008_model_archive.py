@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:13
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('printing_models', '0007_shape_signature'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelArchive',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('filename', models.CharField(max_length=255)),
+                ('part_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='model_archives', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Model Archive',
+                'verbose_name_plural': 'Model Archives',
+                'db_table': 'model_archive',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='model',
+            name='archive',
+            field=models.ForeignKey(blank=True, help_text='3MF/ZIP upload this model was extracted from', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='parts', to='printing_models.modelarchive'),
+        ),
+    ]
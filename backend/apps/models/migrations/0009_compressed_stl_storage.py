@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:17
+
+import apps.models.blobs
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('printing_models', '0008_model_archive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='model',
+            name='stl_file',
+            field=models.FileField(blank=True, null=True, storage=apps.models.blobs.get_blob_storage, upload_to='models/stl/'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('printing_models', '0009_compressed_stl_storage'),
+        ('users', '0003_add_display_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='model',
+            index=models.Index(fields=['created_at', 'id'], name='model_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='model',
+            index=models.Index(fields=['model_name', 'id'], name='model_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='model',
+            index=models.Index(fields=['download_count', 'id'], name='model_downloads_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='model',
+            index=models.Index(fields=['view_count', 'id'], name='model_views_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='modelreviewlog',
+            index=models.Index(fields=['model', 'timestamp', 'id'], name='review_log_model_time_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:33
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# The search vector is computed in the database so bulk updates, admin
+# edits and raw SQL keep it current too. Weights: name A, tags B,
+# description C, category D. The config must match search.SEARCH_CONFIG.
+CREATE_TRIGGER = """
+CREATE FUNCTION model_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.model_name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(tag, ' ') FROM jsonb_array_elements_text(
+                CASE WHEN jsonb_typeof(NEW.tags) = 'array' THEN NEW.tags ELSE '[]'::jsonb END
+            ) AS tag
+        ), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(NEW.category, '')), 'D');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER model_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF model_name, tags, description, category ON model
+    FOR EACH ROW EXECUTE FUNCTION model_search_vector_update();
+
+-- Backfill: the trigger fires on the listed columns
+UPDATE model SET model_name = model_name;
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS model_search_vector_trigger ON model;
+DROP FUNCTION IF EXISTS model_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('printing_models', '0010_listing_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='model',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+        migrations.AddIndex(
+            model_name='model',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='model_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='model',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['model_name'], name='model_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
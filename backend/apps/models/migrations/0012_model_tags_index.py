@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:44
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('printing_models', '0011_model_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='model',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tags'], name='model_tags_idx', opclasses=['jsonb_path_ops']),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('printing_models', '0012_model_tags_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='status',
+            field=models.CharField(choices=[('ACTIVE', 'Active'), ('FINALIZING', 'Finalizing'), ('COMPLETED', 'Completed'), ('ABORTED', 'Aborted')], default='ACTIVE', max_length=20),
+        ),
+    ]
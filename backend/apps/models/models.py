@@ -1,7 +1,11 @@
 import uuid
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.conf import settings
 
+from .blobs import get_blob_storage
+
 
 class VisibilityStatus(models.TextChoices):
     """Visibility status choices for 3D models."""
@@ -11,6 +15,14 @@ class VisibilityStatus(models.TextChoices):
     REJECTED = 'REJECTED', 'Rejected'
 
 
+class UploadStatus(models.TextChoices):
+    """Status choices for chunked upload sessions."""
+    ACTIVE = 'ACTIVE', 'Active'
+    FINALIZING = 'FINALIZING', 'Finalizing'
+    COMPLETED = 'COMPLETED', 'Completed'
+    ABORTED = 'ABORTED', 'Aborted'
+
+
 class ModelCategory(models.TextChoices):
     """Category choices for 3D models."""
     TOYS = 'Toys', 'Toys & Games'
@@ -44,6 +56,9 @@ class Model(models.Model):
         default=ModelCategory.OTHER
     )
     tags = models.JSONField(blank=True, null=True, help_text="List of tags for searching")
+    # Weighted name, tags, category and description; kept current by a
+    # database trigger (see migration 0011_model_search)
+    search_vector = SearchVectorField(null=True, editable=False)
     
     visibility_status = models.CharField(
         max_length=20,
@@ -54,9 +69,20 @@ class Model(models.Model):
     
     # File paths
     stl_file_path = models.CharField(max_length=500)  # Relative path in storage
-    stl_file = models.FileField(upload_to='models/stl/', blank=True, null=True)
+    stl_file = models.FileField(upload_to='models/stl/', storage=get_blob_storage, blank=True, null=True)  # Compressed at rest
+    stl_hash = models.CharField(max_length=64, blank=True, default='', db_index=True, help_text="SHA-256 of the STL file content")
     gcode_file_path = models.CharField(max_length=500, blank=True, null=True)
+    archive = models.ForeignKey(
+        'ModelArchive',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='parts',
+        help_text="3MF/ZIP upload this model was extracted from"
+    )
     thumbnail = models.ImageField(upload_to='models/thumbnails/', blank=True, null=True)
+    preview_meshes = models.JSONField(blank=True, null=True, help_text="Quantized .qmesh LOD files next to the STL, smallest first")
+    preview_image = models.ImageField(upload_to='models/previews/', blank=True, null=True, help_text="Rendered from the STL, shared by models with the same stl_hash")
     
     # Slicing info
     slicing_info = models.JSONField(blank=True, null=True)  # Stores material usage, print time
@@ -74,6 +100,17 @@ class Model(models.Model):
     class Meta:
         db_table = 'model'
         ordering = ['-created_at']
+        # One per listing order, with the id tie-breaker used by keyset pagination
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='model_created_id_idx'),
+            models.Index(fields=['model_name', 'id'], name='model_name_id_idx'),
+            models.Index(fields=['download_count', 'id'], name='model_downloads_id_idx'),
+            models.Index(fields=['view_count', 'id'], name='model_views_id_idx'),
+            GinIndex(fields=['search_vector'], name='model_search_vector_idx'),
+            GinIndex(fields=['model_name'], name='model_name_trgm_idx', opclasses=['gin_trgm_ops']),
+            # Serves ?tag= (tags @> '["tag"]')
+            GinIndex(fields=['tags'], name='model_tags_idx', opclasses=['jsonb_path_ops']),
+        ]
         verbose_name = '3D Model'
         verbose_name_plural = '3D Models'
 
@@ -84,6 +121,8 @@ class Model(models.Model):
     def thumbnail_url(self):
         if self.thumbnail:
             return self.thumbnail.url
+        if self.preview_image:
+            return self.preview_image.url
         return None
     
     @property
@@ -95,6 +134,35 @@ class Model(models.Model):
         return self.thumbnail_url
 
 
+class ModelArchive(models.Model):
+    """
+    A 3MF or ZIP upload containing several parts.
+    
+    Each mesh in the archive becomes its own Model (linked through
+    `parts`), so parts are sliced independently and quoted together.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='model_archives'
+    )
+    name = models.CharField(max_length=255)
+    filename = models.CharField(max_length=255)
+    part_count = models.PositiveIntegerField(default=0)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'model_archive'
+        ordering = ['-created_at']
+        verbose_name = 'Model Archive'
+        verbose_name_plural = 'Model Archives'
+
+    def __str__(self):
+        return f"{self.name} ({self.part_count} parts)"
+
+
 class ModelImage(models.Model):
     """
     Images associated with a 3D model.
@@ -163,8 +231,159 @@ class ModelReviewLog(models.Model):
     class Meta:
         db_table = 'model_review_log'
         ordering = ['-timestamp']
+        indexes = [models.Index(fields=['model', 'timestamp', 'id'], name='review_log_model_time_idx')]
         verbose_name = 'Model Review Log'
         verbose_name_plural = 'Model Review Logs'
 
     def __str__(self):
         return f"Review: {self.model.model_name} -> {self.new_status}"
+
+
+class SlicingCacheEntry(models.Model):
+    """
+    Slicing result shared by every model with the same STL content.
+    
+    Keyed by the STL SHA-256 plus the slicer profile and version, so an
+    identical upload can reuse the stored slicing_info and G-code instead of
+    running PrusaSlicer again. G-code blobs are evicted least-recently-used
+    first once the cache grows past SLICING_CACHE_MAX_BYTES.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    stl_hash = models.CharField(max_length=64)
+    profile = models.CharField(max_length=100, help_text="Slicer profile name and content hash")
+    slicer_version = models.CharField(max_length=50)
+    
+    slicing_info = models.JSONField()
+    gcode_file_path = models.CharField(max_length=500)
+    gcode_size = models.PositiveBigIntegerField(default=0, help_text="G-code blob size in bytes")
+    
+    hit_count = models.PositiveIntegerField(default=0)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'slicing_cache_entry'
+        ordering = ['-last_used_at']
+        verbose_name = 'Slicing Cache Entry'
+        verbose_name_plural = 'Slicing Cache Entries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['stl_hash', 'profile', 'slicer_version'],
+                name='unique_slicing_cache_key'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.stl_hash[:12]} ({self.profile}, {self.slicer_version})"
+
+
+class UploadSession(models.Model):
+    """
+    Resumable chunked STL upload.
+    
+    The file is sent as fixed-size chunks that are streamed to disk one by
+    one, so a dropped connection only loses the chunk in progress. The
+    finalize call assembles the chunks and creates the Model.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    filename = models.CharField(max_length=255)
+    total_size = models.PositiveBigIntegerField(help_text="Total file size in bytes")
+    chunk_size = models.PositiveIntegerField(help_text="Size of every chunk except the last, in bytes")
+    sha256 = models.CharField(max_length=64, blank=True, default='', help_text="Optional SHA-256 of the whole file")
+    status = models.CharField(
+        max_length=20,
+        choices=UploadStatus.choices,
+        default=UploadStatus.ACTIVE
+    )
+    model = models.ForeignKey(
+        Model,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='upload_sessions',
+        help_text="Model created when the upload was finalized"
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'upload_session'
+        ordering = ['-created_at']
+        verbose_name = 'Upload Session'
+        verbose_name_plural = 'Upload Sessions'
+
+    def __str__(self):
+        return f"Upload {self.filename} ({self.owner.email})"
+    
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.total_size // self.chunk_size))
+    
+    def expected_chunk_size(self, index):
+        """Size in bytes the chunk at `index` must have."""
+        if index < self.chunk_count - 1:
+            return self.chunk_size
+        return self.total_size - self.chunk_size * (self.chunk_count - 1)
+
+
+class DuplicateMatch(models.TextChoices):
+    """How a model matched an earlier upload."""
+    EXACT = 'EXACT', 'Identical file'
+    NEAR = 'NEAR', 'Similar shape'
+
+
+class ShapeSignature(models.Model):
+    """
+    Orientation-invariant shape descriptor of a model's mesh.
+    
+    Used to flag re-uploads of an existing model on the review queue. The
+    vector is indexed through ShapeBucket rows (locality-sensitive hashing)
+    so near matches are found without comparing against every model.
+    """
+    model = models.OneToOneField(
+        Model,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='shape_signature'
+    )
+    vector = models.BinaryField(help_text="float32 descriptor: D2 histogram and PCA spread")
+    
+    duplicate_of = models.ForeignKey(
+        Model,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='+',
+        help_text="Earlier model with the same or a very similar shape"
+    )
+    duplicate_match = models.CharField(max_length=10, choices=DuplicateMatch.choices, blank=True, default='')
+    duplicate_distance = models.FloatField(blank=True, null=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'shape_signature'
+        verbose_name = 'Shape Signature'
+        verbose_name_plural = 'Shape Signatures'
+
+    def __str__(self):
+        return f"Shape of {self.model_id}"
+
+
+class ShapeBucket(models.Model):
+    """LSH bucket membership of a shape signature, one row per hash table."""
+    signature = models.ForeignKey(
+        ShapeSignature,
+        on_delete=models.CASCADE,
+        related_name='buckets'
+    )
+    key = models.CharField(max_length=64, db_index=True)
+
+    class Meta:
+        db_table = 'shape_bucket'
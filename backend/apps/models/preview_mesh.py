@@ -0,0 +1,227 @@
+"""
+Compact preview meshes for the 3D viewer.
+
+The raw STL repeats every vertex for each triangle and stores 50 bytes per
+triangle. For the viewer the upload pipeline instead writes an indexed,
+quantized and zlib-compressed mesh (`.qmesh`) at several levels of detail,
+decimated by vertex clustering, so the page can load the smallest one first.
+
+.qmesh layout (little-endian, whole file zlib-compressed):
+
+    magic           4s   b'QMSH'
+    version         u8   1
+    flags           u8   bit 0: 32-bit indices (otherwise 16-bit)
+    reserved        u16
+    vertex_count    u32
+    triangle_count  u32
+    origin          3*f32   position = origin + quantized * scale
+    scale           3*f32
+    positions       vertex_count * 3 * u16
+    normals         vertex_count * 2 * i8  (octahedral encoding / 127)
+    indices         triangle_count * 3 * (u16 | u32)
+"""
+import struct
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from . import slicing_cache
+from .mesh_check import weld
+from .models import Model
+from .stl import parse_stl, read_stl_bytes
+
+MAGIC = b'QMSH'
+VERSION = 1
+FLAG_INDEX_32 = 1
+HEADER = struct.Struct('<4sBBHII3f3f')
+PREVIEW_MESH_DIR = 'models/preview_meshes'
+
+
+def vertex_normals(vertices, faces):
+    """Area-weighted vertex normals."""
+    face_normals = np.cross(
+        vertices[faces[:, 1]] - vertices[faces[:, 0]],
+        vertices[faces[:, 2]] - vertices[faces[:, 0]],
+    )
+    normals = np.zeros_like(vertices)
+    for corner in range(3):
+        np.add.at(normals, faces[:, corner], face_normals)
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    return np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+
+def octahedral_encode(normals):
+    """Map unit normals to two int8 components each."""
+    n = normals / np.maximum(np.abs(normals).sum(axis=1, keepdims=True), 1e-12)
+    xy = n[:, :2]
+    signs = np.where(xy >= 0, 1.0, -1.0)
+    folded = (1 - np.abs(xy[:, ::-1])) * signs
+    xy = np.where(n[:, 2:3] < 0, folded, xy)
+    return np.round(xy * 127).astype(np.int8)
+
+
+def octahedral_decode(encoded):
+    xy = encoded.astype(np.float64) / 127
+    z = 1 - np.abs(xy).sum(axis=1)
+    t = np.clip(-z, 0, None)[:, None]
+    xy = xy - np.where(xy >= 0, t, -t)
+    n = np.column_stack([xy, z])
+    return n / np.linalg.norm(n, axis=1, keepdims=True)
+
+
+def cluster(vertices, faces, grid):
+    """
+    Decimate by vertex clustering on a grid with `grid` cells along the
+    longest bounding-box axis.
+
+    Vertices in the same cell merge to their mean; triangles that collapse
+    or duplicate another are dropped.
+    """
+    low = vertices.min(axis=0)
+    cell = (vertices.max(axis=0) - low).max() / grid or 1.0
+    keys = np.floor((vertices - low) / cell).astype(np.int64)
+    _, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+
+    merged = np.zeros((len(counts), 3))
+    np.add.at(merged, inverse, vertices)
+    merged /= counts[:, None]
+
+    faces = inverse[faces]
+    keep = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])
+    faces = faces[keep]
+    _, first = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+    return merged, faces[np.sort(first)]
+
+
+def compact(vertices, faces):
+    """Drop unused vertices and renumber them in order of first use."""
+    used, first = np.unique(faces.ravel(), return_index=True)
+    order = used[np.argsort(first)]
+    remap = np.empty(len(vertices), dtype=np.int64)
+    remap[order] = np.arange(len(order))
+    return vertices[order], remap[faces]
+
+
+def encode(vertices, faces):
+    """Encode an indexed mesh as .qmesh bytes."""
+    vertices, faces = compact(vertices, faces)
+    origin = vertices.min(axis=0)
+    extent = vertices.max(axis=0) - origin
+    scale = np.where(extent > 0, extent / 65535, 1.0)
+    positions = np.round((vertices - origin) / scale).astype('<u2')
+    normals = octahedral_encode(vertex_normals(vertices, faces))
+
+    wide = len(vertices) > 0xFFFF
+    indices = faces.astype('<u4' if wide else '<u2')
+    header = HEADER.pack(
+        MAGIC, VERSION, FLAG_INDEX_32 if wide else 0, 0,
+        len(vertices), len(faces), *origin.astype(np.float32), *scale.astype(np.float32),
+    )
+    return zlib.compress(
+        header + positions.tobytes() + normals.tobytes() + indices.tobytes(), level=9
+    )
+
+
+def decode(data):
+    """Decode .qmesh bytes into (vertices, normals, faces)."""
+    raw = zlib.decompress(data)
+    magic, version, flags, _, vertex_count, triangle_count, *rest = HEADER.unpack_from(raw)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a qmesh file')
+    origin, scale = np.array(rest[:3]), np.array(rest[3:])
+    offset = HEADER.size
+    positions = np.frombuffer(raw, '<u2', vertex_count * 3, offset).reshape(-1, 3)
+    offset += positions.nbytes
+    normals = np.frombuffer(raw, 'i1', vertex_count * 2, offset).reshape(-1, 2)
+    offset += normals.nbytes
+    index_type = '<u4' if flags & FLAG_INDEX_32 else '<u2'
+    faces = np.frombuffer(raw, index_type, triangle_count * 3, offset).reshape(-1, 3)
+    return origin + positions * scale, octahedral_decode(normals), faces.astype(np.int64)
+
+
+def build_levels(triangles):
+    """
+    Build the LOD pyramid for a triangle array.
+
+    Returns a list of (level, vertices, faces), full detail first. Coarser
+    levels that do not remove at least a quarter of the triangles of the
+    previous level are skipped.
+    """
+    vertices, faces = weld(triangles, settings.MESH_CHECK_WELD_TOLERANCE_MM)
+    faces = faces[
+        (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])
+    ]
+    levels = [(0, vertices, faces)]
+    for grid in settings.PREVIEW_MESH_LOD_GRIDS:
+        lod_vertices, lod_faces = cluster(vertices, faces, grid)
+        if len(lod_faces) == 0 or len(lod_faces) > 0.75 * len(levels[-1][2]):
+            continue
+        levels.append((len(levels), lod_vertices, lod_faces))
+    return levels
+
+
+def _storage_name(stl_hash, level):
+    return f'{PREVIEW_MESH_DIR}/{stl_hash}.lod{level}.qmesh'
+
+
+def _shared_meshes(model):
+    """LOD files another model with the same STL content already has, or None."""
+    others = (
+        Model.objects.filter(stl_hash=model.stl_hash, preview_meshes__isnull=False)
+        .exclude(pk=model.pk)
+        .values_list('preview_meshes', flat=True)
+    )
+    for meshes in others:
+        if meshes and all(
+            mesh['name'] == _storage_name(model.stl_hash, mesh['level']) and default_storage.exists(mesh['name'])
+            for mesh in meshes
+        ):
+            return meshes
+    return None
+
+
+def build_preview_meshes(model):
+    """
+    Write the .qmesh LOD files of the model's STL content and record them.
+
+    Files are named by the STL's SHA-256, so models with identical content
+    (which share one STL blob, see duplicates.dedupe_blob) share them too.
+    Files that already exist are never rewritten. Returns the list stored in
+    `model.preview_meshes`, smallest first. Raises STLError if the STL
+    cannot be parsed.
+    """
+    if not model.stl_hash:
+        with model.stl_file.open('rb') as f:
+            model.stl_hash = slicing_cache.hash_file(f)
+        model.save(update_fields=['stl_hash'])
+
+    meshes = _shared_meshes(model)
+    if meshes is None:
+        model.stl_file.open('rb')
+        try:
+            triangles = parse_stl(read_stl_bytes(model.stl_file))
+        finally:
+            model.stl_file.close()
+
+        meshes = []
+        for level, vertices, faces in build_levels(triangles):
+            name = _storage_name(model.stl_hash, level)
+            if default_storage.exists(name):
+                size = default_storage.size(name)
+            else:
+                data = encode(vertices, faces)
+                size = len(data)
+                saved = default_storage.save(name, ContentFile(data))
+                if saved != name:
+                    # A concurrent build of the same content wrote it first
+                    default_storage.delete(saved)
+            meshes.append({'level': level, 'name': name, 'triangles': int(len(faces)), 'size': size})
+        meshes.reverse()
+
+    model.preview_meshes = meshes
+    model.save(update_fields=['preview_meshes'])
+    return meshes
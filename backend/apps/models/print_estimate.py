@@ -0,0 +1,200 @@
+"""
+Fast print-time and support estimate from mesh geometry alone.
+
+Slicer results can take minutes to arrive on a busy queue. This estimator
+runs in a worker right after upload, from the triangle normals and heights:
+
+- layer count for the configured layer height
+- total perimeter length over all layers. The cross-section length of each
+  triangle is piecewise linear in z, so its sum over layers is integrated
+  exactly in one vectorized pass.
+- overhang area (downward faces steeper than the overhang angle, not on
+  the bed) and the support volume under them (projected area times height)
+
+A linear model maps these to print time and filament volume. Its
+coefficients are refitted from completed slicer results with
+`python manage.py fit_print_estimator`. Until enough results exist, the
+defaults below are used with wide error bars. Error bars come from the
+spread of actual/predicted ratios (print time) and from the standard error
+of the support coefficient (support volume).
+"""
+import math
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+CACHE_KEY = 'print_estimate:coefficients'
+
+TIME_FEATURES = ('perimeter_m', 'volume_cm3', 'layer_count', 'support_volume_cm3')
+FILAMENT_FEATURES = ('volume_cm3', 'surface_area_cm2', 'support_volume_cm3')
+
+# Support material is quoted at PLA density
+REFERENCE_DENSITY_G_CM3 = 1.24
+
+MIN_SAMPLES = 20
+
+# Hand-tuned starting point for a 0.4 mm nozzle at 0.2 mm layers: two
+# perimeters at ~40 mm/s, ~5 mm^3/s volumetric flow, and a few seconds of
+# travel per layer.
+DEFAULT_COEFFICIENTS = {
+    'time': {'intercept': 120.0, 'perimeter_m': 50.0, 'volume_cm3': 60.0,
+             'layer_count': 3.0, 'support_volume_cm3': 30.0},
+    'time_ratio_bounds': [0.5, 2.0],
+    'filament': {'volume_cm3': 0.2, 'surface_area_cm2': 0.1, 'support_volume_cm3': 0.15},
+    'support_coefficient_se': 0.075,
+    'samples': 0,
+}
+
+
+def print_features(triangles, layer_height=None, overhang_angle=None):
+    """Compute the geometric features the estimator uses from an (N, 3, 3) array."""
+    if layer_height is None:
+        layer_height = settings.PRINT_ESTIMATE_LAYER_HEIGHT_MM
+    if overhang_angle is None:
+        overhang_angle = settings.PRINT_ESTIMATE_OVERHANG_ANGLE
+
+    v0, v1, v2 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    cross = np.cross(v1 - v0, v2 - v0)
+    double_area = np.linalg.norm(cross, axis=1)
+    valid = double_area > 0
+    normal_z = np.divide(cross[:, 2], double_area, out=np.zeros(len(cross)), where=valid)
+    area = double_area / 2
+
+    z = triangles[:, :, 2]
+    z_min = z.min()
+    height = z.max() - z_min
+    layer_count = max(1, math.ceil(height / layer_height))
+
+    # Cross-section length is 0 at the lowest and highest vertex and peaks
+    # at the middle vertex, so its integral over z is peak * height / 2
+    order = np.argsort(z, axis=1)
+    ordered = np.take_along_axis(triangles, order[:, :, None], axis=1)
+    low, mid, high = ordered[:, 0], ordered[:, 1], ordered[:, 2]
+    span = high[:, 2] - low[:, 2]
+    t = np.divide(mid[:, 2] - low[:, 2], span, out=np.zeros(len(span)), where=span > 0)
+    on_long_edge = low + t[:, None] * (high - low)
+    peak = np.linalg.norm((mid - on_long_edge)[:, :2], axis=1)
+    perimeter_mm = float((peak * span).sum() / 2 / layer_height)
+
+    # Downward faces steeper than the overhang angle, excluding the bed
+    threshold = -math.cos(math.radians(overhang_angle))
+    centroid_z = z.mean(axis=1)
+    overhang = valid & (normal_z < threshold) & (centroid_z - z_min > layer_height)
+    projected = area[overhang] * -normal_z[overhang]
+    support_mm3 = float((projected * (centroid_z[overhang] - z_min)).sum())
+
+    volume_mm3 = abs(np.einsum('ij,ij->', v0, np.cross(v1, v2))) / 6.0
+    return {
+        'layer_height_mm': layer_height,
+        'layer_count': layer_count,
+        'perimeter_m': round(perimeter_mm / 1000, 4),
+        'perimeter_per_layer_mm': round(perimeter_mm / layer_count, 2),
+        'overhang_area_cm2': round(float(area[overhang].sum()) / 100, 4),
+        'support_volume_cm3': round(support_mm3 / 1000, 4),
+        'volume_cm3': round(float(volume_mm3) / 1000, 4),
+        'surface_area_cm2': round(float(area.sum()) / 100, 4),
+    }
+
+
+def load_coefficients():
+    return cache.get(CACHE_KEY) or DEFAULT_COEFFICIENTS
+
+
+def estimate(features, coefficients=None):
+    """Estimate print time and support material, with low/high bounds."""
+    c = coefficients or load_coefficients()
+    time_s = c['time']['intercept'] + sum(c['time'][f] * features[f] for f in TIME_FEATURES)
+    time_s = max(time_s, 0.0)
+    low_ratio, high_ratio = c['time_ratio_bounds']
+
+    support_coefficient = c['filament']['support_volume_cm3']
+    support_spread = 1.645 * c['support_coefficient_se']  # 90% interval
+    support_cm3 = support_coefficient * features['support_volume_cm3']
+    support_low = max(support_coefficient - support_spread, 0) * features['support_volume_cm3']
+    support_high = (support_coefficient + support_spread) * features['support_volume_cm3']
+
+    return {
+        'print_time_s': int(round(time_s)),
+        'print_time_s_low': int(round(time_s * low_ratio)),
+        'print_time_s_high': int(round(time_s * high_ratio)),
+        'filament_volume_cm3': round(sum(c['filament'][f] * features[f] for f in FILAMENT_FEATURES), 4),
+        'support_volume_cm3': round(support_cm3, 4),
+        'support_g': round(support_cm3 * REFERENCE_DENSITY_G_CM3, 2),
+        'support_g_low': round(support_low * REFERENCE_DENSITY_G_CM3, 2),
+        'support_g_high': round(support_high * REFERENCE_DENSITY_G_CM3, 2),
+        'fitted_samples': c['samples'],
+    }
+
+
+def _nonnegative_lstsq(X, y):
+    """Least squares with non-negative coefficients, by dropping negative ones."""
+    active = list(range(X.shape[1]))
+    coefficients = np.zeros(X.shape[1])
+    while active:
+        solution, *_ = np.linalg.lstsq(X[:, active], y, rcond=None)
+        if (solution >= 0).all():
+            coefficients[active] = solution
+            break
+        active.pop(int(np.argmin(solution)))
+    return coefficients
+
+
+def fit(records):
+    """
+    Fit coefficients from (features, print_time_s, filament_volume_cm3) rows.
+
+    Returns the coefficients dict, or None if there are fewer than
+    MIN_SAMPLES usable rows.
+    """
+    rows = [r for r in records if r[1] and r[2] is not None]
+    if len(rows) < MIN_SAMPLES:
+        return None
+
+    X_time = np.array([[1.0] + [r[0][f] for f in TIME_FEATURES] for r in rows])
+    y_time = np.array([float(r[1]) for r in rows])
+    time_coefficients = _nonnegative_lstsq(X_time, y_time)
+    predicted = np.maximum(X_time @ time_coefficients, 1.0)
+    ratios = y_time / predicted
+
+    X_fil = np.array([[r[0][f] for f in FILAMENT_FEATURES] for r in rows])
+    y_fil = np.array([float(r[2]) for r in rows])
+    filament_coefficients = _nonnegative_lstsq(X_fil, y_fil)
+
+    # Standard error of the support coefficient from the residual variance
+    residuals = y_fil - X_fil @ filament_coefficients
+    dof = max(len(rows) - X_fil.shape[1], 1)
+    covariance = (residuals @ residuals / dof) * np.linalg.pinv(X_fil.T @ X_fil)
+    support_se = float(np.sqrt(max(covariance[-1, -1], 0)))
+
+    return {
+        'time': {
+            'intercept': float(time_coefficients[0]),
+            **{f: float(v) for f, v in zip(TIME_FEATURES, time_coefficients[1:])},
+        },
+        'time_ratio_bounds': [float(np.quantile(ratios, 0.05)), float(np.quantile(ratios, 0.95))],
+        'filament': {f: float(v) for f, v in zip(FILAMENT_FEATURES, filament_coefficients)},
+        'support_coefficient_se': support_se,
+        'samples': len(rows),
+        'time_median_abs_error': float(np.median(np.abs(ratios - 1))),
+    }
+
+
+def training_records():
+    """Yield (features, print_time_s, filament_volume_cm3) from sliced models."""
+    from .models import Model
+    from .slicing import SlicingSource
+
+    infos = Model.objects.filter(slicing_info__source=SlicingSource.SLICER).values_list('slicing_info', flat=True)
+    for info in infos.iterator():
+        features = info.get('print_features')
+        if features and features.get('layer_height_mm') == settings.PRINT_ESTIMATE_LAYER_HEIGHT_MM:
+            yield features, info.get('print_time_s'), info.get('filament_volume_cm3')
+
+
+def refit():
+    """Fit from completed slices and store the coefficients. Returns them or None."""
+    coefficients = fit(list(training_records()))
+    if coefficients is not None:
+        cache.set(CACHE_KEY, coefficients, timeout=None)
+    return coefficients
@@ -0,0 +1,116 @@
+"""
+Anonymous instant quotes.
+
+An STL is streamed from the request body through an incremental parser and
+a SHA-256 hash at the same time; it is never written to disk and no Model
+is created. Only the geometry summary and filament volume are cached by
+content hash, so a repeated quote of the same file skips parsing (and the
+upload itself, via the lookup endpoint), while prices always come from the
+current active materials.
+
+When the same content has already been sliced for an uploaded model, the
+slicer's filament volume is quoted instead of the mesh estimate.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import SlicingCacheEntry
+from .slicing import SlicingSource, build_material_table
+from .stl import MeshStats, STLError, STLStreamParser, printed_volume_cm3
+
+READ_BLOCK_SIZE = 1024 * 1024
+CACHE_PREFIX = 'quote:'
+
+
+def read_geometry(stream, content_length=None):
+    """
+    Parse an STL from a file-like stream without storing it.
+
+    Returns (sha256, geometry). Raises STLError for invalid or oversized
+    files.
+    """
+    digest = hashlib.sha256()
+    parser = STLStreamParser(content_length)
+    stats = MeshStats()
+    size = 0
+    while block := stream.read(READ_BLOCK_SIZE):
+        size += len(block)
+        if size > settings.INSTANT_QUOTE_MAX_BYTES:
+            raise STLError(f'File is larger than {settings.INSTANT_QUOTE_MAX_BYTES} bytes')
+        digest.update(block)
+        stats.update(parser.feed(block))
+    stats.update(parser.close())
+    return digest.hexdigest(), stats.result()
+
+
+def _basis_from_slicer(sha256):
+    entry = (
+        SlicingCacheEntry.objects.filter(stl_hash=sha256)
+        .order_by('-last_used_at').only('slicing_info').first()
+    )
+    if entry is None or entry.slicing_info.get('filament_volume_cm3') is None:
+        return None
+    info = entry.slicing_info
+    keys = ('triangle_count', 'volume_cm3', 'surface_area_cm2', 'size_mm', 'print_time_s')
+    return {
+        'source': SlicingSource.SLICER,
+        'is_estimate': False,
+        **{key: info[key] for key in keys if key in info},
+        'filament_volume_cm3': info['filament_volume_cm3'],
+    }
+
+
+def _basis_from_geometry(geometry):
+    filament_volume = printed_volume_cm3(
+        geometry['volume_cm3'],
+        geometry['surface_area_cm2'],
+        settings.SLICING_ESTIMATE_WALL_MM,
+        settings.SLICING_ESTIMATE_INFILL,
+    )
+    return {
+        'source': SlicingSource.MESH_ESTIMATE,
+        'is_estimate': True,
+        **geometry,
+        'filament_volume_cm3': round(filament_volume, 4),
+    }
+
+
+def _price(sha256, basis, cached):
+    return {
+        'sha256': sha256,
+        'cached': cached,
+        **basis,
+        'materials': build_material_table(basis['filament_volume_cm3']),
+    }
+
+
+def _known_basis(sha256):
+    # A slicer result beats a cached mesh estimate made before it existed
+    return _basis_from_slicer(sha256) or cache.get(CACHE_PREFIX + sha256)
+
+
+def cached_quote(sha256):
+    """Return the quote for already-seen content, or None."""
+    sha256 = sha256.lower()
+    basis = _known_basis(sha256)
+    if basis is None:
+        return None
+    return _price(sha256, basis, cached=True)
+
+
+def quote_stream(stream, content_length=None):
+    """
+    Quote an STL streamed from `stream`.
+
+    Returns the quote with a price for every active material. Raises
+    STLError for invalid files.
+    """
+    sha256, geometry = read_geometry(stream, content_length)
+    basis = _known_basis(sha256)
+    cached = basis is not None
+    if basis is None:
+        basis = _basis_from_geometry(geometry)
+        cache.set(CACHE_PREFIX + sha256, basis, settings.INSTANT_QUOTE_CACHE_TTL)
+    return _price(sha256, basis, cached)
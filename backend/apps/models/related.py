@@ -0,0 +1,212 @@
+"""
+"Related models" recommendations for the marketplace.
+
+Each public model gets a float32 descriptor that combines its shape
+signature (see duplicates.py) with metadata: category, tags and overall
+size. Every API process keeps all descriptors of public models in one NumPy
+matrix and answers queries by brute force. One matrix-vector product gives
+the squared distances, and argpartition picks the top k. At 100k models that
+takes a couple of milliseconds.
+
+The index is built lazily on first use and then kept up to date
+incrementally. Approving, rejecting or removing a model appends its id to a
+Redis change log. Before each query a process reads the ids it has not seen
+yet and re-reads only those rows from the database.
+
+Redis keys:
+    related:seq     number of changes ever logged
+    related:log     most recent CHANGE_LOG_SIZE changed model ids
+"""
+import threading
+import zlib
+
+import numpy as np
+from django.db import transaction
+
+from .duplicates import D2_BINS
+from .models import Model, ModelCategory, VisibilityStatus
+from .scheduler import get_redis
+
+SEQ_KEY = 'related:seq'
+LOG_KEY = 'related:log'
+CHANGE_LOG_SIZE = 10000
+
+SHAPE_DIMENSIONS = D2_BINS + 3
+CATEGORIES = list(ModelCategory.values)
+TAG_BUCKETS = 32
+
+# Relative weight of each part of the descriptor in the distance. Shape
+# signature distances between different solids are around 0.05-0.3.
+SHAPE_WEIGHT = 10.0
+CATEGORY_WEIGHT = 0.7
+TAG_WEIGHT = 0.7
+SIZE_WEIGHT = 0.5
+
+DIMENSIONS = SHAPE_DIMENSIONS + len(CATEGORIES) + TAG_BUCKETS + 1
+
+
+def descriptor(category, tags, size_mm, shape_vector):
+    """Build the float32 descriptor of one model."""
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    offset = 0
+    if shape_vector is not None:
+        vector[:SHAPE_DIMENSIONS] = SHAPE_WEIGHT * np.frombuffer(bytes(shape_vector), dtype=np.float32)
+    offset += SHAPE_DIMENSIONS
+
+    if category in CATEGORIES:
+        vector[offset + CATEGORIES.index(category)] = CATEGORY_WEIGHT
+    offset += len(CATEGORIES)
+
+    # Hashed bag of tags, scaled to unit length
+    tags = [str(tag).strip().lower() for tag in tags or [] if str(tag).strip()]
+    if tags:
+        for tag in tags:
+            vector[offset + zlib.crc32(tag.encode()) % TAG_BUCKETS] += 1
+        bag = vector[offset:offset + TAG_BUCKETS]
+        bag *= TAG_WEIGHT / np.linalg.norm(bag)
+    offset += TAG_BUCKETS
+
+    if size_mm:
+        vector[offset] = SIZE_WEIGHT * np.log10(1 + float(np.linalg.norm(size_mm)))
+    return vector
+
+
+def _load(queryset):
+    """Yield (model_id, descriptor) for the models in the queryset."""
+    rows = queryset.values_list('id', 'category', 'tags', 'slicing_info__size_mm', 'shape_signature__vector')
+    for model_id, category, tags, size_mm, shape_vector in rows:
+        yield model_id, descriptor(category, tags, size_mm, shape_vector)
+
+
+class RelatedIndex:
+    """In-memory brute-force index over public model descriptors."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seq = None
+        self._clear()
+
+    def _clear(self):
+        self.ids = []
+        self.rows = {}
+        self.matrix = np.zeros((1024, DIMENSIONS), dtype=np.float32)
+        self.norms = np.zeros(1024, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _upsert(self, model_id, vector):
+        row = self.rows.get(model_id)
+        if row is None:
+            row = len(self.ids)
+            if row == len(self.matrix):
+                self.matrix = np.concatenate([self.matrix, np.zeros_like(self.matrix)])
+                self.norms = np.concatenate([self.norms, np.zeros_like(self.norms)])
+            self.ids.append(model_id)
+            self.rows[model_id] = row
+        self.matrix[row] = vector
+        self.norms[row] = vector @ vector
+
+    def _remove(self, model_id):
+        row = self.rows.pop(model_id, None)
+        if row is None:
+            return
+        # Move the last row into the gap
+        last = len(self.ids) - 1
+        last_id = self.ids.pop()
+        if row != last:
+            self.ids[row] = last_id
+            self.rows[last_id] = row
+            self.matrix[row] = self.matrix[last]
+            self.norms[row] = self.norms[last]
+
+    def rebuild(self, seq):
+        self._clear()
+        for model_id, vector in _load(Model.objects.filter(visibility_status=VisibilityStatus.PUBLIC)):
+            self._upsert(model_id, vector)
+        self.seq = seq
+
+    def apply_changes(self, model_ids, seq):
+        """Re-read the given models, dropping any that are no longer public."""
+        public = Model.objects.filter(id__in=model_ids, visibility_status=VisibilityStatus.PUBLIC)
+        found = dict(_load(public))
+        for model_id in model_ids:
+            if model_id in found:
+                self._upsert(model_id, found[model_id])
+            else:
+                self._remove(model_id)
+        self.seq = seq
+
+    def sync(self):
+        """
+        Bring the index up to date with the Redis change log.
+
+        The last `seq - self.seq` log entries are the changes since the
+        last sync only if no change is logged between reading the seq and
+        reading the log, so both are read in one transaction.
+        """
+        client = get_redis()
+        seq = int(client.get(SEQ_KEY) or 0)
+        if seq == self.seq:
+            return
+        with self.lock:
+            while self.seq is not None and self.seq < seq <= self.seq + CHANGE_LOG_SIZE:
+                # MULTI/EXEC, so the log tail is read together with its seq
+                pipe = client.pipeline()
+                pipe.get(SEQ_KEY)
+                pipe.lrange(LOG_KEY, -(seq - self.seq), -1)
+                current, changed = pipe.execute()
+                current = int(current or 0)
+                if current == seq:
+                    # Model.id is a UUID; the log stores strings
+                    self.apply_changes([Model._meta.pk.to_python(i) for i in set(changed)], seq)
+                    return
+                # Changes were logged since seq was read; read a longer tail
+                seq = current
+            if seq != self.seq:
+                self.rebuild(seq)
+
+    def query(self, vector, k, exclude=()):
+        """Return [(model_id, distance)] of the k nearest descriptors."""
+        count = len(self.ids)
+        if count == 0:
+            return []
+        distances = self.norms[:count] - 2 * (self.matrix[:count] @ vector) + vector @ vector
+        for model_id in exclude:
+            row = self.rows.get(model_id)
+            if row is not None:
+                distances[row] = np.inf
+        k = min(k, count)
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return [
+            (self.ids[i], float(np.sqrt(max(distances[i], 0))))
+            for i in top if np.isfinite(distances[i])
+        ]
+
+
+_index = RelatedIndex()
+
+
+def record_change(model_id):
+    """Log a model whose public visibility or descriptor may have changed."""
+    def push():
+        pipe = get_redis().pipeline()
+        pipe.rpush(LOG_KEY, str(model_id))
+        pipe.ltrim(LOG_KEY, -CHANGE_LOG_SIZE, -1)
+        pipe.incr(SEQ_KEY)
+        pipe.execute()
+
+    transaction.on_commit(push)
+
+
+def related_models(model, k):
+    """Return [(model_id, distance)] of the k public models most similar to `model`."""
+    _index.sync()
+    with _index.lock:
+        row = _index.rows.get(model.id)
+        vector = _index.matrix[row].copy() if row is not None else None
+    if vector is None:
+        vector = next(_load(Model.objects.filter(id=model.id)))[1]
+    with _index.lock:
+        return _index.query(vector, k, exclude=[model.id])
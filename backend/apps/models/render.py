@@ -0,0 +1,153 @@
+"""
+Headless software rasterizer for STL preview images.
+
+Renders a triangle array with an orthographic three-quarter view, a z-buffer
+and flat shading, entirely on the CPU with NumPy. Triangles are grouped by
+their on-screen size so that each group is rasterized in one vectorized pass
+over a fixed square of candidate pixels. The image is rendered at twice the
+target size and downsampled for anti-aliasing.
+"""
+import io
+
+import numpy as np
+from PIL import Image
+
+# Camera looks at the model from the front right, slightly above
+VIEW_DIRECTION = np.array([1.0, -1.2, 0.9])
+WORLD_UP = np.array([0.0, 0.0, 1.0])
+
+BASE_COLOR = np.array([72, 133, 237], dtype=np.float64)
+AMBIENT = 0.3
+DIFFUSE = 0.7
+
+SUPERSAMPLE = 2
+MARGIN = 0.06
+
+# Upper bound on candidate pixels evaluated per vectorized pass
+FRAGMENT_BATCH = 1 << 22
+
+
+def _normalize(v):
+    return v / np.linalg.norm(v)
+
+
+def camera_basis():
+    """Return (right, up, towards_camera) unit vectors."""
+    towards = _normalize(VIEW_DIRECTION)
+    right = _normalize(np.cross(WORLD_UP, towards))
+    up = np.cross(towards, right)
+    return right, up, towards
+
+
+def shade(triangles, towards, light):
+    """Flat, two-sided Lambert shading: one intensity per triangle."""
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    normals = np.divide(normals, lengths[:, None], out=np.zeros_like(normals), where=lengths[:, None] > 0)
+    # Flip normals that face away from the camera so open or badly wound
+    # meshes do not render black
+    normals *= np.where(normals @ towards < 0, -1.0, 1.0)[:, None]
+    return AMBIENT + DIFFUSE * np.clip(normals @ light, 0.0, 1.0)
+
+
+def _edge(ax, ay, bx, by, px, py):
+    return (bx - ax) * (py - ay) - (by - ay) * (px - ax)
+
+
+def rasterize(xy, depth, intensity, width, height):
+    """
+    Z-buffer rasterize screen-space triangles.
+
+    xy is (N, 3, 2) in pixels, depth is (N, 3) with smaller values closer.
+    Returns the per-pixel intensity (NaN where nothing was drawn).
+    """
+    zbuf = np.full(width * height, np.inf)
+    color = np.full(width * height, np.nan)
+
+    x0 = np.clip(np.floor(xy[:, :, 0].min(axis=1) - 0.5), 0, width - 1).astype(np.int64)
+    x1 = np.clip(np.ceil(xy[:, :, 0].max(axis=1) - 0.5), 0, width - 1).astype(np.int64)
+    y0 = np.clip(np.floor(xy[:, :, 1].min(axis=1) - 0.5), 0, height - 1).astype(np.int64)
+    y1 = np.clip(np.ceil(xy[:, :, 1].max(axis=1) - 0.5), 0, height - 1).astype(np.int64)
+
+    area = _edge(xy[:, 0, 0], xy[:, 0, 1], xy[:, 1, 0], xy[:, 1, 1], xy[:, 2, 0], xy[:, 2, 1])
+    extent = np.maximum(x1 - x0, y1 - y0) + 1
+    # Square of candidate pixels per triangle, rounded up to a power of two
+    size_class = 1 << np.ceil(np.log2(extent)).astype(np.int64)
+    visible = np.abs(area) > 1e-12
+
+    for k in np.unique(size_class[visible]):
+        selected = np.flatnonzero(visible & (size_class == k))
+        oy, ox = np.divmod(np.arange(k * k), k)
+        step = max(1, FRAGMENT_BATCH // (k * k))
+
+        for start in range(0, len(selected), step):
+            idx = selected[start:start + step]
+            px = x0[idx, None] + ox
+            py = y0[idx, None] + oy
+            cx, cy = px + 0.5, py + 0.5
+            v = xy[idx]
+
+            w0 = _edge(v[:, 1, 0, None], v[:, 1, 1, None], v[:, 2, 0, None], v[:, 2, 1, None], cx, cy)
+            w1 = _edge(v[:, 2, 0, None], v[:, 2, 1, None], v[:, 0, 0, None], v[:, 0, 1, None], cx, cy)
+            w2 = _edge(v[:, 0, 0, None], v[:, 0, 1, None], v[:, 1, 0, None], v[:, 1, 1, None], cx, cy)
+            a = area[idx, None]
+            inside = (
+                (w0 * a >= 0) & (w1 * a >= 0) & (w2 * a >= 0)
+                & (px <= x1[idx, None]) & (py <= y1[idx, None])
+            )
+            if not inside.any():
+                continue
+
+            d = depth[idx]
+            z = (w0 * d[:, 0, None] + w1 * d[:, 1, None] + w2 * d[:, 2, None]) / a
+            pixel = (py * width + px)[inside]
+            z = z[inside]
+            value = np.broadcast_to(intensity[idx, None], inside.shape)[inside]
+
+            # Nearest fragment per pixel within the batch, then depth test
+            order = np.lexsort((z, pixel))
+            pixel, z, value = pixel[order], z[order], value[order]
+            first = np.ones(len(pixel), dtype=bool)
+            first[1:] = pixel[1:] != pixel[:-1]
+            pixel, z, value = pixel[first], z[first], value[first]
+            closer = z < zbuf[pixel]
+            zbuf[pixel[closer]] = z[closer]
+            color[pixel[closer]] = value[closer]
+
+    return color.reshape(height, width)
+
+
+def render_image(triangles, size=512):
+    """Render triangles to a square RGBA PIL image with a transparent background."""
+    right, up, towards = camera_basis()
+    light = _normalize(towards + 0.6 * up - 0.4 * right)
+
+    intensity = shade(triangles, towards, light)
+    flat = triangles.reshape(-1, 3)
+    sx, sy, depth = flat @ right, flat @ up, -(flat @ towards)
+
+    full = size * SUPERSAMPLE
+    span = max(np.ptp(sx), np.ptp(sy)) or 1.0
+    scale = full * (1 - 2 * MARGIN) / span
+    cx = (sx.min() + sx.max()) / 2
+    cy = (sy.min() + sy.max()) / 2
+    xy = np.stack([
+        (sx - cx) * scale + full / 2,
+        full / 2 - (sy - cy) * scale,
+    ], axis=1).reshape(-1, 3, 2)
+
+    values = rasterize(xy, depth.reshape(-1, 3), intensity, full, full)
+    drawn = ~np.isnan(values)
+    rgba = np.zeros((full, full, 4), dtype=np.uint8)
+    rgba[drawn, :3] = np.clip(values[drawn, None] * BASE_COLOR, 0, 255).astype(np.uint8)
+    rgba[drawn, 3] = 255
+
+    image = Image.fromarray(rgba, 'RGBA')
+    return image.resize((size, size), Image.Resampling.LANCZOS)
+
+
+def render_thumbnail(triangles, size=512, image_format='WEBP'):
+    """Render triangles and return the encoded image bytes."""
+    buffer = io.BytesIO()
+    render_image(triangles, size).save(buffer, format=image_format)
+    return buffer.getvalue()
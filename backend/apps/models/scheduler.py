@@ -0,0 +1,282 @@
+"""
+Per-user fair scheduling for slicing jobs.
+
+Jobs are not sent to Celery directly. They wait in per-owner Redis lists and
+are released round-robin across owners, at most SLICING_USER_MAX_IN_FLIGHT
+per owner and SLICING_DISPATCH_WINDOW in total. The Celery queue therefore
+stays short, and one user's bulk upload cannot starve everyone else.
+Models that are already in someone's cart skip ahead through a priority lane.
+
+Redis keys:
+    slicing:fair:priority        list of model ids in the priority lane
+    slicing:fair:owners          round-robin ring of owners with queued jobs
+    slicing:fair:user:<owner>    list of queued model ids per owner
+    slicing:fair:inflight        hash owner -> jobs dispatched and not finished
+    slicing:fair:jobs            hash model id -> job metadata (JSON)
+    slicing:fair:waits           recent queue wait times in ms
+    slicing:fair:ttq             recent submit-to-result times in ms
+    slicing:fair:reclaim         set while a scan for lost jobs is not due
+
+A job normally frees its in-flight slot when the task finishes. A worker
+that is killed, or a task message that is lost, never reports back, so
+dispatch also frees the slots of jobs dispatched more than
+SLICING_JOB_STALE_AFTER seconds ago.
+"""
+import json
+import logging
+import time
+from functools import lru_cache
+
+import numpy as np
+import redis
+from django.conf import settings
+from kombu.exceptions import OperationalError
+
+PREFIX = 'slicing:fair:'
+PRIORITY_KEY = PREFIX + 'priority'
+OWNERS_KEY = PREFIX + 'owners'
+INFLIGHT_KEY = PREFIX + 'inflight'
+JOBS_KEY = PREFIX + 'jobs'
+WAITS_KEY = PREFIX + 'waits'
+TTQ_KEY = PREFIX + 'ttq'
+LOCK_KEY = PREFIX + 'lock'
+RECLAIM_KEY = PREFIX + 'reclaim'
+
+# Seconds between scans for lost jobs
+RECLAIM_INTERVAL = 60
+
+# Number of recent samples kept for percentile reporting
+SAMPLE_SIZE = 2000
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def get_redis():
+    return redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+
+def _user_key(owner_id):
+    return f'{PREFIX}user:{owner_id}'
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _record(client, key, value):
+    client.lpush(key, value)
+    client.ltrim(key, 0, SAMPLE_SIZE - 1)
+
+
+def _in_cart(model):
+    from apps.materials.models import CartItem
+    return CartItem.objects.filter(model=model).exists()
+
+
+def submit(model):
+    """
+    Queue a slicing job for the model and dispatch what capacity allows.
+
+    Submitting a model that is already queued or running is a no-op.
+    """
+    client = get_redis()
+    model_id = str(model.id)
+    owner_id = str(model.owner_id)
+    meta = json.dumps({'owner': owner_id, 'submitted_at': _now_ms()})
+    if not client.hsetnx(JOBS_KEY, model_id, meta):
+        return
+
+    if _in_cart(model):
+        client.rpush(PRIORITY_KEY, model_id)
+    else:
+        with client.lock(LOCK_KEY, timeout=10):
+            client.rpush(_user_key(owner_id), model_id)
+            if client.lpos(OWNERS_KEY, owner_id) is None:
+                client.rpush(OWNERS_KEY, owner_id)
+    dispatch()
+
+
+def promote(model):
+    """Move a queued model into the priority lane, e.g. when added to a cart."""
+    client = get_redis()
+    model_id = str(model.id)
+    with client.lock(LOCK_KEY, timeout=10):
+        if client.lrem(_user_key(model.owner_id), 0, model_id):
+            client.rpush(PRIORITY_KEY, model_id)
+    dispatch()
+
+
+def _start(client, model_id, queue_key):
+    """
+    Hand a queued job to Celery and count it as in flight.
+
+    Returns the job's owner, or None if the job is no longer known. If the
+    broker cannot be reached, the job goes back to the front of
+    `queue_key`, uncounted, and the broker error is raised.
+    """
+    from .tasks import slice_model
+
+    stored = client.hget(JOBS_KEY, model_id)
+    meta = json.loads(stored or '{}')
+    if not meta:
+        return None
+    owner_id = meta['owner']
+    now = _now_ms()
+    client.hset(JOBS_KEY, model_id, json.dumps({**meta, 'dispatched_at': now}))
+    client.hincrby(INFLIGHT_KEY, owner_id, 1)
+    try:
+        slice_model.delay(model_id)
+    except OperationalError:
+        client.hset(JOBS_KEY, model_id, stored)
+        if client.hincrby(INFLIGHT_KEY, owner_id, -1) <= 0:
+            client.hdel(INFLIGHT_KEY, owner_id)
+        client.lpush(queue_key, model_id)
+        if queue_key != PRIORITY_KEY and client.lpos(OWNERS_KEY, owner_id) is None:
+            client.lpush(OWNERS_KEY, owner_id)
+        raise
+    _record(client, WAITS_KEY, now - meta['submitted_at'])
+    return owner_id
+
+
+def _free_slot(client, model_id, meta):
+    """Forget a job and give back its owner's in-flight slot; False if it was already gone."""
+    # Only whoever removes the job may decrement, so release and reclaim
+    # racing for the same job free one slot
+    if not client.hdel(JOBS_KEY, model_id):
+        return False
+    if 'dispatched_at' in meta and client.hincrby(INFLIGHT_KEY, meta['owner'], -1) <= 0:
+        client.hdel(INFLIGHT_KEY, meta['owner'])
+    return True
+
+
+def _reclaim(client):
+    """Free the slots of jobs dispatched too long ago to still be running."""
+    if not client.set(RECLAIM_KEY, 1, nx=True, ex=RECLAIM_INTERVAL):
+        return 0
+    cutoff = _now_ms() - settings.SLICING_JOB_STALE_AFTER * 1000
+    reclaimed = 0
+    for model_id, meta in client.hscan_iter(JOBS_KEY):
+        meta = json.loads(meta)
+        if meta.get('dispatched_at', cutoff) < cutoff and _free_slot(client, model_id, meta):
+            logger.warning('Slicing job for model %s never finished; freed its slot', model_id)
+            reclaimed += 1
+    return reclaimed
+
+
+def dispatch():
+    """
+    Release queued jobs to Celery while the dispatch window has room.
+
+    The priority lane goes first; the rest is served one job per owner per
+    round, skipping owners at their in-flight cap. Owners that were served
+    move to the back of the ring so the next call starts with someone else.
+    If the broker is down, dispatching stops and the rest stays queued.
+    Returns the number of jobs dispatched.
+    """
+    client = get_redis()
+    user_cap = settings.SLICING_USER_MAX_IN_FLIGHT
+    dispatched = 0
+
+    with client.lock(LOCK_KEY, timeout=10):
+        _reclaim(client)
+        inflight = {k: int(v) for k, v in client.hgetall(INFLIGHT_KEY).items()}
+        free = settings.SLICING_DISPATCH_WINDOW - sum(inflight.values())
+
+        try:
+            while free > 0:
+                model_id = client.lpop(PRIORITY_KEY)
+                if model_id is None:
+                    break
+                owner_id = _start(client, model_id, PRIORITY_KEY)
+                if owner_id is None:
+                    continue
+                # Priority jobs count towards their owner's cap in the rounds below
+                inflight[owner_id] = inflight.get(owner_id, 0) + 1
+                free -= 1
+                dispatched += 1
+
+            progressed = True
+            while free > 0 and progressed:
+                progressed = False
+                for owner_id in client.lrange(OWNERS_KEY, 0, -1):
+                    if free <= 0:
+                        break
+                    if inflight.get(owner_id, 0) >= user_cap:
+                        continue
+                    model_id = client.lpop(_user_key(owner_id))
+                    client.lrem(OWNERS_KEY, 0, owner_id)
+                    if model_id is None:
+                        continue
+                    if client.llen(_user_key(owner_id)):
+                        client.rpush(OWNERS_KEY, owner_id)
+                    if _start(client, model_id, _user_key(owner_id)) is None:
+                        continue
+                    inflight[owner_id] = inflight.get(owner_id, 0) + 1
+                    free -= 1
+                    dispatched += 1
+                    progressed = True
+        except OperationalError:
+            # Called from on_commit hooks of requests that already succeeded;
+            # the jobs stay queued for the next dispatch
+            logger.exception('Could not hand slicing jobs to Celery')
+
+    return dispatched
+
+
+def release(model_id):
+    """Mark a dispatched job as finished and dispatch the next ones."""
+    client = get_redis()
+    model_id = str(model_id)
+    meta = client.hget(JOBS_KEY, model_id)
+    if meta is None:
+        return
+    meta = json.loads(meta)
+    if _free_slot(client, model_id, meta) and 'dispatched_at' in meta:
+        _record(client, TTQ_KEY, _now_ms() - meta['submitted_at'])
+    dispatch()
+
+
+def _percentiles(values):
+    if not values:
+        return {'count': 0, 'p50': None, 'p95': None, 'p99': None}
+    p50, p95, p99 = np.percentile(np.asarray(values, dtype=np.float64), [50, 95, 99])
+    return {'count': len(values), 'p50': round(p50), 'p95': round(p95), 'p99': round(p99)}
+
+
+def stats():
+    """
+    Report queue depth per owner and wait-time percentiles.
+
+    `wait_ms` is the time from submit until the job is handed to Celery;
+    `time_to_quote_ms` runs until the slicing result is stored.
+    """
+    client = get_redis()
+    inflight = {k: int(v) for k, v in client.hgetall(INFLIGHT_KEY).items()}
+    jobs = [json.loads(v) for v in client.hvals(JOBS_KEY)]
+    now = _now_ms()
+
+    users = {}
+    for owner_id in set(client.lrange(OWNERS_KEY, 0, -1)) | set(inflight):
+        users[owner_id] = {
+            'owner': owner_id,
+            'queued': client.llen(_user_key(owner_id)),
+            'in_flight': inflight.get(owner_id, 0),
+            'oldest_wait_ms': None,
+        }
+    for job in jobs:
+        if 'dispatched_at' in job or job['owner'] not in users:
+            continue
+        wait = now - job['submitted_at']
+        current = users[job['owner']]['oldest_wait_ms']
+        users[job['owner']]['oldest_wait_ms'] = max(wait, current or 0)
+
+    return {
+        'priority_queued': client.llen(PRIORITY_KEY),
+        'in_flight': sum(inflight.values()),
+        'dispatch_window': settings.SLICING_DISPATCH_WINDOW,
+        'user_max_in_flight': settings.SLICING_USER_MAX_IN_FLIGHT,
+        'users': sorted(users.values(), key=lambda u: -u['queued']),
+        'wait_ms': _percentiles([int(v) for v in client.lrange(WAITS_KEY, 0, -1)]),
+        'time_to_quote_ms': _percentiles([int(v) for v in client.lrange(TTQ_KEY, 0, -1)]),
+    }
@@ -0,0 +1,69 @@
+"""
+Full-text and fuzzy search for models.
+
+`?search=` on the model listings matches either of:
+
+- the weighted `search_vector` (name A, tags B, description C, category D),
+  kept current by a trigger and indexed with GIN; the text is parsed as a
+  web search, so quotes, `or` and `-word` work
+- when that finds nothing, trigram word similarity against the name
+  (pg_trgm, GIN-indexed), which catches typos and partial words
+
+Results are ordered by ts_rank (or the similarity) unless the client asks
+for another `?ordering=`. Both conditions use an index, so a search never
+scans the whole table the way the ILIKE-based SearchFilter did.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connections
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+from rest_framework import filters
+
+# Text search configuration; must match the trigger in migration 0011_model_search
+SEARCH_CONFIG = 'english'
+RANK_ANNOTATION = 'search_rank'
+# Quotes, "or" and -exclusions ask for exact full-text semantics
+_OPERATORS_RE = re.compile(r'"|(^|\s)-|\sor\s', re.IGNORECASE)
+
+
+def search_models(queryset, text):
+    """Filter a Model queryset to matches of `text`, annotated with search_rank."""
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    rank = SearchRank(F('search_vector'), query)
+    matches = Q(search_vector=query)
+    # Scoring trigrams of every full-text match costs more than the search
+    # itself, so they only serve as the fallback for words with no match
+    if not _OPERATORS_RE.search(text) and not queryset.filter(matches).exists():
+        rank = TrigramWordSimilarity(text, 'model_name')
+        matches = Q(model_name__trigram_word_similar=text)
+    # Ranks are float4; as float8 they survive the round trip through a
+    # pagination cursor exactly
+    return queryset.annotate(**{RANK_ANNOTATION: Cast(rank, FloatField())}).filter(matches)
+
+
+class ModelSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter backed by search_models.
+
+    Falls back to the ILIKE search over `search_fields` on databases other
+    than PostgreSQL.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        text = ' '.join(self.get_search_terms(request))
+        if not text:
+            return queryset
+        if connections[queryset.db].vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+        return search_models(queryset, text)
+
+
+class ModelOrderingFilter(filters.OrderingFilter):
+    """OrderingFilter that puts the best matches first while searching."""
+
+    def get_ordering(self, request, queryset, view):
+        if not request.query_params.get(self.ordering_param) and RANK_ANNOTATION in queryset.query.annotations:
+            return ['-' + RANK_ANNOTATION]
+        return super().get_ordering(request, queryset, view)
@@ -1,5 +1,12 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Model, ModelImage, ModelReviewLog, VisibilityStatus, ModelCategory
+from .models import Model, ModelArchive, ModelImage, ModelReviewLog, VisibilityStatus, ModelCategory, UploadSession
+from .archives import ARCHIVE_EXTENSIONS
+from .uploads import received_chunks
+from .direct_uploads import DirectUploadError, resolve_upload
+from .slicing import prepare_uploaded_model
 
 
 class ModelImageSerializer(serializers.ModelSerializer):
@@ -20,12 +27,59 @@ class ModelImageSerializer(serializers.ModelSerializer):
         return obj.image_path
 
 
+def with_listing_relations(queryset):
+    """
+    Load what the model serializers read: the owner in the same query and
+    all images in one more, so a page costs the same queries at any size.
+    """
+    return queryset.select_related('owner').prefetch_related('images')
+
+
+def _first_image(obj):
+    # Indexing the (prefetched) list instead of .first() avoids a query per model
+    images = obj.images.all()
+    return images[0] if images else None
+
+
+def _serialize_images(obj, request):
+    """Image dicts of a model in display order, with absolute URLs."""
+    images = []
+    for img in obj.images.all():
+        image_data = {
+            'id': img.id,
+            'is_primary': img.is_primary,
+            'order': img.order,
+        }
+        if img.image:
+            if request:
+                image_data['url'] = request.build_absolute_uri(img.image.url)
+            else:
+                image_data['url'] = img.image.url
+        elif img.image_path:
+            image_data['url'] = img.image_path
+        else:
+            image_data['url'] = None
+        images.append(image_data)
+    return images
+
+
+def _preview_url(obj, request):
+    """URL of the image rendered from the STL, used when nothing was uploaded."""
+    if not obj.preview_image:
+        return None
+    if request:
+        return request.build_absolute_uri(obj.preview_image.url)
+    return obj.preview_image.url
+
+
 class ModelSerializer(serializers.ModelSerializer):
     """Serializer for 3D Model with images."""
     images = serializers.SerializerMethodField()
     owner_email = serializers.EmailField(source='owner.email', read_only=True)
     owner_name = serializers.SerializerMethodField()
     thumbnail_url = serializers.SerializerMethodField()
+    preview_meshes = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
     category_display = serializers.CharField(source='get_category_display', read_only=True)
     
     class Meta:
@@ -33,11 +87,11 @@ class ModelSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'owner', 'owner_email', 'owner_name', 'model_name', 'description', 
             'category', 'category_display', 'tags', 'visibility_status', 'is_featured',
-            'stl_file_path', 'stl_file', 'gcode_file_path', 'thumbnail', 'thumbnail_url',
-            'slicing_info', 'download_count', 'view_count', 'price',
+            'stl_file_path', 'download_url', 'stl_hash', 'gcode_file_path', 'thumbnail', 'thumbnail_url',
+            'preview_meshes', 'slicing_info', 'download_count', 'view_count', 'price',
             'images', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'owner', 'gcode_file_path', 'slicing_info', 
+        read_only_fields = ['id', 'owner', 'stl_hash', 'gcode_file_path', 'slicing_info', 
                            'download_count', 'view_count', 'created_at', 'updated_at']
     
     def get_owner_name(self, obj):
@@ -45,25 +99,7 @@ class ModelSerializer(serializers.ModelSerializer):
     
     def get_images(self, obj):
         """Return images with proper absolute URLs."""
-        request = self.context.get('request')
-        images = []
-        for img in obj.images.all():
-            image_data = {
-                'id': img.id,
-                'is_primary': img.is_primary,
-                'order': img.order,
-            }
-            if img.image:
-                if request:
-                    image_data['url'] = request.build_absolute_uri(img.image.url)
-                else:
-                    image_data['url'] = img.image.url
-            elif img.image_path:
-                image_data['url'] = img.image_path
-            else:
-                image_data['url'] = None
-            images.append(image_data)
-        return images
+        return _serialize_images(obj, self.context.get('request'))
     
     def get_thumbnail_url(self, obj):
         if obj.thumbnail:
@@ -72,33 +108,90 @@ class ModelSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(obj.thumbnail.url)
             return obj.thumbnail.url
         # Fall back to first image
-        first_image = obj.images.first()
+        first_image = _first_image(obj)
         if first_image and first_image.image:
             request = self.context.get('request')
             if request:
                 return request.build_absolute_uri(first_image.image.url)
             return first_image.image.url
-        return None
+        return _preview_url(obj, self.context.get('request'))
+
+    def get_download_url(self, obj):
+        """
+        The STL through the download endpoint. Blobs are stored compressed,
+        so a storage URL would not serve a usable STL.
+        """
+        if not obj.stl_file:
+            return None
+        url = reverse('model-download', kwargs={'pk': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_preview_meshes(self, obj):
+        """Quantized LOD meshes for the 3D viewer, smallest first."""
+        request = self.context.get('request')
+        meshes = []
+        for mesh in obj.preview_meshes or []:
+            url = default_storage.url(mesh['name'])
+            meshes.append({
+                'level': mesh['level'],
+                'url': request.build_absolute_uri(url) if request else url,
+                'triangles': mesh['triangles'],
+                'size': mesh['size'],
+            })
+        return meshes
 
 
 class ModelCreateSerializer(serializers.ModelSerializer):
-    """Serializer for creating a new 3D Model."""
+    """
+    Serializer for creating a new 3D Model.
+    
+    Files can be sent in the request, or uploaded directly to storage first
+    and referenced by the tokens returned from presign_upload.
+    """
     images = serializers.ListField(
         child=serializers.ImageField(),
         write_only=True,
         required=False
     )
+    stl_upload_token = serializers.CharField(write_only=True, required=False)
+    thumbnail_upload_token = serializers.CharField(write_only=True, required=False)
+    image_upload_tokens = serializers.ListField(
+        child=serializers.CharField(),
+        write_only=True,
+        required=False
+    )
     
     class Meta:
         model = Model
         fields = ['model_name', 'description', 'category', 'tags', 
-                  'stl_file_path', 'stl_file', 'thumbnail', 'price', 'images']
+                  'stl_file_path', 'stl_file', 'thumbnail', 'price', 'images',
+                  'stl_upload_token', 'thumbnail_upload_token', 'image_upload_tokens']
+        # The stored STL is compressed; clients download it via download_url
+        extra_kwargs = {'stl_file': {'write_only': True}}
+    
+    def validate(self, data):
+        user = self.context['request'].user
+        try:
+            if 'stl_upload_token' in data:
+                data['stl_file'] = resolve_upload(user, data.pop('stl_upload_token'), 'stl')
+            if 'thumbnail_upload_token' in data:
+                data['thumbnail'] = resolve_upload(user, data.pop('thumbnail_upload_token'), 'thumbnail')
+            data['image_names'] = [
+                resolve_upload(user, token, 'image')
+                for token in data.pop('image_upload_tokens', [])
+            ]
+        except DirectUploadError as e:
+            raise serializers.ValidationError(str(e))
+        return data
     
     def create(self, validated_data):
         images_data = validated_data.pop('images', [])
+        images_data += validated_data.pop('image_names', [])
         validated_data['owner'] = self.context['request'].user
         validated_data['visibility_status'] = VisibilityStatus.PRIVATE
         
+        # Storage names from direct uploads are assigned as-is (no copy)
         model = super().create(validated_data)
         
         # Create associated images
@@ -110,6 +203,11 @@ class ModelCreateSerializer(serializers.ModelSerializer):
                 order=idx
             )
         
+        # Reuse a cached slice for identical content, otherwise compute
+        # provisional weights from the mesh so the model can be quoted
+        # before the slicer has run
+        prepare_uploaded_model(model)
+        
         return model
 
 
@@ -144,25 +242,7 @@ class ModelListSerializer(serializers.ModelSerializer):
     
     def get_images(self, obj):
         """Return images with proper absolute URLs."""
-        request = self.context.get('request')
-        images = []
-        for img in obj.images.all():
-            image_data = {
-                'id': img.id,
-                'is_primary': img.is_primary,
-                'order': img.order,
-            }
-            if img.image:
-                if request:
-                    image_data['url'] = request.build_absolute_uri(img.image.url)
-                else:
-                    image_data['url'] = img.image.url
-            elif img.image_path:
-                image_data['url'] = img.image_path
-            else:
-                image_data['url'] = None
-            images.append(image_data)
-        return images
+        return _serialize_images(obj, self.context.get('request'))
     
     def get_thumbnail_url(self, obj):
         """Return the thumbnail or first image URL."""
@@ -171,7 +251,7 @@ class ModelListSerializer(serializers.ModelSerializer):
             if request:
                 return request.build_absolute_uri(obj.thumbnail.url)
             return obj.thumbnail.url
-        first_image = obj.images.first()
+        first_image = _first_image(obj)
         if first_image:
             if first_image.image:
                 request = self.context.get('request')
@@ -179,7 +259,29 @@ class ModelListSerializer(serializers.ModelSerializer):
                     return request.build_absolute_uri(first_image.image.url)
                 return first_image.image.url
             return first_image.image_path
-        return None
+        return _preview_url(obj, self.context.get('request'))
+
+
+class PendingReviewSerializer(ModelListSerializer):
+    """Listing serializer for the review queue, flagging likely duplicates."""
+    duplicate = serializers.SerializerMethodField()
+    
+    class Meta(ModelListSerializer.Meta):
+        fields = ModelListSerializer.Meta.fields + ['duplicate']
+    
+    def get_duplicate(self, obj):
+        signature = getattr(obj, 'shape_signature', None)
+        if signature is None or signature.duplicate_of is None:
+            return None
+        original = signature.duplicate_of
+        return {
+            'model_id': original.id,
+            'model_name': original.model_name,
+            'owner_email': original.owner.email,
+            'visibility_status': original.visibility_status,
+            'match': signature.duplicate_match,
+            'distance': signature.duplicate_distance,
+        }
 
 
 class ModelReviewLogSerializer(serializers.ModelSerializer):
@@ -193,3 +295,62 @@ class ModelReviewLogSerializer(serializers.ModelSerializer):
             'previous_status', 'new_status', 'reason', 'timestamp'
         ]
         read_only_fields = ['id', 'timestamp']
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Serializer for resumable chunked upload sessions."""
+    chunk_count = serializers.IntegerField(read_only=True)
+    received_chunks = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'filename', 'total_size', 'chunk_size', 'chunk_count', 'sha256',
+            'received_chunks', 'status', 'model', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['id', 'chunk_size', 'status', 'model', 'created_at', 'updated_at']
+    
+    def get_received_chunks(self, obj):
+        return received_chunks(obj)
+    
+    def validate_filename(self, value):
+        if not value.lower().endswith('.stl'):
+            raise serializers.ValidationError("Only .stl files can be uploaded.")
+        return value
+    
+    def validate_total_size(self, value):
+        if value < 1:
+            raise serializers.ValidationError("File is empty.")
+        if value > settings.CHUNKED_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"File exceeds the maximum size of {settings.CHUNKED_UPLOAD_MAX_SIZE} bytes."
+            )
+        return value
+    
+    def create(self, validated_data):
+        validated_data['owner'] = self.context['request'].user
+        validated_data['chunk_size'] = settings.CHUNKED_UPLOAD_CHUNK_SIZE
+        return super().create(validated_data)
+
+
+class ArchiveUploadSerializer(serializers.Serializer):
+    """Input for a 3MF/ZIP upload; the model fields are shared by every part."""
+    file = serializers.FileField()
+    model_name = serializers.CharField(max_length=200, required=False)
+    description = serializers.CharField(required=False, allow_blank=True)
+    category = serializers.ChoiceField(choices=ModelCategory.choices, required=False)
+    tags = serializers.ListField(child=serializers.CharField(), required=False)
+    
+    def validate_file(self, value):
+        if not value.name.lower().endswith(ARCHIVE_EXTENSIONS):
+            raise serializers.ValidationError("Only .3mf and .zip archives can be uploaded.")
+        return value
+
+
+class ModelArchiveSerializer(serializers.ModelSerializer):
+    """Serializer for multi-part archive uploads and their part models."""
+    parts = ModelListSerializer(many=True, read_only=True)
+    
+    class Meta:
+        model = ModelArchive
+        fields = ['id', 'name', 'filename', 'part_count', 'parts', 'created_at']
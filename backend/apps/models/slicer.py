@@ -0,0 +1,138 @@
+"""
+PrusaSlicer subprocess runner.
+
+Keeps slicer runs within the resources of the worker host: a fixed number
+of slot lock files caps concurrent slicer processes per host (shared by
+every Celery child process), each run gets a private scratch directory on
+tmpfs, and the subprocess is bounded in wall-clock time and address space.
+"""
+import fcntl
+import os
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+
+class SlicingError(Exception):
+    """Slicing failed in a way that retrying will not fix."""
+
+
+class TransientSlicingError(SlicingError):
+    """Slicing failed for a reason that may go away on retry."""
+
+
+def max_concurrency():
+    """Number of slicer processes allowed at once on this host."""
+    if settings.SLICING_MAX_CONCURRENCY:
+        return settings.SLICING_MAX_CONCURRENCY
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def scratch_root():
+    """Base directory for job scratch space, preferring tmpfs."""
+    root = settings.SLICING_SCRATCH_DIR
+    if not root:
+        root = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return Path(root)
+
+
+@contextmanager
+def slicer_slot(wait=None, poll_interval=0.5):
+    """
+    Hold one of the host's slicer slots for the duration of the block.
+
+    Slots are lock files taken with flock, so they are released by the
+    kernel even if the worker process dies. Raises TransientSlicingError if
+    no slot frees up within `wait` seconds.
+    """
+    if wait is None:
+        wait = settings.SLICING_SLOT_WAIT
+    slot_dir = scratch_root() / '3dpmp-slicer-slots'
+    slot_dir.mkdir(parents=True, exist_ok=True)
+    deadline = time.monotonic() + wait
+
+    while True:
+        for i in range(max_concurrency()):
+            fd = os.open(slot_dir / f'slot-{i}.lock', os.O_CREAT | os.O_RDWR, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            try:
+                yield i
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+            return
+        if time.monotonic() >= deadline:
+            raise TransientSlicingError('No free slicer slot')
+        time.sleep(poll_interval)
+
+
+@contextmanager
+def scratch_dir():
+    """Create a private scratch directory for one job and remove it after."""
+    root = scratch_root()
+    root.mkdir(parents=True, exist_ok=True)
+    path = Path(tempfile.mkdtemp(prefix='slice-', dir=root))
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _limit_memory():
+    limit = settings.SLICING_MEMORY_LIMIT_BYTES
+    if limit:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def build_command(stl_path, gcode_path):
+    command = [settings.SLICER_PATH, '--export-gcode']
+    if settings.SLICER_PROFILE:
+        command += ['--load', settings.SLICER_PROFILE]
+    command += ['--output', str(gcode_path), str(stl_path)]
+    return command
+
+
+def run_slicer(stl_path, gcode_path, timeout=None):
+    """
+    Slice `stl_path` into `gcode_path` with PrusaSlicer.
+
+    Raises SlicingError if the slicer rejects the model and
+    TransientSlicingError if it could not be started or ran out of time.
+    """
+    if timeout is None:
+        timeout = settings.SLICING_TIMEOUT
+    try:
+        result = subprocess.run(
+            build_command(stl_path, gcode_path),
+            cwd=Path(stl_path).parent,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            preexec_fn=_limit_memory,
+        )
+    except subprocess.TimeoutExpired:
+        raise TransientSlicingError(f'Slicer exceeded {timeout}s')
+    except OSError as e:
+        raise TransientSlicingError(f'Could not start slicer: {e}')
+
+    if result.returncode != 0:
+        output = (result.stderr or result.stdout).strip()
+        # Killed by a signal, e.g. SIGKILL from the memory limit or OOM
+        if result.returncode < 0:
+            raise TransientSlicingError(f'Slicer killed by signal {-result.returncode}')
+        raise SlicingError(output[-1000:] or f'Slicer exited with {result.returncode}')
+    if not Path(gcode_path).exists():
+        raise SlicingError('Slicer produced no G-code')
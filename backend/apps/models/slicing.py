@@ -0,0 +1,258 @@
+"""
+Slicing info helpers.
+
+`Model.slicing_info` is filled in two stages: a provisional estimate computed
+from the mesh right after upload, and the real PrusaSlicer result later on.
+Both record the extruded filament volume once and derive a per-material
+table from it, so one slice quotes every material. Pricing code should read
+weights through `weight_for_material` so it works with either stage.
+"""
+import logging
+from decimal import Decimal
+
+import numpy as np
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.materials.models import Material
+from .models import Model
+from .print_estimate import estimate as estimate_print, print_features
+from .stl import STLError, parse_stl, printed_volume_cm3, read_stl_bytes, stream_geometry
+from . import slicing_cache
+from .duplicates import dedupe_blob
+from .thumbnails import queue_preview
+
+logger = logging.getLogger(__name__)
+
+
+class SlicingSource:
+    """Where the data in `slicing_info` came from."""
+    MESH_ESTIMATE = 'mesh_estimate'
+    SLICER = 'slicer'
+
+
+def build_material_table(volume_cm3, materials=None):
+    """
+    Derive weight and price for every material from one filament volume.
+
+    Returns {material_id: {name, density_g_cm3, weight_g, price_twd}}. The
+    price is a quote at the material's price when the table was built;
+    orders re-price the weight with the current material price.
+    """
+    if materials is None:
+        materials = Material.objects.filter(is_active=True)
+    materials = list(materials)
+    if not materials:
+        return {}
+
+    densities = np.array([float(m.density_g_cm3) for m in materials])
+    prices = np.array([float(m.price_twd_g) for m in materials])
+    weights = np.round(volume_cm3 * densities, 2)
+    totals = np.round(weights * prices, 2)
+
+    return {
+        str(m.id): {
+            'name': m.name,
+            'density_g_cm3': float(density),
+            'weight_g': float(weight),
+            'price_twd': float(total),
+        }
+        for m, density, weight, total in zip(materials, densities, weights, totals)
+    }
+
+
+def build_mesh_estimate(fileobj, materials=None):
+    """
+    Analyze an open, seekable STL file and build a provisional `slicing_info` dict.
+
+    The file is streamed, so memory stays bounded however large the upload
+    is. Raises STLError if the file cannot be parsed.
+    """
+    geometry = stream_geometry(fileobj)
+    filament_volume = printed_volume_cm3(
+        geometry['volume_cm3'],
+        geometry['surface_area_cm2'],
+        settings.SLICING_ESTIMATE_WALL_MM,
+        settings.SLICING_ESTIMATE_INFILL,
+    )
+    return {
+        'source': SlicingSource.MESH_ESTIMATE,
+        'is_estimate': True,
+        **geometry,
+        'filament_volume_cm3': round(filament_volume, 4),
+        'materials': build_material_table(filament_volume, materials),
+    }
+
+
+def build_print_estimate(triangles):
+    """Print features of a mesh and the fast print time estimate made from them."""
+    features = print_features(triangles)
+    return {'print_features': features, 'print_estimate': estimate_print(features)}
+
+
+def apply_mesh_estimate(model):
+    """
+    Write a provisional mesh estimate into `model.slicing_info`.
+
+    Does nothing if the model has no STL or already has slicer results.
+    Returns the new slicing_info, or None if nothing was written.
+    """
+    if not model.stl_file:
+        return None
+    if model.slicing_info and model.slicing_info.get('source') == SlicingSource.SLICER:
+        return None
+
+    try:
+        model.stl_file.open('rb')
+        try:
+            info = build_mesh_estimate(model.stl_file)
+        finally:
+            model.stl_file.close()
+    except STLError as e:
+        logger.warning('Mesh estimate failed for model %s: %s', model.id, e)
+        return None
+
+    model.slicing_info = info
+    model.save(update_fields=['slicing_info'])
+    return info
+
+
+def prepare_uploaded_model(model):
+    """
+    Run the synchronous part of the upload pipeline for a new model.
+
+    Records the STL content hash, shares the stored blob with identical
+    earlier uploads, queues the preview image, meshes and duplicate check,
+    reuses a cached slicing result for identical content if one exists, and
+    otherwise writes a provisional mesh estimate and queues the real slice.
+    Returns True if a cached slicer result was applied.
+    """
+    if not model.stl_file:
+        return False
+
+    model.stl_file.open('rb')
+    try:
+        model.stl_hash = slicing_cache.hash_file(model.stl_file)
+    finally:
+        model.stl_file.close()
+    model.save(update_fields=['stl_hash'])
+    dedupe_blob(model)
+    queue_preview(model)
+    queue_preview_meshes(model)
+    queue_shape_index(model)
+
+    if slicing_cache.apply_cached_result(model):
+        return True
+
+    apply_mesh_estimate(model)
+    queue_print_estimate(model)
+    enqueue_slicing(model)
+    return False
+
+
+def apply_print_estimate(model):
+    """
+    Add print features and the fast print time estimate to `slicing_info`.
+
+    Parses the whole mesh, so it runs in the worker rather than the upload
+    request. Slicer results keep their print time; only the features are
+    added to them, as training data for the estimator. Returns the new
+    slicing_info, or None if nothing was written.
+    """
+    if not model.stl_file:
+        return None
+    try:
+        model.stl_file.open('rb')
+        try:
+            result = build_print_estimate(parse_stl(read_stl_bytes(model.stl_file)))
+        finally:
+            model.stl_file.close()
+    except STLError as e:
+        logger.warning('Print estimate failed for model %s: %s', model.id, e)
+        return None
+
+    # The slice may have finished meanwhile; re-read under a lock so its
+    # result is not overwritten
+    with transaction.atomic():
+        locked = Model.objects.select_for_update().filter(pk=model.pk).first()
+        if locked is None:
+            return None
+        info = dict(locked.slicing_info or {})
+        if info.get('source') == SlicingSource.SLICER:
+            if 'print_features' in info:
+                return None
+            info['print_features'] = result['print_features']
+        else:
+            info.update(result)
+            info['print_time_s'] = result['print_estimate']['print_time_s']
+        locked.slicing_info = info
+        locked.save(update_fields=['slicing_info'])
+    model.slicing_info = info
+    return info
+
+
+def queue_print_estimate(model):
+    """Queue the fast print time estimate once the current transaction commits."""
+    from .tasks import estimate_print_time
+
+    transaction.on_commit(lambda: estimate_print_time.delay(model.id))
+
+
+def queue_preview_meshes(model):
+    """Queue building the viewer LOD meshes once the current transaction commits."""
+    from .tasks import build_preview_meshes
+
+    transaction.on_commit(lambda: build_preview_meshes.delay(model.id))
+
+
+def queue_shape_index(model):
+    """Queue duplicate detection once the current transaction commits."""
+    from .tasks import index_shape
+
+    transaction.on_commit(lambda: index_shape.delay(model.id))
+
+
+def enqueue_slicing(model):
+    """Queue a slicing job for the model once the current transaction commits."""
+    from . import scheduler, status
+
+    def submit():
+        status.publish(model.id, status.SlicingState.QUEUED)
+        scheduler.submit(model)
+
+    transaction.on_commit(submit)
+
+
+def weight_for_material(slicing_info, material):
+    """
+    Return the print weight in grams of a model for the given material.
+
+    Prefers the per-material table, then scales the filament volume by the
+    material density (for materials added after slicing), then falls back to
+    a plain `weight_g` value.
+    Returns None if the model has no usable slicing info yet.
+    """
+    if not slicing_info:
+        return None
+
+    table = slicing_info.get('materials') or {}
+    if str(material.id) in table:
+        return Decimal(str(table[str(material.id)]['weight_g']))
+
+    if slicing_info.get('filament_volume_cm3') is not None:
+        volume = Decimal(str(slicing_info['filament_volume_cm3']))
+        return (volume * material.density_g_cm3).quantize(Decimal('0.01'))
+
+    if slicing_info.get('weight_g') is not None:
+        return Decimal(str(slicing_info['weight_g']))
+
+    return None
+
+
+def unit_price_for_material(slicing_info, material):
+    """Return the price of one print in the given material at its current price."""
+    weight = weight_for_material(slicing_info, material)
+    if weight is None:
+        return None
+    return (weight * material.price_twd_g).quantize(Decimal('0.01'))
@@ -0,0 +1,222 @@
+"""
+Content-addressed cache of slicing results.
+
+Identical STL content sliced with the same profile and slicer version always
+produces the same G-code, so results are stored once per
+(stl_hash, profile, slicer_version) and shared across models.
+"""
+import hashlib
+import logging
+import re
+import subprocess
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .blobs import blob_storage
+from .models import Model, SlicingCacheEntry
+
+logger = logging.getLogger(__name__)
+
+HITS_KEY = 'slicing_cache:hits'
+MISSES_KEY = 'slicing_cache:misses'
+
+_VERSION_RE = re.compile(r'PrusaSlicer-([\w.+-]+)')
+
+
+def hash_file(fileobj, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file object, read in chunks."""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=1)
+def get_slicer_version():
+    """Return the installed PrusaSlicer version, or SLICER_VERSION if set."""
+    if settings.SLICER_VERSION:
+        return settings.SLICER_VERSION
+    try:
+        result = subprocess.run(
+            [settings.SLICER_PATH, '--help'],
+            capture_output=True, text=True, timeout=30
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return 'unknown'
+    match = _VERSION_RE.search(result.stdout)
+    return match.group(1) if match else 'unknown'
+
+
+def get_profile_key():
+    """
+    Identify the slicer profile by name and content hash.
+
+    Editing the profile file changes the key, so stale results are never
+    reused after a settings change.
+    """
+    if not settings.SLICER_PROFILE:
+        return 'default'
+    path = Path(settings.SLICER_PROFILE)
+    try:
+        content = path.read_bytes()
+    except OSError:
+        return path.stem
+    return f"{path.stem}:{hashlib.sha256(content).hexdigest()[:16]}"
+
+
+def _incr(key):
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Key expired between add and incr
+        cache.set(key, 1, timeout=None)
+
+
+def lookup(stl_hash, profile=None, slicer_version=None):
+    """
+    Return the cache entry for an STL hash, or None on a miss.
+
+    Counts the hit or miss and marks the entry as recently used.
+    """
+    if not stl_hash:
+        return None
+    profile = profile or get_profile_key()
+    slicer_version = slicer_version or get_slicer_version()
+
+    entry = SlicingCacheEntry.objects.filter(
+        stl_hash=stl_hash, profile=profile, slicer_version=slicer_version
+    ).first()
+    if entry is None or not blob_storage.exists(entry.gcode_file_path):
+        _incr(MISSES_KEY)
+        return None
+
+    _incr(HITS_KEY)
+    SlicingCacheEntry.objects.filter(pk=entry.pk).update(
+        hit_count=F('hit_count') + 1,
+        last_used_at=timezone.now(),
+    )
+    return entry
+
+
+def apply_cached_result(model):
+    """
+    Copy a cached slicing result onto the model if one exists.
+
+    Returns True on a hit, in which case no slicing job is needed.
+    """
+    entry = lookup(model.stl_hash)
+    if entry is None:
+        return False
+    model.slicing_info = entry.slicing_info
+    model.gcode_file_path = entry.gcode_file_path
+    model.save(update_fields=['slicing_info', 'gcode_file_path'])
+    return True
+
+
+def store(stl_hash, slicing_info, gcode_file, profile=None, slicer_version=None):
+    """
+    Save a slicing result and its G-code blob, then enforce the size budget.
+
+    `gcode_file` is a Django File; it is written under slicing_cache/ keyed by
+    the cache key so identical results share one blob. Returns the entry.
+    """
+    profile = profile or get_profile_key()
+    slicer_version = slicer_version or get_slicer_version()
+
+    key = hashlib.sha256(f"{stl_hash}|{profile}|{slicer_version}".encode()).hexdigest()
+    path = blob_storage.save(f"slicing_cache/gcode/{key}.gcode", gcode_file)
+    # The budget counts bytes at rest, after compression
+    size = blob_storage.stored_size(path)
+
+    previous, previous_info = SlicingCacheEntry.objects.filter(
+        stl_hash=stl_hash, profile=profile, slicer_version=slicer_version
+    ).values_list('gcode_file_path', 'slicing_info').first() or (None, None)
+
+    try:
+        with transaction.atomic():
+            entry, _ = SlicingCacheEntry.objects.update_or_create(
+                stl_hash=stl_hash,
+                profile=profile,
+                slicer_version=slicer_version,
+                defaults={
+                    'slicing_info': slicing_info,
+                    'gcode_file_path': path,
+                    'gcode_size': size,
+                    'last_used_at': timezone.now(),
+                },
+            )
+    except IntegrityError:
+        # Another worker stored the same result concurrently; keep theirs
+        blob_storage.delete(path)
+        return SlicingCacheEntry.objects.get(
+            stl_hash=stl_hash, profile=profile, slicer_version=slicer_version
+        )
+
+    if previous and previous != path:
+        delete_blobs(previous, previous_info)
+        Model.objects.filter(gcode_file_path=previous).update(gcode_file_path=path)
+
+    # Never the entry just stored: the caller still reads its G-code
+    evict(keep=entry.pk)
+    return entry
+
+
+def delete_blobs(gcode_file_path, slicing_info):
+    """Delete a cached G-code blob and the toolpath preview built from it."""
+    blob_storage.delete(gcode_file_path)
+    toolpath_name = ((slicing_info or {}).get('toolpath') or {}).get('name')
+    if toolpath_name:
+        blob_storage.delete(toolpath_name)
+
+
+def evict(max_bytes=None, keep=None):
+    """
+    Delete least-recently-used G-code blobs until the cache fits the budget.
+
+    The entry with primary key `keep` is never evicted, even if it alone
+    exceeds the budget. Models that pointed at an evicted blob keep their
+    slicing_info but lose their gcode_file_path; the G-code is regenerated
+    on the next slice. Returns the number of entries evicted.
+    """
+    if max_bytes is None:
+        max_bytes = settings.SLICING_CACHE_MAX_BYTES
+    total = SlicingCacheEntry.objects.aggregate(total=Sum('gcode_size'))['total'] or 0
+    evicted = 0
+
+    for entry in SlicingCacheEntry.objects.exclude(pk=keep).order_by('last_used_at').iterator():
+        if total <= max_bytes:
+            break
+        delete_blobs(entry.gcode_file_path, entry.slicing_info)
+        Model.objects.filter(gcode_file_path=entry.gcode_file_path).update(gcode_file_path=None)
+        entry.delete()
+        total -= entry.gcode_size
+        evicted += 1
+
+    if evicted:
+        logger.info('Evicted %d slicing cache entries', evicted)
+    return evicted
+
+
+def stats():
+    """Return hit/miss counters and storage usage of the cache."""
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    totals = SlicingCacheEntry.objects.aggregate(total=Sum('gcode_size'))
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / lookups, 4) if lookups else None,
+        'entries': SlicingCacheEntry.objects.count(),
+        'total_bytes': totals['total'] or 0,
+        'max_bytes': settings.SLICING_CACHE_MAX_BYTES,
+    }
@@ -0,0 +1,155 @@
+"""
+Slicing status notifications over Redis pub/sub.
+
+The worker publishes an event on `slicing:status:<model_id>` at every
+pipeline stage and when the job finishes. The latest event is also kept
+under `slicing:status:last:<model_id>` so a client that connects mid-job
+sees the current stage straight away. `event_stream` turns these into a
+Server-Sent Events stream, replacing client-side polling of the model
+detail endpoint.
+
+The stream is an async generator and waits on the event loop, so it needs
+an ASGI server (see config/asgi.py). Under WSGI, each waiting client would
+hold a worker thread, so `snapshot_stream` sends the current state once and
+lets EventSource reconnect.
+
+EventSource cannot send an Authorization header, so the stream also
+accepts `?token=` from `make_stream_token`. This is a signed token,
+scoped to one user and one model.
+"""
+import json
+import time
+
+import redis.asyncio
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication
+
+from .scheduler import get_redis
+
+CHANNEL_PREFIX = 'slicing:status:'
+LAST_PREFIX = 'slicing:status:last:'
+LAST_TTL = 24 * 3600
+STREAM_TOKEN_SALT = 'models.slicing_status'
+
+
+class SlicingState:
+    QUEUED = 'queued'
+    SLICING = 'slicing'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+
+    FINAL = (COMPLETED, FAILED)
+
+
+def publish(model_id, state, **data):
+    """Publish a status event for a model and remember it as the latest."""
+    event = json.dumps({'model_id': str(model_id), 'state': state, **data})
+    client = get_redis()
+    client.set(LAST_PREFIX + str(model_id), event, ex=LAST_TTL)
+    client.publish(CHANNEL_PREFIX + str(model_id), event)
+
+
+def _status(model, last):
+    """The latest status event of a model, given the raw event kept in Redis."""
+    from .slicing import SlicingSource
+
+    info = model.slicing_info or {}
+    if info.get('source') == SlicingSource.SLICER:
+        return {'model_id': str(model.id), 'state': SlicingState.COMPLETED, 'slicing_info': info}
+    if last:
+        return json.loads(last)
+    if info.get('slicer_error'):
+        return {'model_id': str(model.id), 'state': SlicingState.FAILED, 'error': info['slicer_error']}
+    return {'model_id': str(model.id), 'state': SlicingState.QUEUED}
+
+
+def current_status(model):
+    """Return the latest status event for a model as a dict."""
+    return _status(model, get_redis().get(LAST_PREFIX + str(model.id)))
+
+
+def make_stream_token(user, model_id):
+    """Token that opens the status stream of one model as `user`."""
+    return signing.dumps({'model': str(model_id), 'user': str(user.pk)}, salt=STREAM_TOKEN_SALT)
+
+
+class StreamTokenAuthentication(BaseAuthentication):
+    """Authenticates `?token=` from make_stream_token for the model in the URL."""
+
+    def authenticate(self, request):
+        token = request.query_params.get('token')
+        if not token:
+            return None
+        try:
+            payload = signing.loads(token, salt=STREAM_TOKEN_SALT, max_age=settings.SLICING_STATUS_TOKEN_TTL)
+        except signing.BadSignature:
+            raise exceptions.AuthenticationFailed('Invalid or expired status token')
+        if payload['model'] != str(request.parser_context['kwargs'].get('pk')):
+            raise exceptions.AuthenticationFailed('Status token is for another model')
+        user = get_user_model().objects.filter(pk=payload['user'], is_active=True).first()
+        if user is None:
+            raise exceptions.AuthenticationFailed('User inactive or deleted')
+        return user, None
+
+    def authenticate_header(self, request):
+        return 'Token'
+
+
+def _format(event):
+    return f"event: {event['state']}\ndata: {json.dumps(event)}\n\n"
+
+
+def get_async_redis():
+    """A Redis client for the event loop serving one stream; close it with aclose()."""
+    return redis.asyncio.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+
+async def event_stream(model, timeout=None, heartbeat=15):
+    """
+    Yield Server-Sent Events for a model until slicing finishes or `timeout`.
+
+    Subscribes before reading the current status so no event is missed in
+    between. Sends a comment line every `heartbeat` seconds to keep proxies
+    from closing the connection; EventSource reconnects after a timeout.
+    Waiting happens on the event loop, so under ASGI an open stream holds
+    no worker thread.
+    """
+    if timeout is None:
+        timeout = settings.SLICING_STATUS_STREAM_TIMEOUT
+
+    client = get_async_redis()
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    try:
+        await pubsub.subscribe(CHANNEL_PREFIX + str(model.id))
+        event = _status(model, await client.get(LAST_PREFIX + str(model.id)))
+        yield f"retry: 3000\n{_format(event)}"
+        if event['state'] in SlicingState.FINAL:
+            return
+
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=min(heartbeat, remaining))
+            if message is None:
+                yield ': keep-alive\n\n'
+                continue
+            event = json.loads(message['data'])
+            yield _format(event)
+            if event['state'] in SlicingState.FINAL:
+                return
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
+
+
+def snapshot_stream(model):
+    """
+    Yield only the current status as one Server-Sent Event.
+
+    Used under WSGI, where a held stream would pin a worker thread: the
+    response ends at once and EventSource asks again after `retry`
+    milliseconds, which makes it a cheap poll.
+    """
+    yield f"retry: {settings.SLICING_STATUS_POLL_INTERVAL_MS}\n{_format(current_status(model))}"
@@ -0,0 +1,274 @@
+"""
+STL reading and mesh analysis.
+
+Parses binary and ASCII STL files into a single (N, 3, 3) float array of
+triangle vertices and derives geometry from it with vectorized NumPy ops.
+STL coordinates are assumed to be in millimetres.
+"""
+import io
+import re
+
+import numpy as np
+
+
+class STLError(ValueError):
+    """Raised when a file cannot be parsed as STL."""
+
+
+# Binary STL layout: 80-byte header, uint32 triangle count, then 50 bytes per
+# triangle (normal + 3 vertices as float32, plus a uint16 attribute count).
+BINARY_HEADER_SIZE = 84
+BINARY_TRIANGLE_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attr', '<u2'),
+])
+
+# Block size for streamed reads; bounds the memory of `stream_geometry`
+STREAM_BLOCK_SIZE = 1024 * 1024
+
+_ASCII_VERTEX_RE = re.compile(
+    rb'vertex\s+([-+0-9.eE]+)\s+([-+0-9.eE]+)\s+([-+0-9.eE]+)'
+)
+
+
+def read_stl_bytes(fileobj):
+    """Read the full content of an open file-like object from the start."""
+    fileobj.seek(0)
+    data = fileobj.read()
+    fileobj.seek(0)
+    return data
+
+
+def _is_binary(data):
+    if len(data) < BINARY_HEADER_SIZE:
+        return False
+    count = int(np.frombuffer(data, dtype='<u4', count=1, offset=80)[0])
+    # ASCII files start with "solid", but so do some binary exporters, so
+    # trust the size check first.
+    return len(data) == BINARY_HEADER_SIZE + count * BINARY_TRIANGLE_DTYPE.itemsize
+
+
+def parse_stl(data):
+    """
+    Parse STL bytes into an (N, 3, 3) float64 array of triangle vertices.
+
+    Raises STLError when the content is neither a valid binary nor ASCII STL.
+    """
+    if _is_binary(data):
+        records = np.frombuffer(data, dtype=BINARY_TRIANGLE_DTYPE, offset=BINARY_HEADER_SIZE)
+        triangles = records['vertices'].astype(np.float64)
+    elif data.lstrip()[:5].lower() == b'solid':
+        coords = _ASCII_VERTEX_RE.findall(data)
+        if not coords or len(coords) % 3:
+            raise STLError('ASCII STL has no complete facets')
+        try:
+            triangles = np.array(coords, dtype=np.float64).reshape(-1, 3, 3)
+        except ValueError as e:
+            raise STLError(f'Invalid vertex in ASCII STL: {e}')
+    else:
+        raise STLError('File is not a valid STL')
+
+    if len(triangles) == 0:
+        raise STLError('STL contains no triangles')
+    if not np.isfinite(triangles).all():
+        raise STLError('STL contains non-finite coordinates')
+    return triangles
+
+
+def analyze_triangles(triangles):
+    """
+    Compute volume, surface area, bounding box and triangle count.
+
+    Volume is the sum of signed tetrahedron volumes against the origin, which
+    is exact for closed meshes regardless of where the mesh sits in space.
+    """
+    v0, v1, v2 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    cross = np.cross(v1 - v0, v2 - v0)
+
+    volume_mm3 = abs(np.einsum('ij,ij->', v0, np.cross(v1, v2))) / 6.0
+    area_mm2 = np.linalg.norm(cross, axis=1).sum() / 2.0
+
+    flat = triangles.reshape(-1, 3)
+    bbox_min = flat.min(axis=0)
+    bbox_max = flat.max(axis=0)
+
+    return {
+        'triangle_count': int(len(triangles)),
+        'volume_cm3': round(float(volume_mm3) / 1000.0, 4),
+        'surface_area_cm2': round(float(area_mm2) / 100.0, 4),
+        'bbox_min_mm': [round(float(x), 3) for x in bbox_min],
+        'bbox_max_mm': [round(float(x), 3) for x in bbox_max],
+        'size_mm': [round(float(x), 3) for x in (bbox_max - bbox_min)],
+    }
+
+
+class MeshStats:
+    """
+    Running version of `analyze_triangles` for triangles that arrive in
+    batches, so a mesh can be measured without holding it all in memory.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.signed_volume = 0.0
+        self.area = 0.0
+        self.bbox_min = np.full(3, np.inf)
+        self.bbox_max = np.full(3, -np.inf)
+
+    def update(self, triangles):
+        if len(triangles) == 0:
+            return
+        v0, v1, v2 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+        self.count += len(triangles)
+        self.signed_volume += float(np.einsum('ij,ij->', v0, np.cross(v1, v2))) / 6.0
+        self.area += float(np.linalg.norm(np.cross(v1 - v0, v2 - v0), axis=1).sum()) / 2.0
+        flat = triangles.reshape(-1, 3)
+        self.bbox_min = np.minimum(self.bbox_min, flat.min(axis=0))
+        self.bbox_max = np.maximum(self.bbox_max, flat.max(axis=0))
+
+    def result(self):
+        return {
+            'triangle_count': self.count,
+            'volume_cm3': round(abs(self.signed_volume) / 1000.0, 4),
+            'surface_area_cm2': round(self.area / 100.0, 4),
+            'bbox_min_mm': [round(float(x), 3) for x in self.bbox_min],
+            'bbox_max_mm': [round(float(x), 3) for x in self.bbox_max],
+            'size_mm': [round(float(x), 3) for x in (self.bbox_max - self.bbox_min)],
+        }
+
+
+class STLStreamParser:
+    """
+    Incremental STL parser: `feed` it bytes as they arrive and it returns the
+    complete triangles parsed so far, keeping only a partial record or line
+    between calls.
+
+    Binary and ASCII are told apart by the declared content length when it
+    is known, and by the leading "solid" keyword otherwise.
+    """
+
+    def __init__(self, content_length=None):
+        self.content_length = content_length
+        self.buffer = bytearray()
+        self.mode = None
+        self.expected = None
+        self.parsed = 0
+        self.pending_coords = []
+
+    def _detect(self, final):
+        if len(self.buffer) < BINARY_HEADER_SIZE and not final:
+            return
+        looks_ascii = bytes(self.buffer[:BINARY_HEADER_SIZE]).lstrip()[:5].lower() == b'solid'
+        if len(self.buffer) >= BINARY_HEADER_SIZE:
+            count = int(np.frombuffer(bytes(self.buffer[80:84]), dtype='<u4')[0])
+            binary_size = BINARY_HEADER_SIZE + count * BINARY_TRIANGLE_DTYPE.itemsize
+            if self.content_length == binary_size or (self.content_length is None and not looks_ascii):
+                self.mode = 'binary'
+                self.expected = count
+                del self.buffer[:BINARY_HEADER_SIZE]
+                return
+        if looks_ascii:
+            self.mode = 'ascii'
+            return
+        raise STLError('File is not a valid STL')
+
+    def _binary(self, final):
+        usable = len(self.buffer) - len(self.buffer) % BINARY_TRIANGLE_DTYPE.itemsize
+        records = np.frombuffer(bytes(self.buffer[:usable]), dtype=BINARY_TRIANGLE_DTYPE)
+        del self.buffer[:usable]
+        self.parsed += len(records)
+        if self.parsed > self.expected:
+            raise STLError('Binary STL has more triangles than its header declares')
+        if final and (self.buffer or self.parsed != self.expected):
+            raise STLError('Binary STL is truncated')
+        return records['vertices'].astype(np.float64)
+
+    def _ascii(self, final):
+        cut = len(self.buffer) if final else self.buffer.rfind(b'\n') + 1
+        coords = self.pending_coords + _ASCII_VERTEX_RE.findall(bytes(self.buffer[:cut]))
+        del self.buffer[:cut]
+        usable = len(coords) - len(coords) % 3
+        self.pending_coords = coords[usable:]
+        if final and self.pending_coords:
+            raise STLError('ASCII STL has an incomplete facet')
+        try:
+            triangles = np.array(coords[:usable], dtype=np.float64).reshape(-1, 3, 3)
+        except ValueError as e:
+            raise STLError(f'Invalid vertex in ASCII STL: {e}')
+        self.parsed += len(triangles)
+        return triangles
+
+    def _parse(self, final):
+        if self.mode is None:
+            self._detect(final)
+            if self.mode is None:
+                return np.empty((0, 3, 3))
+        triangles = self._binary(final) if self.mode == 'binary' else self._ascii(final)
+        if not np.isfinite(triangles).all():
+            raise STLError('STL contains non-finite coordinates')
+        return triangles
+
+    def feed(self, data):
+        """Add bytes and return the triangles completed by them."""
+        self.buffer += data
+        return self._parse(final=False)
+
+    def close(self):
+        """Parse whatever is left. Raises STLError if the file was incomplete."""
+        triangles = self._parse(final=True)
+        if self.parsed == 0:
+            raise STLError('STL contains no triangles')
+        return triangles
+
+
+def write_binary_stl(path, triangles):
+    """Write an (N, 3, 3) triangle array as a binary STL file."""
+    v0, v1, v2 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    normals = np.cross(v1 - v0, v2 - v0)
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+    records = np.zeros(len(triangles), dtype=BINARY_TRIANGLE_DTYPE)
+    records['normal'] = normals
+    records['vertices'] = triangles
+    with open(path, 'wb') as f:
+        f.write(b'3DPMP binary STL'.ljust(80, b' '))
+        f.write(np.uint32(len(triangles)).tobytes())
+        records.tofile(f)
+
+
+def analyze_stl(fileobj):
+    """Parse an STL file object and return its geometry summary."""
+    return analyze_triangles(parse_stl(read_stl_bytes(fileobj)))
+
+
+def stream_geometry(fileobj, block_size=STREAM_BLOCK_SIZE):
+    """
+    Geometry summary of an open, seekable STL file, read block by block.
+
+    Gives the same result as `analyze_stl` while holding only one block of
+    the file in memory, so it is safe for large uploads.
+    """
+    fileobj.seek(0, io.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    parser = STLStreamParser(size)
+    stats = MeshStats()
+    while block := fileobj.read(block_size):
+        stats.update(parser.feed(block))
+    stats.update(parser.close())
+    fileobj.seek(0)
+    return stats.result()
+
+
+def printed_volume_cm3(volume_cm3, surface_area_cm2, wall_mm, infill):
+    """
+    Approximate the extruded volume of a print from solid mesh geometry.
+
+    The outer shell (surface area times wall thickness) is printed solid and
+    the remaining interior at the infill ratio.
+    """
+    shell = min(volume_cm3, surface_area_cm2 * wall_mm / 10.0)
+    return shell + (volume_cm3 - shell) * infill
+
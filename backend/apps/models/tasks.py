@@ -0,0 +1,281 @@
+"""
+Celery tasks for slicing uploaded models and rendering their previews.
+"""
+import logging
+import shutil
+import time
+from contextlib import contextmanager
+
+from celery import Task, shared_task, states
+from django.conf import settings
+from django.core.files import File
+from django.db import DatabaseError, OperationalError
+
+from . import (
+    downloads, duplicates, preview_mesh, print_time, related, scheduler, slicing_cache, status, thumbnails,
+    toolpath,
+)
+from .gcode import iter_moves, parse_gcode_metadata
+from .mesh_check import MeshStatus, check_mesh
+from .models import Model, SlicingCacheEntry, VisibilityStatus
+from .print_estimate import print_features
+from .slicer import (
+    SlicingError, TransientSlicingError, run_slicer, scratch_dir, slicer_slot
+)
+from .slicing import SlicingSource, apply_print_estimate, build_material_table
+from .stl import STLError, parse_stl, write_binary_stl
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def stage(timings, name, model_id):
+    """
+    Record the wall-clock duration of a pipeline stage in milliseconds and
+    announce the stage to clients waiting on the model's status stream.
+    """
+    status.publish(model_id, status.SlicingState.SLICING, stage=name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def precheck(stl_path):
+    """
+    Validate the mesh before slicing, repairing the scratch copy in place.
+
+    Returns (mesh check report, triangles). Raises SlicingError if the file
+    is not a valid STL.
+    """
+    try:
+        triangles = parse_stl(stl_path.read_bytes())
+    except STLError as e:
+        raise SlicingError(str(e))
+    report, repaired = check_mesh(triangles)
+    if repaired is not None:
+        write_binary_stl(stl_path, repaired)
+    return report, triangles
+
+
+def build_slicer_info(model, metadata, mesh_check):
+    """Merge slicer output into the model's existing (estimated) slicing_info."""
+    info = dict(model.slicing_info or {})
+    info.pop('slicer_error', None)
+    info.update(metadata)
+    info['mesh_check'] = mesh_check
+    info.update({
+        'source': SlicingSource.SLICER,
+        'is_estimate': False,
+        'profile': slicing_cache.get_profile_key(),
+        'slicer_version': slicing_cache.get_slicer_version(),
+    })
+    # The slicer's own weight_g assumes the profile's filament density;
+    # prices for every material come from the volume instead
+    if metadata.get('filament_used_cm3'):
+        info['filament_volume_cm3'] = metadata['filament_used_cm3']
+        info['materials'] = build_material_table(metadata['filament_used_cm3'])
+    return info
+
+
+def record_failure(model_id, error):
+    """Store a slicing error on the model and announce it to waiting clients."""
+    try:
+        model = Model.objects.filter(pk=model_id).first()
+        if model is not None:
+            info = dict(model.slicing_info or {})
+            info['slicer_error'] = error
+            model.slicing_info = info
+            model.save(update_fields=['slicing_info'])
+    except DatabaseError:
+        # The failure may have been the database itself; clients still hear of it
+        logger.exception('Could not record the slicing error of model %s', model_id)
+    status.publish(model_id, status.SlicingState.FAILED, error=error)
+
+
+class FairSlicingTask(Task):
+    """
+    Frees the job's fair-scheduler slot once it has finished for good, and
+    reports jobs that failed for good (retries exhausted or an unexpected
+    error) as FAILED instead of leaving clients on the last retry event.
+    """
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        if args:
+            logger.error('Slicing failed for model %s: %r', args[0], exc)
+            record_failure(args[0], f'Slicing failed: {exc}')
+
+    def after_return(self, status, retval, task_id, args, kwargs, einfo):
+        if status != states.RETRY and args:
+            scheduler.release(args[0])
+
+
+@shared_task(
+    bind=True,
+    base=FairSlicingTask,
+    acks_late=True,
+    autoretry_for=(TransientSlicingError, OSError, OperationalError),
+    retry_backoff=settings.SLICING_RETRY_BACKOFF,
+    retry_backoff_max=600,
+    retry_jitter=True,
+    max_retries=settings.SLICING_MAX_RETRIES,
+    soft_time_limit=settings.SLICING_TIMEOUT + 120,
+    time_limit=settings.SLICING_TIMEOUT + 180,
+)
+def slice_model(self, model_id):
+    """
+    Slice a model's STL with PrusaSlicer and store the result.
+
+    Stages (download, precheck, slice, parse, upload, moves, toolpath)
+    are timed and saved in `slicing_info['timings_ms']`. Results go through
+    the slicing cache, so identical content is only ever sliced once per
+    profile and version.
+    """
+    model = Model.objects.filter(pk=model_id).first()
+    if model is None or not model.stl_file:
+        return
+    if not model.stl_hash:
+        with model.stl_file.open('rb') as f:
+            model.stl_hash = slicing_cache.hash_file(f)
+        model.save(update_fields=['stl_hash'])
+    if slicing_cache.apply_cached_result(model):
+        status.publish(model_id, status.SlicingState.COMPLETED, slicing_info=model.slicing_info)
+        return
+
+    timings = {}
+    mesh_report = None
+    try:
+        with slicer_slot(), scratch_dir() as workdir:
+            stl_path = workdir / 'input.stl'
+            gcode_path = workdir / 'output.gcode'
+
+            with stage(timings, 'download', model_id):
+                with model.stl_file.open('rb') as src, open(stl_path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+
+            # Broken meshes are rejected here instead of wasting a slicer run
+            with stage(timings, 'precheck', model_id):
+                mesh_report, triangles = precheck(stl_path)
+                # The estimator is trained on features of sliced models; add
+                # them if the upload's estimate task has not run yet
+                if 'print_features' not in (model.slicing_info or {}):
+                    model.slicing_info = {**(model.slicing_info or {}), 'print_features': print_features(triangles)}
+                del triangles
+            if mesh_report['status'] == MeshStatus.REJECTED:
+                raise SlicingError('Mesh rejected: ' + '; '.join(mesh_report['issues']))
+
+            with stage(timings, 'slice', model_id):
+                run_slicer(stl_path, gcode_path)
+
+            with stage(timings, 'parse', model_id):
+                info = build_slicer_info(model, parse_gcode_metadata(gcode_path), mesh_report)
+
+            with stage(timings, 'upload', model_id):
+                with open(gcode_path, 'rb') as f:
+                    entry = slicing_cache.store(model.stl_hash, info, File(f))
+
+            # Per-layer extrusion paths for the viewer and the simulated
+            # print time, from one pass over the G-code a block at a time
+            with stage(timings, 'moves', model_id):
+                try:
+                    with open(gcode_path, 'rb') as f:
+                        collector = toolpath.PathCollector(toolpath.filament_diameter(f))
+                        simulator = print_time.PrintTimeSimulator()
+                        for moves in iter_moves(f):
+                            collector.add(moves)
+                            simulator.add(moves)
+                    paths, simulation = collector.paths(), simulator.finish()
+                except (ValueError, IndexError) as e:
+                    logger.warning('Could not parse moves for model %s: %s', model_id, e)
+                    paths = simulation = None
+            if paths is not None:
+                with stage(timings, 'toolpath', model_id):
+                    info['toolpath'] = toolpath.store_toolpath(paths, entry.gcode_file_path)
+                print_time.apply_simulation(info, simulation)
+    except TransientSlicingError as e:
+        status.publish(model_id, status.SlicingState.QUEUED, retry=self.request.retries + 1, error=str(e))
+        raise
+    except SlicingError as e:
+        logger.warning('Slicing failed for model %s: %s', model_id, e)
+        info = dict(model.slicing_info or {})
+        info['slicer_error'] = str(e)
+        if mesh_report is not None:
+            info['mesh_check'] = mesh_report
+        model.slicing_info = info
+        model.save(update_fields=['slicing_info'])
+        status.publish(model_id, status.SlicingState.FAILED, error=str(e))
+        return
+
+    info['timings_ms'] = timings
+    gcode_file_path = entry.gcode_file_path
+    # Another worker's store() may have evicted the entry meanwhile
+    if not SlicingCacheEntry.objects.filter(pk=entry.pk).update(slicing_info=info):
+        slicing_cache.delete_blobs(gcode_file_path, info)
+        info.pop('toolpath', None)
+        gcode_file_path = None
+
+    model.slicing_info = info
+    model.gcode_file_path = gcode_file_path
+    model.save(update_fields=['slicing_info', 'gcode_file_path'])
+    status.publish(model_id, status.SlicingState.COMPLETED, slicing_info=info)
+
+
+@shared_task
+def estimate_print_time(model_id):
+    """Compute print features and the fast print time estimate of a new upload."""
+    model = Model.objects.filter(pk=model_id).first()
+    if model is not None:
+        apply_print_estimate(model)
+
+
+@shared_task
+def render_previews():
+    """Render queued preview images, a batch at a time, until the queue is empty."""
+    # Clear the flag first so uploads arriving from now on schedule a new task
+    scheduler.get_redis().delete(thumbnails.SCHEDULED_KEY)
+    rendered = 0
+    while model_ids := thumbnails.pop_batch():
+        rendered += thumbnails.render_batch(model_ids)
+    return rendered
+
+
+@shared_task
+def build_preview_meshes(model_id):
+    """Write the quantized LOD meshes the 3D viewer loads instead of the STL."""
+    try:
+        model = Model.objects.get(id=model_id)
+    except Model.DoesNotExist:
+        return
+    if not model.stl_file:
+        return
+    try:
+        preview_mesh.build_preview_meshes(model)
+    except STLError as e:
+        logger.warning('Preview meshes failed for model %s: %s', model_id, e)
+
+
+@shared_task
+def index_shape(model_id):
+    """Compute the model's shape signature and flag it if it duplicates another."""
+    try:
+        model = Model.objects.get(id=model_id)
+    except Model.DoesNotExist:
+        return
+    if not model.stl_file:
+        return
+    try:
+        duplicates.index_model(model)
+    except STLError as e:
+        logger.warning('Shape indexing failed for model %s: %s', model_id, e)
+        return
+    if model.visibility_status == VisibilityStatus.PUBLIC:
+        related.record_change(model.id)
+
+
+@shared_task
+def flush_download_counts():
+    """Write buffered download counts to the database in one batch."""
+    # Clear the flag first so downloads from now on schedule a new flush
+    scheduler.get_redis().delete(downloads.SCHEDULED_KEY)
+    return downloads.flush_counts()
@@ -0,0 +1,103 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apps.users.models import Employee
+
+from .models import Model, ModelImage, VisibilityStatus
+
+PAGE_SIZE = 8
+
+
+class ListingQueryCountTests(TestCase):
+    """
+    Listing endpoints must cost the same number of queries at any page size
+    and on any page: owners are joined and images prefetched (see
+    with_listing_relations).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.owner = User.objects.create_user(email='owner@example.com', password='x')
+        cls.employee = User.objects.create_user(email='staff@example.com', password='x')
+        Employee.objects.create(user=cls.employee, employee_name='Staff')
+
+        cls.models = []
+        for i in range(PAGE_SIZE):
+            for visibility in (VisibilityStatus.PUBLIC, VisibilityStatus.PENDING):
+                # Each model gets its own owner, so a missing join shows up
+                owner = User.objects.create_user(email=f'{visibility.lower()}{i}@example.com', password='x')
+                model = Model.objects.create(
+                    owner=owner, model_name=f'Model {i}', stl_file_path=f'models/stl/{i}.stl',
+                    visibility_status=visibility,
+                )
+                for order in range(2):
+                    ModelImage.objects.create(
+                        model=model, image_path=f'models/images/{i}-{order}.png',
+                        is_primary=order == 0, order=order,
+                    )
+                cls.models.append(model)
+        for i in range(PAGE_SIZE):
+            Model.objects.create(owner=cls.owner, model_name=f'Own {i}', stl_file_path=f'models/stl/own{i}.stl')
+        cls.public = [m for m in cls.models if m.visibility_status == VisibilityStatus.PUBLIC]
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get(self, url, queries, **params):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, {'page_size': PAGE_SIZE, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def assertListingQueries(self, url, queries):
+        """Same query count for a small page, a full page and the next page."""
+        data = self.get(url, queries, page_size=2)
+        self.assertEqual(len(data['results']), 2)
+        data = self.get(url, queries)
+        self.assertEqual(len(data['results']), PAGE_SIZE)
+
+        half = PAGE_SIZE // 2
+        first = self.get(url, queries, page_size=half)
+        with self.assertNumQueries(queries):
+            response = self.client.get(first['next'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), half)
+        ids = {m['id'] for m in first['results']}
+        self.assertFalse(ids & {m['id'] for m in response.data['results']})
+
+    def test_list(self):
+        # Count (estimate_count, on every page), models with owners, images
+        self.assertListingQueries('/api/models/', 3)
+
+    def test_public_list(self):
+        self.assertListingQueries('/api/public-models/', 3)
+
+    def test_my_models(self):
+        self.client.force_authenticate(self.owner)
+        self.assertListingQueries('/api/models/my_models/', 3)
+
+    def test_pending_review(self):
+        self.client.force_authenticate(self.employee)
+        # Count, models with owners and duplicates, images
+        self.assertListingQueries('/api/models/pending_review/', 3)
+
+    def test_detail(self):
+        # Model with owner, images
+        data = self.get(f'/api/models/{self.public[0].id}/', 2)
+        self.assertEqual(len(data['images']), 2)
+
+    def test_public_detail(self):
+        # Model with owner, images, view count update
+        data = self.get(f'/api/public-models/{self.public[0].id}/', 3)
+        self.assertEqual(len(data['images']), 2)
+
+    def test_related(self):
+        matches = [(m.id, 0.1 * i) for i, m in enumerate(self.public[1:])]
+        with mock.patch('apps.models.views.related.related_models', return_value=matches):
+            # Model and its images, related models with owners, their images
+            data = self.get(f'/api/public-models/{self.public[0].id}/related/', 4)
+        self.assertEqual(len(data), len(matches))
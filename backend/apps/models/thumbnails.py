@@ -0,0 +1,107 @@
+"""
+Preview images rendered from uploaded STL files.
+
+New uploads are added to a Redis set and rendered in batches by the
+`render_previews` task, so a burst of uploads costs one worker task rather
+than one each. Renders are cached in storage by STL hash: models with
+identical content share one image and it is never rendered twice.
+
+Redis keys:
+    thumbnails:pending      set of model ids waiting for a preview
+    thumbnails:scheduled    set while a batch task is already queued
+"""
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .models import Model
+from .render import render_thumbnail
+from .scheduler import get_redis
+from .stl import STLError, parse_stl, read_stl_bytes
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'thumbnails:pending'
+SCHEDULED_KEY = 'thumbnails:scheduled'
+
+
+def preview_name(stl_hash):
+    """Storage name of the cached render for an STL hash."""
+    extension = settings.THUMBNAIL_RENDER_FORMAT.lower()
+    return f'models/previews/{stl_hash[:2]}/{stl_hash}.{extension}'
+
+
+def queue_preview(model):
+    """Queue a preview render for the model once the current transaction commits."""
+    from .tasks import render_previews
+
+    def submit():
+        client = get_redis()
+        client.sadd(PENDING_KEY, str(model.id))
+        # One batch task at a time; it picks up everything queued meanwhile
+        if client.set(SCHEDULED_KEY, 1, nx=True, ex=settings.THUMBNAIL_BATCH_DELAY * 10):
+            render_previews.apply_async(countdown=settings.THUMBNAIL_BATCH_DELAY)
+
+    transaction.on_commit(submit)
+
+
+def pop_batch(size=None):
+    """Remove and return up to `size` pending model ids."""
+    return get_redis().spop(PENDING_KEY, size or settings.THUMBNAIL_BATCH_SIZE) or []
+
+
+def pending_count():
+    return get_redis().scard(PENDING_KEY)
+
+
+def render_for_model(model):
+    """
+    Render (or reuse) the preview for the model's STL and return its storage name.
+
+    Raises STLError if the STL cannot be parsed.
+    """
+    name = preview_name(model.stl_hash)
+    if default_storage.exists(name):
+        return name
+
+    model.stl_file.open('rb')
+    try:
+        triangles = parse_stl(read_stl_bytes(model.stl_file))
+    finally:
+        model.stl_file.close()
+    image = render_thumbnail(
+        triangles, settings.THUMBNAIL_RENDER_SIZE, settings.THUMBNAIL_RENDER_FORMAT
+    )
+    # A concurrent render of the same content may have won; either copy is fine
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(image))
+    return name
+
+
+def render_batch(model_ids):
+    """
+    Render previews for the given models, one render per distinct STL hash.
+
+    Returns the number of models that got a preview.
+    """
+    models = (
+        Model.objects.filter(id__in=model_ids)
+        .exclude(stl_file='').exclude(stl_file__isnull=True)
+        .exclude(stl_hash='')
+    )
+    by_hash = {}
+    for model in models:
+        by_hash.setdefault(model.stl_hash, []).append(model)
+
+    updated = 0
+    for stl_hash, group in by_hash.items():
+        try:
+            name = render_for_model(group[0])
+        except STLError as e:
+            logger.warning('Preview render failed for %s: %s', stl_hash, e)
+            continue
+        updated += Model.objects.filter(id__in=[m.id for m in group]).update(preview_image=name)
+    return updated
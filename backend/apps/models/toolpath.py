@@ -0,0 +1,265 @@
+"""
+Layer-by-layer toolpath previews extracted from G-code.
+
+The slicing worker parses the G-code once (see gcode.iter_moves),
+collects the extrusion paths batch by batch with PathCollector and stores
+them in a compact binary that the viewer fetches a layer at a time with
+HTTP Range requests. All values are little-endian,
+and every block starts on a 4-byte boundary so it can be wrapped in JS
+typed arrays without copying:
+
+    header      magic b'TPTH', version u8, 3 pad bytes, layer_count u32,
+                origin_x f32, origin_y f32, scale f32            (24 bytes)
+    index       layer_count x (z f32, height f32, offset u64, size u32)
+    layers      one block per layer at index[i].offset:
+                    polyline_count u32, vertex_count u32
+                    polyline_start u32[polyline_count]   first vertex of each
+                    xy int16[vertex_count, 2]            origin + xy * scale
+                    width float16[vertex_count]          mm, of the segment
+                                                         ending at the vertex
+                    padding to 4 bytes
+
+The header and index are `index_bytes` long (stored in
+`slicing_info['toolpath']`), so a viewer reads them with one request and
+then each layer's byte range.
+"""
+import io
+import posixpath
+import struct
+
+import numpy as np
+from django.core.files.base import ContentFile
+
+from .blobs import blob_storage
+from .gcode import FOOTER_READ_BYTES, iter_moves, parse_footer
+
+MAGIC = b'TPTH'
+VERSION = 1
+HEADER = struct.Struct('<4sB3xIfff')
+INDEX_DTYPE = np.dtype([('z', '<f4'), ('height', '<f4'), ('offset', '<u8'), ('size', '<u4')])
+LAYER_HEADER = struct.Struct('<II')
+INT16_RANGE = 32767
+MAX_WIDTH_MM = 10.0
+
+# Used when no positive layer height can be measured (single-layer prints)
+DEFAULT_LAYER_HEIGHT_MM = 0.2
+DEFAULT_FILAMENT_DIAMETER_MM = 1.75
+
+
+def _pad(size):
+    return -size % 4
+
+
+class PathCollector:
+    """
+    Collects per-layer polylines of extrusion from batches of moves.
+
+    Batches come from gcode.iter_moves. A polyline or layer that spans two
+    batches continues across the boundary. Per vertex only the float32
+    position and the E per mm of the segment ending there are kept. Widths
+    need the layer heights, so they are computed in `paths` at the end.
+    """
+
+    def __init__(self, filament_diameter):
+        self.filament_area = np.pi * (filament_diameter / 2) ** 2
+        self.vertices = []
+        self.e_per_mm = []
+        self.polyline_starts = []
+        self.layer_starts = []
+        self.layer_z = []
+        self.vertex_count = 0
+        # State at the end of the previous batch
+        self.last_extruding = False
+        self.last_key = None
+        self.last_z = np.nan
+        self.z_layers = -1
+
+    def add(self, moves):
+        """Add the extrusion of one batch of moves."""
+        if len(moves) == 0:
+            return
+        x, y = moves.x, moves.y
+        prev_x = np.concatenate([[moves.start[0]], x[:-1]])
+        prev_y = np.concatenate([[moves.start[1]], y[:-1]])
+        length = np.hypot(x - prev_x, y - prev_y)
+        extruding = (moves.e > 0) & (length > 0)
+        index = np.flatnonzero(extruding)
+        if len(index) == 0:
+            self.last_extruding = False
+            return
+
+        # Layers come from ;LAYER_CHANGE markers; without one, every new
+        # extrusion height is a layer. Keys only need to differ per layer.
+        z = moves.z[index]
+        z_steps = np.diff(z, prepend=self.last_z) != 0
+        z_layer = self.z_layers + np.cumsum(z_steps)
+        marker_layer = moves.layer[index]
+        key = np.where(marker_layer >= 0, marker_layer, -1 - z_layer)
+        previous_key = np.concatenate([[key[0] - 1 if self.last_key is None else self.last_key], key[:-1]])
+
+        continues = key == previous_key
+        continues[0] &= self.last_extruding and index[0] == 0
+        continues[1:] &= index[1:] == index[:-1] + 1
+        starts_polyline = ~continues
+        new_layer = key != previous_key
+
+        # A new polyline emits its start point and end point, a continuation
+        # only its end point
+        vertex_count = 1 + starts_polyline
+        end_slot = np.cumsum(vertex_count) - 1
+        total = int(end_slot[-1]) + 1
+        vertices = np.empty((total, 2), dtype=np.float32)
+        e_per_mm = np.zeros(total, dtype=np.float32)
+        vertices[end_slot, 0] = x[index]
+        vertices[end_slot, 1] = y[index]
+        start_slot = end_slot[starts_polyline] - 1
+        vertices[start_slot, 0] = prev_x[index[starts_polyline]]
+        vertices[start_slot, 1] = prev_y[index[starts_polyline]]
+        e_per_mm[end_slot] = moves.e[index] / length[index]
+
+        self.vertices.append(vertices)
+        self.e_per_mm.append(e_per_mm)
+        self.polyline_starts.append(start_slot + self.vertex_count)
+        # A new layer always starts a new polyline
+        self.layer_starts.append(end_slot[new_layer] - 1 + self.vertex_count)
+        self.layer_z.append(z[new_layer])
+        self.vertex_count += total
+        self.last_extruding = bool(extruding[-1])
+        self.last_key = key[-1]
+        self.last_z = z[-1]
+        self.z_layers = z_layer[-1]
+
+    def paths(self):
+        """
+        Return (layers, vertices, widths, polyline_starts, layer_z, layer_height)
+        where `layers` holds the first vertex of each layer plus the total.
+        """
+        if not self.vertex_count:
+            empty = np.zeros(0)
+            return np.zeros(1, dtype=np.int64), np.zeros((0, 2)), empty, np.zeros(0, dtype=np.int64), empty, empty
+        layers = np.append(np.concatenate(self.layer_starts), self.vertex_count)
+        layer_z = np.concatenate(self.layer_z)
+        layer_height = np.diff(layer_z, prepend=0.0)
+        positive = layer_height[layer_height > 0]
+        fallback = float(np.median(positive)) if len(positive) else DEFAULT_LAYER_HEIGHT_MM
+        layer_height = np.where(layer_height > 0, layer_height, fallback)
+
+        # Cross-section area = filament area * E / length, spread over the layer height
+        vertex_height = np.repeat(layer_height, np.diff(layers))
+        widths = np.clip(np.concatenate(self.e_per_mm) * self.filament_area / vertex_height, 0, MAX_WIDTH_MM)
+        vertices = np.concatenate(self.vertices)
+        return layers, vertices, widths, np.concatenate(self.polyline_starts), layer_z, layer_height
+
+
+def extrusion_paths(moves, filament_diameter):
+    """Per-layer polylines of extrusion for moves held in memory; see PathCollector.paths."""
+    collector = PathCollector(filament_diameter)
+    collector.add(moves)
+    return collector.paths()
+
+
+def encode(layers, vertices, widths, polyline_starts, layer_z, layer_height):
+    """Serialize extrusion paths into the toolpath binary."""
+    layer_count = len(layer_z)
+    if len(vertices):
+        low, high = vertices.min(axis=0), vertices.max(axis=0)
+        origin = (low + high) / 2
+        scale = max(float((high - low).max()) / (2 * INT16_RANGE), 1e-6)
+    else:
+        origin, scale = np.zeros(2), 1.0
+    quantized = np.round((vertices - origin) / scale).clip(-INT16_RANGE, INT16_RANGE).astype('<i2')
+    widths = widths.astype('<f2')
+
+    index = np.zeros(layer_count, dtype=INDEX_DTYPE)
+    index['z'] = layer_z
+    index['height'] = layer_height
+    offset = HEADER.size + index.nbytes
+    blocks = []
+    for i in range(layer_count):
+        first, last = layers[i], layers[i + 1]
+        in_layer = slice(*np.searchsorted(polyline_starts, [first, last]))
+        starts = polyline_starts[in_layer] - first
+        block = b''.join([
+            LAYER_HEADER.pack(len(starts), last - first),
+            starts.astype('<u4').tobytes(),
+            quantized[first:last].tobytes(),
+            widths[first:last].tobytes(),
+        ])
+        block += bytes(_pad(len(block)))
+        index['offset'][i] = offset
+        index['size'][i] = len(block)
+        offset += len(block)
+        blocks.append(block)
+
+    header = HEADER.pack(MAGIC, VERSION, layer_count, origin[0], origin[1], scale)
+    return header + index.tobytes() + b''.join(blocks)
+
+
+def decode(data):
+    """Read a toolpath binary back into [(z, height, [polyline (K, 3) x/y/width])]."""
+    magic, version, layer_count, origin_x, origin_y, scale = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a toolpath file')
+    index = np.frombuffer(data, dtype=INDEX_DTYPE, count=layer_count, offset=HEADER.size)
+    layers = []
+    for z, height, offset, _ in index:
+        polyline_count, vertex_count = LAYER_HEADER.unpack_from(data, offset)
+        offset += LAYER_HEADER.size
+        starts = np.frombuffer(data, '<u4', polyline_count, offset)
+        offset += starts.nbytes
+        xy = np.frombuffer(data, '<i2', 2 * vertex_count, offset).reshape(-1, 2) * scale + (origin_x, origin_y)
+        offset += 4 * vertex_count
+        width = np.frombuffer(data, '<f2', vertex_count, offset).astype(np.float64)
+        points = np.column_stack([xy, width])
+        layers.append((float(z), float(height), np.split(points, starts[1:])))
+    return layers
+
+
+def filament_diameter(fileobj):
+    """Filament diameter from the footer of an open G-code file, for the first extruder."""
+    fileobj.seek(0, io.SEEK_END)
+    fileobj.seek(max(fileobj.tell() - FOOTER_READ_BYTES, 0))
+    footer = parse_footer(fileobj.read())
+    fileobj.seek(0)
+    try:
+        return float(footer.get('filament_diameter', '').split(',')[0])
+    except ValueError:
+        return DEFAULT_FILAMENT_DIAMETER_MM
+
+
+def collect_paths(fileobj):
+    """Extrusion paths of an open G-code file, parsed a block at a time."""
+    collector = PathCollector(filament_diameter(fileobj))
+    for moves in iter_moves(fileobj):
+        collector.add(moves)
+    return collector.paths()
+
+
+def build_toolpath(paths):
+    """
+    Encode the toolpath binary from finished extrusion paths.
+
+    Returns (binary, summary) where the summary goes into
+    `slicing_info['toolpath']`.
+    """
+    binary = encode(*paths)
+    layer_count = len(paths[4])
+    return binary, {
+        'version': VERSION,
+        'layer_count': layer_count,
+        'vertex_count': len(paths[1]),
+        'index_bytes': HEADER.size + layer_count * INDEX_DTYPE.itemsize,
+        'size': len(binary),
+    }
+
+
+def store_toolpath(paths, gcode_name):
+    """
+    Build and store the toolpath next to the G-code blob `gcode_name`.
+
+    `paths` is PathCollector.paths() of the G-code. Returns the summary
+    including the storage `name`.
+    """
+    binary, summary = build_toolpath(paths)
+    name = blob_storage.save(posixpath.splitext(gcode_name)[0] + '.toolpath', ContentFile(binary))
+    return {'name': name, **summary}
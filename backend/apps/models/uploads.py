@@ -0,0 +1,109 @@
+"""
+Chunk storage for resumable uploads.
+
+Each session gets a directory under CHUNKED_UPLOAD_DIR holding one
+`<index>.part` file per received chunk. Chunks are streamed from the request
+body to a temporary file while being hashed, and only renamed into place
+once their size and checksum match, so a partially received chunk never
+counts as uploaded.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class ChunkError(ValueError):
+    """Raised when a chunk is rejected."""
+
+
+def session_dir(session):
+    return Path(settings.CHUNKED_UPLOAD_DIR) / str(session.id)
+
+
+def _part_path(session, index):
+    return session_dir(session) / f'{index:06d}.part'
+
+
+def received_chunks(session):
+    """Return the sorted indexes of chunks already stored for the session."""
+    directory = session_dir(session)
+    if not directory.is_dir():
+        return []
+    return sorted(int(p.stem) for p in directory.glob('*.part'))
+
+
+def write_chunk(session, index, stream, sha256):
+    """
+    Stream one chunk from `stream` to disk and verify it.
+
+    `sha256` is the hex digest the client computed for the chunk. Raises
+    ChunkError if the index, size or checksum is wrong.
+    """
+    if not 0 <= index < session.chunk_count:
+        raise ChunkError(f'Chunk index must be between 0 and {session.chunk_count - 1}')
+    expected = session.expected_chunk_size(index)
+
+    directory = session_dir(session)
+    directory.mkdir(parents=True, exist_ok=True)
+    # A unique name per request, so retries of the same chunk never share one
+    tmp_file = tempfile.NamedTemporaryFile(dir=directory, prefix=f'{index:06d}.', suffix='.tmp', delete=False)
+    tmp_path = Path(tmp_file.name)
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with tmp_file as f:
+            while True:
+                block = stream.read(min(READ_BLOCK_SIZE, expected + 1 - size))
+                if not block:
+                    break
+                size += len(block)
+                if size > expected:
+                    raise ChunkError(f'Chunk {index} is larger than {expected} bytes')
+                digest.update(block)
+                f.write(block)
+        if size != expected:
+            raise ChunkError(f'Chunk {index} has {size} bytes, expected {expected}')
+        if sha256 and digest.hexdigest() != sha256.lower():
+            raise ChunkError(f'Chunk {index} checksum mismatch')
+        os.replace(tmp_path, _part_path(session, index))
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def assemble(session):
+    """
+    Concatenate all chunks into one file and return its path.
+
+    Raises ChunkError if chunks are missing or the whole-file checksum given
+    at session creation does not match.
+    """
+    missing = sorted(set(range(session.chunk_count)) - set(received_chunks(session)))
+    if missing:
+        raise ChunkError(f'Missing chunks: {missing[:20]}')
+
+    output = session_dir(session) / 'assembled'
+    digest = hashlib.sha256()
+    with open(output, 'wb') as out:
+        for index in range(session.chunk_count):
+            with open(_part_path(session, index), 'rb') as part:
+                while block := part.read(1024 * 1024):
+                    digest.update(block)
+                    out.write(block)
+
+    if session.sha256 and digest.hexdigest() != session.sha256.lower():
+        output.unlink()
+        raise ChunkError('File checksum mismatch')
+    return output
+
+
+def discard(session):
+    """Delete everything stored for the session."""
+    shutil.rmtree(session_dir(session), ignore_errors=True)
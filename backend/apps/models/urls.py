@@ -1,12 +1,19 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from .views import ModelViewSet, PublicModelViewSet
+from .views import (
+    InstantQuoteLookupView, InstantQuoteView, ModelArchiveViewSet, ModelViewSet, PublicModelViewSet,
+    UploadSessionViewSet
+)
 
 router = DefaultRouter()
 router.register(r'models', ModelViewSet, basename='model')
 router.register(r'public-models', PublicModelViewSet, basename='public-model')
+router.register(r'uploads', UploadSessionViewSet, basename='upload')
+router.register(r'archives', ModelArchiveViewSet, basename='archive')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('quote/', InstantQuoteView.as_view(), name='instant-quote'),
+    path('quote/<str:sha256>/', InstantQuoteLookupView.as_view(), name='instant-quote-lookup'),
 ]
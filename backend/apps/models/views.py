@@ -1,14 +1,54 @@
-from rest_framework import viewsets, permissions, status, filters
+from django.conf import settings
+from django.core.files import File
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import viewsets, mixins, permissions, status
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.throttling import ScopedRateThrottle
+from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 
-from .models import Model, ModelImage, ModelReviewLog, VisibilityStatus
+from .models import Model, ModelArchive, ModelImage, ModelReviewLog, VisibilityStatus, UploadSession, UploadStatus
 from .serializers import (
-    ModelSerializer, ModelCreateSerializer, ModelListSerializer,
-    ModelImageSerializer, ModelReviewLogSerializer, ModelUpdateSerializer
+    ModelSerializer, ModelCreateSerializer, ModelListSerializer, PendingReviewSerializer,
+    ModelImageSerializer, ModelReviewLogSerializer, ModelUpdateSerializer,
+    UploadSessionSerializer, ArchiveUploadSerializer, ModelArchiveSerializer, with_listing_relations
 )
+from .uploads import ChunkError, write_chunk, assemble, discard
+from .direct_uploads import DirectUploadError, create_presigned_upload, resolve_upload
+from . import downloads, facets, quotes, related, scheduler
+from .blobs import blob_storage
+from .archives import ArchiveError, combined_quote, create_archive
+from .search import ModelOrderingFilter, ModelSearchFilter
+from .status import StreamTokenAuthentication, event_stream, make_stream_token, snapshot_stream
+from .stl import STLError
 from apps.users.models import Employee
+from config.pagination import KeysetPagination
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets views answer EventSource requests (Accept: text/event-stream)."""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class DownloadRenderer(BaseRenderer):
+    """Lets download clients that only accept binary content negotiate."""
+    media_type = 'application/octet-stream'
+    format = 'download'
+    charset = None
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -43,13 +83,15 @@ class ModelViewSet(viewsets.ModelViewSet):
     - Only owners can update/delete their models
     """
     parser_classes = [MultiPartParser, FormParser, JSONParser]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [ModelSearchFilter, ModelOrderingFilter]
     search_fields = ['model_name', 'description', 'owner__email']
     ordering_fields = ['created_at', 'model_name', 'download_count', 'view_count']
     ordering = ['-created_at']
+    pagination_class = KeysetPagination
     
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy', 'upload_images']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'upload_images', 'presign_upload',
+                           'upload_archive', 'slicing_status_token']:
             permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
         else:
             permission_classes = [permissions.AllowAny]
@@ -85,17 +127,30 @@ class ModelViewSet(viewsets.ModelViewSet):
             
             if is_employee:
                 # Employees can see public + pending + their own models
-                return Model.objects.filter(
+                queryset = Model.objects.filter(
                     visibility_status__in=[VisibilityStatus.PUBLIC, VisibilityStatus.PENDING]
                 ) | Model.objects.filter(owner=user)
             else:
                 # Regular users can see public models and their own models
-                return Model.objects.filter(
+                queryset = Model.objects.filter(
                     visibility_status=VisibilityStatus.PUBLIC
                 ) | Model.objects.filter(owner=user)
         else:
             # Guests can only see public models
-            return Model.objects.filter(visibility_status=VisibilityStatus.PUBLIC)
+            queryset = Model.objects.filter(visibility_status=VisibilityStatus.PUBLIC)
+        return with_listing_relations(queryset)
+    
+    def perform_update(self, serializer):
+        model = serializer.save()
+        if model.visibility_status == VisibilityStatus.PUBLIC:
+            related.record_change(model.id)
+    
+    def perform_destroy(self, instance):
+        was_public = instance.visibility_status == VisibilityStatus.PUBLIC
+        model_id = instance.id
+        instance.delete()
+        if was_public:
+            related.record_change(model_id)
     
     @action(detail=False, methods=['get'])
     def my_models(self, request):
@@ -103,9 +158,10 @@ class ModelViewSet(viewsets.ModelViewSet):
         if not request.user.is_authenticated:
             return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
         
-        models = Model.objects.filter(owner=request.user)
-        serializer = ModelListSerializer(models, many=True)
-        return Response(serializer.data)
+        models = with_listing_relations(Model.objects.filter(owner=request.user))
+        page = self.paginate_queryset(models)
+        serializer = ModelListSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
     @action(detail=True, methods=['post'])
     def submit_for_review(self, request, pk=None):
@@ -131,9 +187,57 @@ class ModelViewSet(viewsets.ModelViewSet):
         serializer = ModelSerializer(model, context={'request': request})
         return Response(serializer.data)
     
-    @action(detail=True, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser])
+    def presign_upload(self, request):
+        """
+        Get a presigned URL to upload a file directly to storage.
+        
+        Body: kind (stl/thumbnail/image), filename, size, content_type.
+        PUT the file to the returned url, then pass the returned token as
+        stl_upload_token / thumbnail_upload_token / image_upload_tokens.
+        """
+        try:
+            size = int(request.data.get('size', 0))
+        except (TypeError, ValueError):
+            return Response({'error': 'size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            upload = create_presigned_upload(
+                request.user,
+                request.data.get('kind'),
+                request.data.get('filename'),
+                size,
+                request.data.get('content_type') or 'application/octet-stream',
+            )
+        except DirectUploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(upload)
+    
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    def upload_archive(self, request):
+        """
+        Upload a 3MF project or ZIP of STLs; every mesh becomes its own model.
+        
+        Body (multipart): file, plus optional model_name, description,
+        category and tags shared by all parts. The parts are sliced in
+        parallel; see GET /archives/{id}/quote/ for the combined price.
+        """
+        serializer = ArchiveUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        fields = dict(serializer.validated_data)
+        upload = fields.pop('file')
+        
+        try:
+            archive = create_archive(request.user, upload, upload.name, fields)
+        except ArchiveError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        output = ModelArchiveSerializer(archive, context={'request': request})
+        return Response(output.data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['post'], parser_classes=[MultiPartParser, FormParser, JSONParser])
     def upload_images(self, request, pk=None):
-        """Upload images for a model."""
+        """Upload images for a model, as files or as direct upload tokens."""
         model = self.get_object()
         
         if model.owner != request.user:
@@ -143,6 +247,13 @@ class ModelViewSet(viewsets.ModelViewSet):
             )
         
         images = request.FILES.getlist('images')
+        tokens = request.data.getlist('image_upload_tokens') if hasattr(request.data, 'getlist') \
+            else request.data.get('image_upload_tokens', [])
+        try:
+            images += [resolve_upload(request.user, token, 'image') for token in tokens]
+        except DirectUploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
         if not images:
             return Response(
                 {'error': 'No images provided'},
@@ -194,10 +305,92 @@ class ModelViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'], permission_classes=[IsEmployee])
     def pending_review(self, request):
-        """Get all models pending review (Employee only)."""
-        models = Model.objects.filter(visibility_status=VisibilityStatus.PENDING)
-        serializer = ModelListSerializer(models, many=True, context={'request': request})
-        return Response(serializer.data)
+        """Get all models pending review, with likely duplicates flagged (Employee only)."""
+        models = with_listing_relations(
+            Model.objects.filter(visibility_status=VisibilityStatus.PENDING)
+        ).select_related('shape_signature__duplicate_of__owner')
+        page = self.paginate_queryset(models)
+        serializer = PendingReviewSerializer(page, many=True, context={'request': request})
+        return self.get_paginated_response(serializer.data)
+    
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, DownloadRenderer])
+    def download(self, request, pk=None):
+        """
+        Download the model's STL (default) or, with ?kind=gcode, its G-code.
+        
+        Streams the file and supports Range, If-Range and If-None-Match.
+        Full downloads are counted in download_count.
+        """
+        model = self.get_object()
+        kind = request.query_params.get('kind', 'stl')
+        if kind not in downloads.CONTENT_TYPES:
+            return Response({'error': 'kind must be stl or gcode'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        name = model.stl_file.name if kind == 'stl' else model.gcode_file_path
+        if not name or not blob_storage.exists(name):
+            return Response({'error': f'No {kind} file is available for this model'},
+                            status=status.HTTP_404_NOT_FOUND)
+        
+        response, counted = downloads.serve_blob(
+            request, name, downloads.download_filename(model, kind), downloads.CONTENT_TYPES[kind]
+        )
+        if counted:
+            downloads.record_download(model.id)
+        return response
+    
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, DownloadRenderer])
+    def toolpath(self, request, pk=None):
+        """
+        Per-layer toolpath preview extracted from the sliced G-code.
+        
+        Binary format described in toolpath.py. Fetch the first
+        `slicing_info.toolpath.index_bytes` bytes for the header and layer
+        index, then each layer with a Range request.
+        """
+        model = self.get_object()
+        info = (model.slicing_info or {}).get('toolpath')
+        if not info or not blob_storage.exists(info['name']):
+            return Response({'error': 'No toolpath preview is available for this model'},
+                            status=status.HTTP_404_NOT_FOUND)
+        
+        response, _ = downloads.serve_blob(
+            request, info['name'], downloads.download_filename(model, 'toolpath'), 'application/octet-stream'
+        )
+        return response
+    
+    @action(detail=True, methods=['get'])
+    def slicing_status_token(self, request, pk=None):
+        """Token for opening slicing_status with EventSource, which cannot send headers."""
+        model = self.get_object()
+        return Response({
+            'token': make_stream_token(request.user, model.id),
+            'expires_in': settings.SLICING_STATUS_TOKEN_TTL,
+        })
+    
+    @action(
+        detail=True, methods=['get'], renderer_classes=[EventStreamRenderer, JSONRenderer],
+        authentication_classes=[StreamTokenAuthentication, *api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+    def slicing_status(self, request, pk=None):
+        """
+        Stream slicing progress as Server-Sent Events.
+        
+        Sends the current state immediately, then one event per pipeline
+        stage until the slice completes or fails. Replaces polling retrieve.
+        Accepts `?token=` from slicing_status_token instead of the header.
+        """
+        model = self.get_object()
+        # A held stream only costs nothing when served on an event loop
+        stream = event_stream(model) if isinstance(request._request, ASGIRequest) else snapshot_stream(model)
+        response = StreamingHttpResponse(stream, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Disable nginx buffering
+        return response
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsEmployee])
+    def slicing_queue(self, request):
+        """Get slicing queue depth per user and wait-time percentiles (Employee only)."""
+        return Response(scheduler.stats())
     
     @action(detail=True, methods=['post'], permission_classes=[IsEmployee])
     def approve(self, request, pk=None):
@@ -232,6 +425,7 @@ class ModelViewSet(viewsets.ModelViewSet):
         # Update model status
         model.visibility_status = VisibilityStatus.PUBLIC
         model.save()
+        related.record_change(model.id)
         
         serializer = ModelSerializer(model, context={'request': request})
         return Response(serializer.data)
@@ -284,9 +478,11 @@ class ModelViewSet(viewsets.ModelViewSet):
     def review_logs(self, request, pk=None):
         """Get review logs for a model."""
         model = self.get_object()
-        logs = ModelReviewLog.objects.filter(model=model).order_by('-timestamp')
-        serializer = ModelReviewLogSerializer(logs, many=True)
-        return Response(serializer.data)
+        logs = ModelReviewLog.objects.filter(model=model).select_related('reviewer')
+        paginator = KeysetPagination(ordering=['-timestamp'])
+        page = paginator.paginate_queryset(logs, request, view=self)
+        serializer = ModelReviewLogSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 
 class PublicModelViewSet(viewsets.ReadOnlyModelViewSet):
@@ -295,10 +491,11 @@ class PublicModelViewSet(viewsets.ReadOnlyModelViewSet):
     """
     serializer_class = ModelListSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [ModelSearchFilter, ModelOrderingFilter]
     search_fields = ['model_name', 'description', 'owner__email', 'category']
     ordering_fields = ['created_at', 'model_name', 'download_count', 'view_count']
     ordering = ['-created_at']
+    pagination_class = KeysetPagination
     
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -306,7 +503,7 @@ class PublicModelViewSet(viewsets.ReadOnlyModelViewSet):
         return context
     
     def get_queryset(self):
-        queryset = Model.objects.filter(visibility_status=VisibilityStatus.PUBLIC)
+        queryset = with_listing_relations(Model.objects.filter(visibility_status=VisibilityStatus.PUBLIC))
         
         # Filter by is_featured if provided
         is_featured = self.request.query_params.get('is_featured', None)
@@ -318,6 +515,11 @@ class PublicModelViewSet(viewsets.ReadOnlyModelViewSet):
         if category:
             queryset = queryset.filter(category__iexact=category)
         
+        # Filter by tags if provided (repeat ?tag= to require several)
+        tags = self.request.query_params.getlist('tag')
+        if tags:
+            queryset = queryset.filter(tags__contains=tags)
+        
         return queryset
     
     def retrieve(self, request, *args, **kwargs):
@@ -328,3 +530,217 @@ class PublicModelViewSet(viewsets.ReadOnlyModelViewSet):
         
         serializer = ModelSerializer(instance, context={'request': request})
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Counts per category, tag, price bucket and is_featured for the
+        current filters (search, category, tag, is_featured).
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(facets.cached_model_facets(queryset, request.query_params))
+    
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """
+        Get public models similar in shape, category, tags and size.
+        
+        Query params: limit (default 12, max 50). Each result has a
+        `distance`; smaller is more similar.
+        """
+        model = self.get_object()
+        try:
+            limit = min(max(int(request.query_params.get('limit', 12)), 1), 50)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        matches = related.related_models(model, limit)
+        models = with_listing_relations(Model.objects.all()).in_bulk([model_id for model_id, _ in matches])
+        results = []
+        for model_id, distance in matches:
+            if model_id in models:
+                data = ModelListSerializer(models[model_id], context={'request': request}).data
+                data['distance'] = round(distance, 4)
+                results.append(data)
+        return Response(results)
+
+
+class ModelArchiveViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Multi-part 3MF/ZIP uploads of the authenticated user.
+    
+    Create archives through POST /models/upload_archive/.
+    """
+    serializer_class = ModelArchiveSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return ModelArchive.objects.filter(owner=self.request.user).prefetch_related(
+            Prefetch('parts', queryset=with_listing_relations(Model.objects.all()))
+        )
+    
+    @action(detail=True, methods=['get'])
+    def quote(self, request, pk=None):
+        """Combined weight, price and print time of all parts per material."""
+        return Response(combined_quote(self.get_object()))
+
+
+class UploadSessionViewSet(mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin,
+                           viewsets.GenericViewSet):
+    """
+    Resumable chunked STL uploads.
+    
+    1. POST /uploads/ with filename and total_size to open a session
+    2. PUT /uploads/{id}/chunks/{index}/ with the raw chunk bytes for each chunk
+    3. GET /uploads/{id}/ to see which chunks arrived (for resuming)
+    4. POST /uploads/{id}/finalize/ with the model fields to create the Model
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return UploadSession.objects.filter(owner=self.request.user)
+    
+    @action(detail=True, methods=['put'], url_path=r'chunks/(?P<index>\d+)', parser_classes=[])
+    def chunk(self, request, pk=None, index=None):
+        """
+        Upload one chunk as the raw request body.
+        
+        The body is streamed straight to disk; request.data is never read so
+        the chunk is not buffered in memory. Send the chunk's SHA-256 in the
+        X-Chunk-SHA256 header.
+        """
+        session = self.get_object()
+        if session.status != UploadStatus.ACTIVE:
+            return Response(
+                {'error': 'Upload session is not active'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        checksum = request.headers.get('X-Chunk-SHA256')
+        if not checksum:
+            return Response(
+                {'error': 'X-Chunk-SHA256 header is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # DRF has no stream for an empty body or one without a Content-Length
+        if request.stream is None:
+            if 'Content-Length' not in request.headers:
+                return Response({'error': 'Content-Length is required'}, status=status.HTTP_411_LENGTH_REQUIRED)
+            return Response({'error': 'Chunk is empty'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            write_chunk(session, int(index), request.stream, checksum)
+        except ChunkError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        session.save(update_fields=['updated_at'])
+        serializer = self.get_serializer(session)
+        return Response(serializer.data)
+    
+    @action(detail=True, methods=['post'], parser_classes=[JSONParser])
+    def finalize(self, request, pk=None):
+        """Assemble the chunks and create the Model from them."""
+        session = self.get_object()
+        # Claim the session so that concurrent finalize calls cannot both
+        # assemble it and create two models
+        claimed = UploadSession.objects.filter(pk=session.pk, status=UploadStatus.ACTIVE).update(
+            status=UploadStatus.FINALIZING, updated_at=timezone.now()
+        )
+        if not claimed:
+            return Response(
+                {'error': 'Upload session is not active'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            path = assemble(session)
+            with open(path, 'rb') as f:
+                data = dict(request.data)
+                data['stl_file'] = File(f, name=session.filename)
+                data['stl_file_path'] = session.filename
+                serializer = ModelCreateSerializer(data=data, context={'request': request})
+                serializer.is_valid(raise_exception=True)
+                model = serializer.save()
+        except ChunkError as e:
+            self._reopen(session)
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception:
+            # Invalid model fields or a failed save; the client may retry
+            self._reopen(session)
+            raise
+        
+        session.status = UploadStatus.COMPLETED
+        session.model = model
+        session.save(update_fields=['status', 'model', 'updated_at'])
+        discard(session)
+        
+        output_serializer = ModelSerializer(model, context={'request': request})
+        return Response(output_serializer.data, status=status.HTTP_201_CREATED)
+    
+    def _reopen(self, session):
+        """Let a session whose finalize failed receive chunks and be finalized again."""
+        UploadSession.objects.filter(pk=session.pk, status=UploadStatus.FINALIZING).update(
+            status=UploadStatus.ACTIVE, updated_at=timezone.now()
+        )
+    
+    def perform_destroy(self, instance):
+        """Abort the upload and delete received chunks, unless it is being finalized."""
+        UploadSession.objects.filter(pk=instance.pk, status=UploadStatus.ACTIVE).update(
+            status=UploadStatus.ABORTED, updated_at=timezone.now()
+        )
+        instance.refresh_from_db(fields=['status'])
+        if instance.status != UploadStatus.FINALIZING:
+            discard(instance)
+
+
+class InstantQuoteView(APIView):
+    """
+    Price an STL for every active material without an account.
+    
+    POST the raw STL as the request body. Nothing is stored except a cached
+    geometry summary keyed by the file's SHA-256.
+    """
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'instant_quote'
+    parser_classes = []
+    
+    def post(self, request):
+        try:
+            content_length = int(request.headers.get('Content-Length') or 0) or None
+        except ValueError:
+            content_length = None
+        if content_length and content_length > settings.INSTANT_QUOTE_MAX_BYTES:
+            return Response(
+                {'error': f'File is larger than {settings.INSTANT_QUOTE_MAX_BYTES} bytes'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        # DRF has no stream for an empty body or one without a Content-Length
+        if request.stream is None:
+            if 'Content-Length' not in request.headers:
+                return Response({'error': 'Content-Length is required'}, status=status.HTTP_411_LENGTH_REQUIRED)
+            return Response({'error': 'Request body is empty'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Read request.stream directly so the body is parsed as it arrives
+        try:
+            quote = quotes.quote_stream(request.stream, content_length)
+        except STLError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(quote)
+
+
+class InstantQuoteLookupView(APIView):
+    """Return a cached quote by SHA-256, so a known file need not be uploaded again."""
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'instant_quote_lookup'
+    
+    def get(self, request, sha256):
+        quote = quotes.cached_quote(sha256)
+        if quote is None:
+            return Response({'error': 'No quote for this file yet'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(quote)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_initial'),
+        ('users', '0003_add_display_name'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'creation_date', 'id'], name='order_customer_created_idx'),
+        ),
+    ]
@@ -68,6 +68,7 @@ class Order(models.Model):
     class Meta:
         db_table = 'order'
         ordering = ['-creation_date']
+        indexes = [models.Index(fields=['customer', 'creation_date', 'id'], name='order_customer_created_idx')]
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
 
@@ -2,6 +2,7 @@ from rest_framework import serializers
 from decimal import Decimal
 from .models import Order, OrderItem, OrderLog, OrderStatus
 from apps.materials.models import CartItem
+from apps.models.slicing import unit_price_for_material
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -124,10 +125,8 @@ class OrderCreateSerializer(serializers.Serializer):
         
         for idx, cart_item in enumerate(cart_items, start=1):
             # Calculate price snapshot
-            if cart_item.model.slicing_info and 'weight_g' in cart_item.model.slicing_info:
-                weight = Decimal(str(cart_item.model.slicing_info['weight_g']))
-                unit_price = weight * cart_item.material.price_twd_g
-            else:
+            unit_price = unit_price_for_material(cart_item.model.slicing_info, cart_item.material)
+            if unit_price is None:
                 unit_price = Decimal('0')
             
             item_subtotal = unit_price * cart_item.quantity
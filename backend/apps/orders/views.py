@@ -8,6 +8,7 @@ from .serializers import (
     OrderItemSerializer, OrderLogSerializer
 )
 from apps.users.models import Customer
+from config.pagination import KeysetPagination
 
 
 def get_or_create_customer(user):
@@ -34,6 +35,8 @@ class OrderViewSet(viewsets.ModelViewSet):
     - Cancel pending orders
     """
     permission_classes = [permissions.IsAuthenticated, IsCustomerOwner]
+    pagination_class = KeysetPagination
+    ordering = ['-creation_date']
     
     def get_serializer_class(self):
         if self.action == 'create':
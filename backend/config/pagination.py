@@ -0,0 +1,218 @@
+"""
+Keyset pagination for all list endpoints.
+
+DRF's CursorPagination keeps only the first ordering field in the cursor
+and skips rows with the same value by OFFSET, which degrades on fields
+with many ties such as view_count. Here the cursor holds the full sort
+key of the last row, which is the ordering plus the primary key as a
+tie-breaker, and the next page is fetched with
+
+    WHERE key0 <= v0 AND (key0 < v0 OR (key0 = v0 AND id < v_id))
+    ORDER BY key0 DESC, id DESC LIMIT page_size + 1
+
+so any page is one index range scan over an index on (key0, id).
+
+Counting every row of a large table on each page would undo that, so
+`count` is exact up to PAGINATION_EXACT_COUNT_LIMIT and above it is
+Postgres' row estimate for the query (`count_is_estimate` is then true).
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (UUID, Decimal)):
+        return str(value)
+    return value
+
+
+def estimate_count(queryset, exact_limit=None):
+    """
+    Return (count, is_estimate) for a queryset.
+
+    Counts exactly up to `exact_limit` rows; beyond that, and only on
+    Postgres, the planner's estimate is used instead of a full count.
+    """
+    exact_limit = exact_limit or settings.PAGINATION_EXACT_COUNT_LIMIT
+    queryset = queryset.order_by()
+    exact = queryset[:exact_limit + 1].count()
+    if exact <= exact_limit:
+        return exact, False
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count(), False
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return max(int(plan[0]['Plan']['Plan Rows']), exact), True
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination on the full (ordering..., pk) sort key.
+
+    The ordering comes from the view's OrderingFilter (`?ordering=`), else
+    the view's `ordering`, the queryset's or the model's default ordering.
+    Pass `ordering` to paginate an action's queryset in a fixed order.
+    """
+    page_size = settings.PAGINATION_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.PAGINATION_MAX_PAGE_SIZE
+    ordering = None
+
+    def __init__(self, ordering=None):
+        self.fixed_ordering = ordering
+
+    def get_ordering(self, request, queryset, view):
+        ordering = self.fixed_ordering
+        if ordering is None:
+            for backend in getattr(view, 'filter_backends', []):
+                if hasattr(backend, 'get_ordering'):
+                    ordering = backend().get_ordering(request, queryset, view)
+                    break
+        ordering = (
+            ordering or getattr(view, 'ordering', None) or queryset.query.order_by
+            or queryset.model._meta.ordering
+        )
+        ordering = [ordering] if isinstance(ordering, str) else list(ordering)
+
+        # The primary key makes the sort key unique
+        pk = queryset.model._meta.pk.name
+        ordering = [name.replace('pk', pk) if name.lstrip('-') == 'pk' else name for name in ordering]
+        if not any(name.lstrip('-') == pk for name in ordering):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append(('-' if descending else '') + pk)
+        return tuple(ordering)
+
+    def _fields(self, queryset):
+        """(attribute, field) for each sort key; annotations such as a search rank are allowed."""
+        fields = []
+        for name in self.ordering:
+            name = name.lstrip('-')
+            try:
+                field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                annotation = queryset.query.annotations.get(name)
+                assert annotation is not None, f'Cannot paginate on {name}: not a field of {queryset.model.__name__}'
+                fields.append((name, annotation.output_field))
+                continue
+            assert not field.is_relation or field.many_to_one, f'Cannot paginate on relation {name}'
+            fields.append((field.attname, field))
+        return fields
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.fields = self._fields(queryset)
+        self.cursor = self.decode_cursor(request)
+        self.count, self.count_is_estimate = estimate_count(queryset)
+
+        reverse = self.cursor is not None and self.cursor['reverse']
+        ordering = [self._flip(name) for name in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(self._after(self.cursor['position'], ordering))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    @staticmethod
+    def _flip(name):
+        return name[1:] if name.startswith('-') else '-' + name
+
+    def _after(self, position, ordering):
+        """Filter for rows that come strictly after `position` in `ordering`."""
+        names = [name.lstrip('-') for name in ordering]
+        strict = ['lt' if name.startswith('-') else 'gt' for name in ordering]
+
+        # (k0 > v0) OR (k0 = v0 AND ((k1 > v1) OR (k1 = v1 AND ...)))
+        condition = Q(**{f'{names[-1]}__{strict[-1]}': position[-1]})
+        for name, op, value in zip(names[-2::-1], strict[-2::-1], position[-2::-1]):
+            condition = Q(**{f'{name}__{op}': value}) | (Q(**{name: value}) & condition)
+        # The redundant bound on the first key lets the database start an
+        # index range scan there instead of filtering the whole index
+        return Q(**{f'{names[0]}__{strict[0]}e': position[0]}) & condition
+
+    def _position(self, instance):
+        return [_encode_value(getattr(instance, attr)) for attr, _ in self.fields]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            position = data['p']
+            if len(position) != len(self.fields):
+                raise ValueError('cursor does not match the ordering')
+            position = [field.to_python(value) for (_, field), value in zip(self.fields, position)]
+            return {'position': position, 'reverse': bool(data.get('r'))}
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        data = {'p': cursor['position']}
+        if cursor['reverse']:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor({'position': self._position(self.page[-1]), 'reverse': False})
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor({'position': self._position(self.page[0]), 'reverse': True})
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'count_is_estimate': self.count_is_estimate,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties'] = {
+            'count': {'type': 'integer', 'example': 123},
+            'count_is_estimate': {'type': 'boolean'},
+            **response_schema['properties'],
+        }
+        return response_schema
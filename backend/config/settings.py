@@ -25,6 +25,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.sites',  # Required by allauth
+    'django.contrib.postgres',  # Full-text and trigram search
 
     # Third-party apps
     'corsheaders',
@@ -57,8 +58,17 @@ REST_FRAMEWORK = {
         # SessionAuthentication 移除，避免 CSRF 問題
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_THROTTLE_RATES': {
+        'instant_quote': os.environ.get('INSTANT_QUOTE_RATE', '30/hour'),
+        'instant_quote_lookup': os.environ.get('INSTANT_QUOTE_LOOKUP_RATE', '300/hour'),
+    },
 }
 
+# List endpoints - see config/pagination.py
+PAGINATION_PAGE_SIZE = int(os.environ.get('PAGINATION_PAGE_SIZE', '24'))
+PAGINATION_MAX_PAGE_SIZE = 100
+PAGINATION_EXACT_COUNT_LIMIT = 10000  # Rows counted exactly before using the planner's estimate
+
 # drf-spectacular settings
 SPECTACULAR_SETTINGS = {
     'TITLE': '3DPMP API',
@@ -130,6 +140,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
@@ -185,17 +196,179 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# S3-compatible storage (Alist, or MinIO for local testing) via django-storages.
+# Enabled when AWS_STORAGE_BUCKET_NAME is set; otherwise media stays on local disk.
+AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME', '')
+AWS_S3_ENDPOINT_URL = os.environ.get('AWS_S3_ENDPOINT_URL', '')
+# Endpoint as seen from browsers, used to sign direct upload URLs
+AWS_S3_PUBLIC_ENDPOINT_URL = os.environ.get('AWS_S3_PUBLIC_ENDPOINT_URL', '')
+AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID', '')
+AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY', '')
+AWS_S3_REGION_NAME = os.environ.get('AWS_S3_REGION_NAME', '')
+AWS_S3_ADDRESSING_STYLE = 'path'
+AWS_S3_SIGNATURE_VERSION = 's3v4'
+AWS_S3_FILE_OVERWRITE = False
+AWS_LOCATION = ''
+USE_S3_STORAGE = bool(AWS_STORAGE_BUCKET_NAME)
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    # STL and G-code blobs, compressed at rest (see apps/models/blobs.py)
+    'blobs': {'BACKEND': 'apps.models.blobs.CompressedFileSystemStorage'},
+}
+if USE_S3_STORAGE:
+    STORAGES = {
+        'default': {'BACKEND': 'storages.backends.s3.S3Storage'},
+        'staticfiles': {'BACKEND': STATICFILES_STORAGE},
+        'blobs': {'BACKEND': 'apps.models.blobs.CompressedS3Storage'},
+    }
+
+# Compression of STL and G-code blobs. Disabling it only affects new writes;
+# compressed blobs stay readable.
+BLOB_COMPRESSION = os.environ.get('BLOB_COMPRESSION', '1') == '1'
+BLOB_COMPRESSION_LEVEL = int(os.environ.get('BLOB_COMPRESSION_LEVEL', '6'))
+BLOB_FRAME_SIZE = 1024 * 1024  # Uncompressed bytes per seekable frame
+
+# STL / G-code downloads - see /api/models/{id}/download/
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Internal nginx location that serves storage names, e.g. '/protected-media/'
+# (location /protected-media/ { internal; alias /app/media/; }). Empty
+# disables X-Accel-Redirect and Django streams every download itself.
+DOWNLOAD_ACCEL_REDIRECT_PREFIX = os.environ.get('DOWNLOAD_ACCEL_REDIRECT_PREFIX', '')
+DOWNLOAD_COUNT_FLUSH_INTERVAL = 60  # Seconds download counts are buffered before a batch update
+
+# Direct (presigned) uploads - see /api/models/presign_upload/
+DIRECT_UPLOAD_EXPIRY = 900  # Seconds a presigned URL stays valid
+DIRECT_UPLOAD_REGISTER_GRACE = 3600  # Extra seconds to register a finished upload
+DIRECT_UPLOAD_MAX_SIZE = {
+    'stl': 1024 ** 3,  # 1GB
+    'image': 20 * 1024 * 1024,  # 20MB
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # File upload settings
-FILE_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB, larger multipart files spool to a temp file
 DATA_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
 
+# Chunked (resumable) uploads - see /api/uploads/
+CHUNKED_UPLOAD_DIR = os.environ.get('CHUNKED_UPLOAD_DIR', str(BASE_DIR / 'uploads_tmp'))
+CHUNKED_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB
+CHUNKED_UPLOAD_MAX_SIZE = int(os.environ.get('CHUNKED_UPLOAD_MAX_SIZE', str(1024 ** 3)))  # 1GB
+CHUNKED_UPLOAD_EXPIRY_HOURS = 24
+
+# 3MF / ZIP multi-part uploads
+ARCHIVE_MAX_PARTS = 100
+ARCHIVE_MAX_UNCOMPRESSED_BYTES = int(os.environ.get('ARCHIVE_MAX_UNCOMPRESSED_BYTES', str(2 * 1024 ** 3)))  # Zip bomb guard
+
 # Celery Configuration
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://redis:6379/0')
+# Slicing jobs are long-running: fetch one at a time and only ack when done
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ROUTES = {
+    'apps.models.tasks.slice_model': {'queue': 'slicing'},
+}
+
+# Redis (cache and slicing scheduler) - shared by API and worker processes
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://redis:6379/0')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+}
+
+# PrusaSlicer
+SLICER_PATH = os.environ.get('SLICER_PATH', 'prusa-slicer')
+SLICER_PROFILE = os.environ.get('SLICER_PROFILE', '')  # Empty = PrusaSlicer defaults
+SLICER_VERSION = os.environ.get('SLICER_VERSION', '')  # Empty = detect from the binary
+
+# Slicing jobs
+SLICING_MAX_CONCURRENCY = int(os.environ.get('SLICING_MAX_CONCURRENCY', '0'))  # 0 = number of usable CPU cores
+SLICING_TIMEOUT = int(os.environ.get('SLICING_TIMEOUT', '900'))  # Wall-clock seconds per slicer run
+SLICING_MEMORY_LIMIT_BYTES = int(os.environ.get('SLICING_MEMORY_LIMIT_BYTES', str(4 * 1024 ** 3)))  # 0 = unlimited
+SLICING_SCRATCH_DIR = os.environ.get('SLICING_SCRATCH_DIR', '')  # Empty = /dev/shm (tmpfs) when available
+SLICING_SLOT_WAIT = int(os.environ.get('SLICING_SLOT_WAIT', '30'))  # Seconds to wait for a free slot before retrying
+SLICING_MAX_RETRIES = int(os.environ.get('SLICING_MAX_RETRIES', '5'))
+SLICING_RETRY_BACKOFF = int(os.environ.get('SLICING_RETRY_BACKOFF', '10'))  # Base seconds, doubled per retry
+
+# Fair scheduling of slicing jobs across users
+SLICING_DISPATCH_WINDOW = int(os.environ.get('SLICING_DISPATCH_WINDOW', '8'))  # Jobs handed to Celery at once
+SLICING_USER_MAX_IN_FLIGHT = int(os.environ.get('SLICING_USER_MAX_IN_FLIGHT', '2'))  # Per owner
+# Seconds after dispatch when a job that never finished is taken as lost and
+# its slot freed: every attempt's time limit and retry backoff, plus a margin
+SLICING_JOB_STALE_AFTER = int(os.environ.get(
+    'SLICING_JOB_STALE_AFTER',
+    str((SLICING_MAX_RETRIES + 1) * (SLICING_TIMEOUT + 180) + SLICING_MAX_RETRIES * 600 + 600),
+))
+
+# Mesh precheck before slicing
+MESH_CHECK_WELD_TOLERANCE_MM = 1e-4  # Vertices closer than this are merged
+MESH_CHECK_MAX_BAD_EDGE_RATIO = 0.05  # Reject if more open/non-manifold edges than this
+
+# Preview images rendered from the STL for models without a thumbnail
+THUMBNAIL_RENDER_SIZE = 512  # Pixels, square
+THUMBNAIL_RENDER_FORMAT = 'WEBP'  # Any Pillow format with alpha, e.g. 'PNG'
+THUMBNAIL_BATCH_SIZE = 20  # Models rendered per worker task
+THUMBNAIL_BATCH_DELAY = 5  # Seconds to collect uploads before a batch runs
+
+# Preview meshes for the 3D viewer: vertex clustering grid per decimated LOD
+PREVIEW_MESH_LOD_GRIDS = (128, 48)  # Cells along the longest axis
+
+# Duplicate detection: shape signature distance below which uploads are flagged
+SHAPE_DUPLICATE_MAX_DISTANCE = 0.025
+SHAPE_LSH_TABLES = 8  # More tables find more near matches at more lookup cost
+SHAPE_LSH_BUCKET_WIDTH = 0.1
+
+# Seconds a slicing status event stream stays open before the client reconnects
+# (ASGI only; under WSGI the stream sends one event and the client polls)
+SLICING_STATUS_STREAM_TIMEOUT = 55
+SLICING_STATUS_POLL_INTERVAL_MS = 3000
+# Seconds a ?token= for the status stream stays valid; it has to outlive
+# the EventSource reconnects of one wait for slicing
+SLICING_STATUS_TOKEN_TTL = 3600
+
+# Slicing result cache: total G-code bytes kept before LRU eviction
+SLICING_CACHE_MAX_BYTES = int(os.environ.get('SLICING_CACHE_MAX_BYTES', str(5 * 1024 ** 3)))
+
+# Slicing estimate (provisional weight computed from the STL at upload time)
+# Shell thickness printed solid, and infill ratio for the remaining interior.
+SLICING_ESTIMATE_WALL_MM = float(os.environ.get('SLICING_ESTIMATE_WALL_MM', '1.2'))
+SLICING_ESTIMATE_INFILL = float(os.environ.get('SLICING_ESTIMATE_INFILL', '0.2'))
+
+# Anonymous instant quotes - see /api/quote/
+INSTANT_QUOTE_MAX_BYTES = int(os.environ.get('INSTANT_QUOTE_MAX_BYTES', str(100 * 1024 * 1024)))  # 100MB
+INSTANT_QUOTE_CACHE_TTL = 7 * 24 * 3600  # Seconds a quote basis is kept per content hash
+
+# Marketplace facet counts - see /api/public-models/facets/
+FACETS_CACHE_TTL = int(os.environ.get('FACETS_CACHE_TTL', '60'))  # Seconds the counts are kept per filter
+FACETS_TAG_LIMIT = 50  # Most common tags returned
+FACETS_PRICE_BUCKETS = (100, 300, 1000)  # Upper bounds in TWD; free and above the last bound get their own buckets
+
+# Geometry-based print time and support estimate (see print_estimate.py);
+# should match the slicer profile so the fit against slicer results holds
+PRINT_ESTIMATE_LAYER_HEIGHT_MM = float(os.environ.get('PRINT_ESTIMATE_LAYER_HEIGHT_MM', '0.2'))
+PRINT_ESTIMATE_OVERHANG_ANGLE = 45  # Degrees from vertical that print without support
+
+# Print time simulated from the sliced G-code (see print_time.py), one
+# profile per printer model with the limits set in its firmware
+PRINTER_PROFILES = {
+    'default': {
+        'max_velocity': (200, 200, 12, 120),  # mm/s for X, Y, Z, E
+        'max_acceleration': (1000, 1000, 200, 5000),  # mm/s^2 for X, Y, Z, E
+        'print_acceleration': 1000,  # M204 P
+        'travel_acceleration': 1250,  # M204 T
+        'retract_acceleration': 1250,  # M204 R
+        'junction_deviation_mm': 0.013,
+        'default_feedrate': 25,  # mm/s until the G-code sets F
+        'overhead_s': 120,  # Homing, heating and purge, which moves do not cover
+    },
+}
+PRINTER_PROFILE = os.environ.get('PRINTER_PROFILE', 'default')
 
 # CORS Configuration (for development)
 CORS_ALLOW_ALL_ORIGINS = True  # 開發環境允許所有來源
@@ -64,6 +64,24 @@ export const useModelsStore = defineStore('models', {
       }
     },
     
+    async fetchMorePublicModels() {
+      if (!this.pagination.next) return
+      this.loading = true
+      try {
+        const response = await axios.get(this.pagination.next)
+        this.publicModels = [...this.publicModels, ...response.data.results]
+        this.pagination = {
+          count: response.data.count,
+          next: response.data.next,
+          previous: response.data.previous
+        }
+      } catch (error) {
+        this.error = 'Failed to load models'
+      } finally {
+        this.loading = false
+      }
+    },
+    
     async fetchModelById(id) {
       this.loading = true
       this.error = null
@@ -216,7 +234,7 @@ export const useModelsStore = defineStore('models', {
     async fetchReviewLogs(modelId) {
       try {
         const response = await apiClient.get(`/models/${modelId}/review_logs/`)
-        return response.data
+        return response.data?.results || response.data
       } catch (error) {
         console.error('Failed to fetch review logs:', error)
         return []